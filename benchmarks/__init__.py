@@ -0,0 +1,20 @@
+"""
+Benchmarks of the simulator itself.
+
+The end-to-end suite runs scenarios derived from microservices_example.py
+and simulate_deployment_scenario.py at several scales and reports, for
+each, the wall time, the SimPy events processed per second, the simulated
+requests completed per second and the peak memory per in-flight and per
+logged request.  Results can be saved as a baseline and compared with a
+later run:
+
+    python -m benchmarks --save quick
+    python -m benchmarks --compare quick
+
+benchmarks.micro times the hot-path primitives one at a time, with the
+same baseline options:
+
+    python -m benchmarks.micro --compare micro
+
+Baselines are only comparable on the same machine and interpreter.
+"""
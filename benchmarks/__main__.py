@@ -0,0 +1,62 @@
+"""
+Command line of the benchmark suite; see the package docstring.
+"""
+
+from __future__ import print_function
+
+import argparse
+import sys
+
+from .harness import run_suite, save_baseline, load_baseline, compare, \
+    baseline_path
+from .scenarios import SCENARIOS, SCALES
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="ServerSim benchmarks")
+    parser.add_argument("--suite", choices=sorted(SCALES), default="quick",
+                        help="scales to run (default: quick)")
+    parser.add_argument("--users", type=int, action="append",
+                        help="number of users, overriding the suite "
+                             "(repeatable)")
+    parser.add_argument("--scenario", action="append",
+                        choices=[s.name for s in SCENARIOS],
+                        help="scenario to run (repeatable, default: all)")
+    parser.add_argument("--simtime", type=float, default=40.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="timing runs per result, the best is kept")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip the tracemalloc runs")
+    parser.add_argument("--save", metavar="NAME",
+                        help="save the results as baseline NAME")
+    parser.add_argument("--compare", metavar="NAME",
+                        help="compare the results with baseline NAME")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative change reported as a regression")
+    args = parser.parse_args(argv)
+
+    scenarios = [s for s in SCENARIOS
+                 if args.scenario is None or s.name in args.scenario]
+    scales = args.users or SCALES[args.suite]
+    results = run_suite(scenarios, scales, args.simtime, args.seed,
+                        args.repeat, not args.no_memory, sys.stdout)
+
+    if args.save:
+        save_baseline(baseline_path(args.save), results)
+    if args.compare:
+        baseline = load_baseline(baseline_path(args.compare))
+        lines, regressions = compare(baseline["results"], results,
+                                     args.threshold)
+        print("\nCompared with %s (%s, simpy %s):"
+              % (args.compare, baseline["python"], baseline["simpy"]))
+        for line in lines:
+            print(line)
+        print("%d regression(s)" % regressions)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
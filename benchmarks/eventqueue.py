@@ -0,0 +1,145 @@
+"""
+Crossover benchmark of CalendarEnvironment against simpy.Environment.
+
+Two workloads are run for increasing numbers of pending events:
+
+- hold: the classic priority queue benchmark.  The queue holds n events;
+  each operation processes the next one and schedules a new one with a
+  delay uniform in [2, 10], like a think time.  This isolates the event
+  queue and SimPy's step().
+- users: n users of the deployment_flat scenario, i.e., the whole
+  simulator, where the queue is a smaller share of the time per event.
+
+For each, the time per event of both environments is reported, with
+the crossover: the smallest n from which the calendar queue is faster.
+
+    python -m benchmarks.eventqueue
+    python -m benchmarks.eventqueue --sizes 1000 100000 --no-users
+"""
+
+from __future__ import print_function, division
+
+import argparse
+import random
+import sys
+import time
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import simpy
+from simpy.events import Event, NORMAL
+
+from serversim.calendarqueue import CalendarEnvironment
+from serversim.randutil import RandomStreams
+
+from .harness import CountingEnvironment
+from .scenarios import deployment_flat
+
+
+_clock = getattr(time, "perf_counter", time.time)
+
+
+class CountingCalendarEnvironment(CalendarEnvironment):
+    """CalendarEnvironment that counts the events it processes."""
+
+    def __init__(self, initial_time=0, bucket_width=None):
+        CalendarEnvironment.__init__(self, initial_time, bucket_width)
+        self.event_count = 0
+
+    def step(self):
+        """Process the next event."""
+        self.event_count += 1
+        CalendarEnvironment.step(self)
+
+
+def _succeeded(env):
+    # type: (simpy.Environment) -> Event
+    """An event ready to be scheduled without triggering it."""
+    event = Event(env)
+    event._ok = True
+    event._value = None
+    return event
+
+
+def hold(env_type, n, ops=100000, seed=1):
+    # type: (Callable[[], simpy.Environment], int, int, int) -> float
+    """Seconds per operation of the hold workload with n pending events,
+    after as many untimed operations to reach a steady state."""
+    env = env_type()
+    uniform = random.Random(seed).uniform
+    for _ in range(n):
+        env.schedule(_succeeded(env), NORMAL, uniform(2, 10))
+    step = env.step
+    schedule = env.schedule
+    for _ in range(n):
+        step()
+        schedule(_succeeded(env), NORMAL, uniform(2, 10))
+    start = _clock()
+    for _ in range(ops):
+        step()
+        schedule(_succeeded(env), NORMAL, uniform(2, 10))
+    return (_clock() - start) / ops
+
+
+def users(env_type, n, simtime=20, seed=1):
+    # type: (Callable[[], simpy.Environment], int, float, int) -> float
+    """Seconds per event of deployment_flat with n users."""
+    env = env_type()
+    deployment_flat(env, n, RandomStreams(seed))
+    start = _clock()
+    env.run(until=simtime)
+    return (_clock() - start) / env.event_count
+
+
+def crossover(sizes, workload, heap_env, calendar_env, repeat=3,
+              progress=None):
+    # type: (Sequence[int], Callable[[Callable[[], simpy.Environment], int], float], Callable[[], simpy.Environment], Callable[[], simpy.Environment], int, object) -> Tuple[List[Tuple[int, float, float]], Optional[int]]
+    """Best time per event of the workload with each environment at each
+    size, and the smallest size from which the calendar queue is faster,
+    None if it is not faster at the largest size."""
+    rows = []
+    for n in sizes:
+        times = [min(workload(env_type, n) for _ in range(repeat))
+                 for env_type in (heap_env, calendar_env)]
+        rows.append((n, times[0], times[1]))
+        if progress is not None:
+            print("%10d  heap %8.0f ns  calendar %8.0f ns  %+6.1f%%"
+                  % (n, 1e9 * times[0], 1e9 * times[1],
+                     100 * (times[1] - times[0]) / times[0]), file=progress)
+            progress.flush()
+    found = None  # type: Optional[int]
+    for (n, heap_time, calendar_time) in reversed(rows):
+        if calendar_time >= heap_time:
+            break
+        found = n
+    return rows, found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.eventqueue",
+                                     description="Event queue crossover")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[100, 1000, 10000, 100000, 1000000],
+                        help="numbers of pending events (hold) and users")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-users", action="store_true",
+                        help="skip the users workload")
+    args = parser.parse_args(argv)
+
+    workloads = [("hold", hold, simpy.Environment, CalendarEnvironment,
+                  args.sizes)]
+    if not args.no_users:
+        # the users workload takes minutes beyond 100k users
+        workloads.append(("users", users, CountingEnvironment,
+                          CountingCalendarEnvironment,
+                          [n for n in args.sizes if n <= 100000]))
+    for (name, workload, heap_env, calendar_env, sizes) in workloads:
+        print("%s: time per event" % name)
+        _, found = crossover(sizes, workload, heap_env, calendar_env,
+                             args.repeat, sys.stdout)
+        print("crossover: %s\n" % (found if found is not None
+                                   else "none up to %d" % max(sizes)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
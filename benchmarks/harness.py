@@ -0,0 +1,262 @@
+"""
+Running benchmark scenarios, storing baselines and comparing results.
+
+Timing runs count the SimPy events processed with CountingEnvironment,
+whose step() override costs the same in every version, so that relative
+changes remain meaningful.  Memory is measured in separate runs under
+tracemalloc, which slows execution down considerably:
+
+- bytes per in-flight request: peak memory allocated while running,
+  beyond what the model holds after being built, divided by the peak
+  number of requests submitted by the user group and not yet responded.
+- bytes per logged request: memory still allocated at the end of a run
+  with a service request log, beyond that of a run without one, divided
+  by the number of logged requests.  Logged requests keep their whole
+  request tree alive, so this is the cost of per-request detail.
+"""
+
+from __future__ import print_function, division
+
+import gc
+import json
+import os
+import platform
+import time
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import simpy
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+from serversim.randutil import RandomStreams
+
+from .scenarios import Scenario
+
+
+_clock = getattr(time, "perf_counter", time.time)
+
+BASELINES_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+
+# metric name -> whether higher values are better
+METRICS = [
+    ("wall_time", False),
+    ("events_per_sec", True),
+    ("requests_per_sec", True),
+    ("bytes_per_in_flight", False),
+    ("bytes_per_logged", False),
+]  # type: List[Tuple[str, bool]]
+
+
+class CountingEnvironment(simpy.Environment):
+    """simpy.Environment that counts the events it processes.
+
+    Attributes:
+        event_count (int): Number of events processed so far.
+    """
+
+    def __init__(self, initial_time=0):
+        simpy.Environment.__init__(self, initial_time)
+        self.event_count = 0
+
+    def step(self):
+        """Process the next event."""
+        self.event_count += 1
+        simpy.Environment.step(self)
+
+
+def run_timed(scenario, num_users, simtime, seed=1, repeat=3):
+    # type: (Scenario, int, float, int, int) -> Dict[str, Any]
+    """Best wall time of repeat runs of scenario, with the events and
+    requests processed per second."""
+    best = None  # type: Optional[float]
+    events = requests = 0
+    for _ in range(repeat):
+        env = CountingEnvironment()
+        grp = scenario.build(env, num_users, RandomStreams(seed))
+        gc.collect()
+        start = _clock()
+        env.run(until=simtime)
+        wall = _clock() - start
+        if best is None or wall < best:
+            best = wall
+        events = env.event_count
+        requests = grp.responded_request_count()
+    return {"wall_time": best,
+            "events": events,
+            "requests": requests,
+            "events_per_sec": events / best,
+            "requests_per_sec": requests / best}
+
+
+def _traced_run(scenario, num_users, simtime, seed, log):
+    # type: (Scenario, int, float, int, bool) -> Tuple[int, int, int, int, int]
+    """One run under tracemalloc: memory after building, at the end and at
+    the peak, the peak number of requests in flight and the number of
+    logged requests."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        env = simpy.Environment()
+        svc_req_log = [] if log else None  # type: Optional[List[Tuple[str, Any]]]
+        grp = scenario.build(env, num_users, RandomStreams(seed), svc_req_log)
+        peak_in_flight = [0]
+
+        def sampler():
+            while True:
+                peak_in_flight[0] = max(peak_in_flight[0],
+                                        grp.unresponded_request_count())
+                yield env.timeout(0.1)
+
+        env.process(sampler())
+        gc.collect()
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        env.run(until=simtime)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    logged = len(svc_req_log) if svc_req_log is not None else 0
+    return base, current, peak, peak_in_flight[0], logged
+
+
+def run_memory(scenario, num_users, simtime, seed=1):
+    # type: (Scenario, int, float, int) -> Dict[str, Any]
+    """Memory per in-flight and per logged request (see module
+    docstring)."""
+    if tracemalloc is None:
+        return {}
+    base, current, peak, in_flight, _ = \
+        _traced_run(scenario, num_users, simtime, seed, False)
+    log_base, log_current, _, _, logged = \
+        _traced_run(scenario, num_users, simtime, seed, True)
+    retained = (log_current - log_base) - (current - base)
+    return {"peak_in_flight": in_flight,
+            "bytes_per_in_flight": (peak - base) / max(in_flight, 1),
+            "logged_requests": logged,
+            "bytes_per_logged": retained / max(logged, 1)}
+
+
+def run_suite(scenarios, scales, simtime, seed=1, repeat=3, memory=True,
+              progress=None):
+    # type: (Sequence[Scenario], Sequence[int], float, int, int, bool, Any) -> List[Dict[str, Any]]
+    """Run each scenario at each scale.
+
+    Args:
+        scenarios: The scenarios.
+        scales: The numbers of users.
+        simtime: Simulated time of each run.
+        seed: Seed of the RandomStreams of each run.
+        repeat: Number of timing runs, of which the fastest is kept.
+        memory: Whether to measure memory.
+        progress: Optional file to which a line is written per result.
+
+    Returns:
+        One dict of metrics per scenario and scale.
+    """
+    results = []
+    for scenario in scenarios:
+        for num_users in scales:
+            result = {"scenario": scenario.name, "num_users": num_users,
+                      "simtime": simtime, "seed": seed}
+            result.update(run_timed(scenario, num_users, simtime, seed,
+                                    repeat))
+            if memory:
+                result.update(run_memory(scenario, num_users, simtime, seed))
+            results.append(result)
+            if progress is not None:
+                print(format_result(result), file=progress)
+                progress.flush()
+    return results
+
+
+def _key(result):
+    # type: (Mapping[str, Any]) -> Tuple[str, int, float, int]
+    return (result["scenario"], result["num_users"], result["simtime"],
+            result["seed"])
+
+
+def format_result(result):
+    # type: (Mapping[str, Any]) -> str
+    """One-line summary of a result."""
+    line = "%-22s %7d users  %8.3fs  %10.0f events/s  %9.0f req/s" % (
+        result["scenario"], result["num_users"], result["wall_time"],
+        result["events_per_sec"], result["requests_per_sec"])
+    if "bytes_per_in_flight" in result:
+        line += "  %7.0f B/in-flight  %7.0f B/logged" % (
+            result["bytes_per_in_flight"], result["bytes_per_logged"])
+    return line
+
+
+def baseline_path(name):
+    # type: (str) -> str
+    """Path of the stored baseline NAME, or name itself if it is a path to
+    a JSON file."""
+    if name.endswith(".json"):
+        return name
+    return os.path.join(BASELINES_DIR, name + ".json")
+
+
+def save_baseline(path, results):
+    # type: (str, List[Dict[str, Any]]) -> None
+    """Save results, with a description of the platform, as JSON."""
+    doc = {"python": platform.python_implementation() + " " +
+           platform.python_version(),
+           "simpy": simpy.__version__,
+           "machine": platform.machine(),
+           "results": results}
+    with open(path, "w") as f:
+        json.dump(doc, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def load_baseline(path):
+    # type: (str) -> Dict[str, Any]
+    """Load a baseline saved by save_baseline."""
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(baseline, results, threshold=0.1):
+    # type: (Sequence[Mapping[str, Any]], Sequence[Mapping[str, Any]], float) -> Tuple[List[str], int]
+    """Comparison report of results against baseline results.
+
+    A metric regresses when it is worse than the baseline by more than
+    the threshold fraction.  Results whose event count differs from the
+    baseline's simulate something else, e.g., after a change of
+    scheduling, and are flagged as such.
+
+    Returns:
+        The lines of the report and the number of regressions.
+    """
+    by_key = dict((_key(r), r) for r in baseline)
+    lines = []
+    regressions = 0
+    for result in results:
+        old = by_key.get(_key(result))
+        title = "%s, %d users" % (result["scenario"], result["num_users"])
+        if old is None:
+            lines.append(title + ": not in baseline")
+            continue
+        lines.append(title + ":")
+        if old["events"] != result["events"]:
+            lines.append("    events changed: %d -> %d (not like for like)"
+                         % (old["events"], result["events"]))
+        for (metric, higher_is_better) in METRICS:
+            if metric not in old or metric not in result:
+                continue
+            before, after = old[metric], result[metric]
+            change = (after - before) / before if before else 0.0
+            worse = -change if higher_is_better else change
+            verdict = ""
+            if worse > threshold:
+                verdict = "  REGRESSION"
+                regressions += 1
+            elif worse < -threshold:
+                verdict = "  improvement"
+            lines.append("    %-20s %14.4g -> %14.4g  %+7.1f%%%s"
+                         % (metric, before, after, 100 * change, verdict))
+    return lines, regressions
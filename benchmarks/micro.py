@@ -0,0 +1,332 @@
+"""
+Micro-benchmarks of the primitives on the simulator's hot path.
+
+Each benchmark sets up its objects untimed, then performs a batch of
+operations, draining the SimPy events they schedule, and reports:
+
+- ns/op: best time of the repeated batches divided by the number of
+  operations, with the garbage collector disabled as in timeit.
+- blocks/op and bytes/op: memory blocks and bytes allocated by a batch
+  and still live at its end, per operation, as seen by tracemalloc.
+  These are the allocations retained by the operation, e.g., the
+  request objects built by a constructor or the entries appended by
+  log_time.
+- transient: peak bytes allocated during the batch beyond what is live
+  at its end, i.e., the largest set of temporaries alive at once.
+
+env_timeout and simpy_request_release are references: they measure
+SimPy itself, to be subtracted from the benchmarks built on it.  The
+Par and Seq batches are shortened in proportion to their fan-out and
+depth, so that each runs about the same number of leaf requests.
+
+    python -m benchmarks.micro
+    python -m benchmarks.micro --filter par_ --save micro
+    python -m benchmarks.micro --compare micro
+"""
+
+from __future__ import print_function, division
+
+import argparse
+from collections import namedtuple
+import gc
+import json
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import simpy
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+from serversim import MeasuredResource, Server, CoreSvcRequester, Seq, Par, \
+    SvcRequest, UserGroup
+from serversim.randutil import prob_chooser
+
+from .harness import baseline_path
+
+
+# setup(n) returns a function performing the batch, which returns what
+# the batch retains, and the number of operations in the batch
+MicroBenchmark = namedtuple("MicroBenchmark", ["name", "setup"])
+
+LABELS = ("submitted", "sw_thread_requested", "sw_thread_acquired",
+          "hw_thread_requested", "hw_thread_acquired", "hw_thread_released",
+          "completed")
+
+FAN_OUTS = (1, 2, 4, 8, 16, 32)
+DEPTHS = (1, 2, 4, 8, 16, 32)
+
+_clock = getattr(time, "perf_counter", time.time)
+
+
+def _drive(env, n, op):
+    # type: (simpy.Environment, int, Callable[[], simpy.Event]) -> Callable[[], None]
+    """A batch that runs a process waiting on n events produced by op."""
+    def gen():
+        for _ in range(n):
+            yield op()
+
+    def run():
+        env.process(gen())
+        env.run()
+    return run
+
+
+def env_timeout(n):
+    env = simpy.Environment()
+    return _drive(env, n, lambda: env.timeout(0)), n
+
+
+def _request_release(resource_type, n):
+    env = simpy.Environment()
+    res = resource_type(env, 1)
+
+    def run():
+        for _ in range(n):
+            req = res.request()
+            res.release(req)
+        env.run()
+    return run, n
+
+
+def simpy_request_release(n):
+    return _request_release(simpy.Resource, n)
+
+
+def resource_request_release(n):
+    return _request_release(MeasuredResource, n)
+
+
+def _noop_gen(svc_req):
+    return iter(())
+
+
+def svc_request_init(n):
+    env = simpy.Environment()
+
+    def run():
+        return [SvcRequest(env, None, "svc", _noop_gen, None, None)
+                for _ in range(n)]
+    return run, n
+
+
+def svc_request_log_time(n):
+    env = simpy.Environment()
+    reqs = [SvcRequest(env, None, "svc", _noop_gen, None, None)
+            for _ in range(n)]
+
+    def run():
+        for req in reqs:
+            for label in LABELS:
+                req.log_time(label)
+        return reqs
+    return run, n * len(LABELS)
+
+
+def prob_chooser_pick(n):
+    pick = prob_chooser(("svc_1", 2), ("svc_2", 1), ("svc_3", 1))
+
+    def run():
+        for _ in range(n):
+            pick()
+    return run, n
+
+
+def usergroup_tally(n):
+    env = simpy.Environment()
+    svc = CoreSvcRequester(env, "svc", lambda: 1.0, lambda _svc_name: None)
+    grp = UserGroup(env, 1, "Users", [(svc, 1)], 1.0, 2.0)
+    overall = grp._overall_tally
+    per_svc = grp._tally_dict[svc]
+    times = [0.5 + (i % 97) / 97.0 for i in range(n)]
+
+    def run():
+        # the two updates UserGroup makes per response
+        for response_time in times:
+            overall.add(response_time)
+            per_svc.add(response_time)
+    return run, n
+
+
+def _leaf(env):
+    # type: (simpy.Environment) -> CoreSvcRequester
+    """A core service that never queues and takes no time."""
+    server = Server(env, 64, 64, 1.0, "Server")
+    return CoreSvcRequester(env, "leaf", lambda: 0.0,
+                            lambda _svc_name: server)
+
+
+def _par(fan_out):
+    def setup(n):
+        env = simpy.Environment()
+        leaf = _leaf(env)
+        par = Par(env, "par", [leaf] * fan_out)
+        n = max(1, n // fan_out)  # about n leaf requests per batch
+        return _drive(env, n, lambda: par.make_svc_request(None).submit()), n
+    return setup
+
+
+def _seq(depth):
+    def setup(n):
+        env = simpy.Environment()
+        leaf = _leaf(env)
+        seq = Seq(env, "seq", [leaf] * depth)
+        n = max(1, n // depth)  # about n leaf requests per batch
+        return _drive(env, n, lambda: seq.make_svc_request(None).submit()), n
+    return setup
+
+
+BENCHMARKS = [
+    MicroBenchmark("env_timeout", env_timeout),
+    MicroBenchmark("simpy_request_release", simpy_request_release),
+    MicroBenchmark("resource_request_release", resource_request_release),
+    MicroBenchmark("svc_request_init", svc_request_init),
+    MicroBenchmark("svc_request_log_time", svc_request_log_time),
+    MicroBenchmark("prob_chooser_pick", prob_chooser_pick),
+    MicroBenchmark("usergroup_tally", usergroup_tally),
+] + [MicroBenchmark("par_fan_out_%d" % k, _par(k)) for k in FAN_OUTS] \
+  + [MicroBenchmark("seq_depth_%d" % d, _seq(d)) for d in DEPTHS]  # type: List[MicroBenchmark]
+
+
+def time_per_op(bench, n, repeat=5):
+    # type: (MicroBenchmark, int, int) -> float
+    """Best time of repeat batches of n, in ns per operation."""
+    best = None  # type: Optional[float]
+    for _ in range(repeat):
+        run, ops = bench.setup(n)
+        gc.collect()
+        gc.disable()
+        try:
+            start = _clock()
+            run()
+            elapsed = _clock() - start
+        finally:
+            gc.enable()
+        per_op = elapsed / ops
+        if best is None or per_op < best:
+            best = per_op
+    return best * 1e9
+
+
+def memory_per_op(bench, n):
+    # type: (MicroBenchmark, int) -> Dict[str, float]
+    """Retained blocks and bytes per operation and transient bytes of a
+    batch of n (see module docstring)."""
+    if tracemalloc is None:
+        return {}
+    run, ops = bench.setup(n)
+    gc.collect()
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot().filter_traces(ignore)
+        start = tracemalloc.get_traced_memory()[0]
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        kept = run()
+        end, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot().filter_traces(ignore)
+    finally:
+        tracemalloc.stop()
+    del kept
+    stats = after.compare_to(before, "filename")
+    return {"blocks_per_op": sum(s.count_diff for s in stats) / ops,
+            "bytes_per_op": (end - start) / ops,
+            "transient_bytes": peak - end}
+
+
+def run_all(benchmarks, n, repeat=5, memory=True, progress=None):
+    # type: (List[MicroBenchmark], int, int, bool, Any) -> List[Dict[str, Any]]
+    """Run the benchmarks with batches of n operations."""
+    results = []
+    for bench in benchmarks:
+        result = {"name": bench.name, "n": n,
+                  "ns_per_op": time_per_op(bench, n, repeat)}
+        if memory:
+            result.update(memory_per_op(bench, n))
+        results.append(result)
+        if progress is not None:
+            print(format_result(result), file=progress)
+            progress.flush()
+    return results
+
+
+def format_result(result):
+    # type: (Dict[str, Any]) -> str
+    """One-line summary of a result."""
+    line = "%-26s %10.0f ns/op" % (result["name"], result["ns_per_op"])
+    if "blocks_per_op" in result:
+        line += "  %6.2f blocks/op  %8.1f bytes/op  %8d transient" % (
+            result["blocks_per_op"], result["bytes_per_op"],
+            result["transient_bytes"])
+    return line
+
+
+def compare(baseline, results, threshold=0.1):
+    # type: (List[Dict[str, Any]], List[Dict[str, Any]], float) -> Tuple[List[str], int]
+    """Report of the changes in ns/op and bytes/op from baseline, with
+    the number of regressions beyond the threshold fraction."""
+    by_name = dict((r["name"], r) for r in baseline)
+    lines = []
+    regressions = 0
+    for result in results:
+        old = by_name.get(result["name"])
+        if old is None:
+            lines.append("%-26s not in baseline" % result["name"])
+            continue
+        parts = []
+        for metric in ("ns_per_op", "bytes_per_op"):
+            if metric not in old or metric not in result:
+                continue
+            before, after = old[metric], result[metric]
+            if before:
+                change = (after - before) / before
+            else:
+                change = 0.0 if not after else float("inf")
+            flag = ""
+            if change > threshold:
+                flag = " REGRESSION"
+                regressions += 1
+            parts.append("%s %+.1f%%%s" % (metric, 100 * change, flag))
+        lines.append("%-26s %s" % (result["name"], ", ".join(parts)))
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.micro",
+                                     description="ServerSim micro-benchmarks")
+    parser.add_argument("--filter", default="",
+                        help="run benchmarks whose name contains this")
+    parser.add_argument("-n", type=int, default=10000,
+                        help="operations per batch")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true")
+    parser.add_argument("--save", metavar="NAME")
+    parser.add_argument("--compare", metavar="NAME")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    benchmarks = [b for b in BENCHMARKS if args.filter in b.name]
+    results = run_all(benchmarks, args.n, args.repeat, not args.no_memory,
+                      sys.stdout)
+    if args.save:
+        with open(baseline_path(args.save), "w") as f:
+            json.dump({"results": results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+    if args.compare:
+        with open(baseline_path(args.compare)) as f:
+            baseline = json.load(f)["results"]
+        lines, regressions = compare(baseline, results, args.threshold)
+        print("\nCompared with %s:" % args.compare)
+        for line in lines:
+            print(line)
+        print("%d regression(s)" % regressions)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Benchmark scenarios.
+
+Each scenario builds a model in a given environment and returns its user
+group; the harness runs the environment.  All random numbers are drawn
+from RandomStreams, so that a scenario processes the same events on
+every run and event counts can be compared across versions.  Server
+counts grow with the number of users to keep utilization, and thus the
+mix of queueing and processing, roughly the same at every scale.
+"""
+
+from collections import namedtuple
+import math
+from typing import Any, List, Optional, Sequence, Tuple
+
+import simpy
+
+from serversim import Server, CoreSvcRequester, Seq, Par, UserGroup
+from serversim.randutil import RandomStreams
+
+
+Scenario = namedtuple("Scenario", ["name", "build", "description"])
+
+hw_threads = 10
+sw_threads = 20
+speed = 20
+svc_1_comp_units = 2.0
+svc_2_comp_units = 1.0
+min_think_time = 2.0
+max_think_time = 10.0
+
+
+def _cug(rng, mid, delta):
+    """Computation units generator"""
+    def f():
+        return rng.uniform(mid - delta, mid + delta)
+    return f
+
+
+def _servers(env, n):
+    # type: (simpy.Environment, int) -> List[Server]
+    return [Server(env, hw_threads, sw_threads, speed, "AppServer_%s" % i)
+            for i in range(n)]
+
+
+def _core_svcs(env, streams, servers1, servers2):
+    # type: (simpy.Environment, RandomStreams, Sequence[Server], Sequence[Server]) -> Tuple[CoreSvcRequester, CoreSvcRequester]
+    comp_units_rng = streams.stream("comp_units")
+    ld_bal_rng = streams.stream("ld_bal")
+
+    def ld_bal(svc_name):
+        """Application server load-balancer."""
+        if svc_name == "svc_1":
+            return ld_bal_rng.choice(servers1)
+        return ld_bal_rng.choice(servers2)
+
+    svc_1 = CoreSvcRequester(env, "svc_1",
+                             _cug(comp_units_rng, svc_1_comp_units,
+                                  svc_1_comp_units * .9), ld_bal)
+    svc_2 = CoreSvcRequester(env, "svc_2",
+                             _cug(comp_units_rng, svc_2_comp_units,
+                                  svc_2_comp_units * .9), ld_bal)
+    return svc_1, svc_2
+
+
+def deployment_flat(env, num_users, streams, svc_req_log=None):
+    # type: (simpy.Environment, int, RandomStreams, Optional[List[Tuple[str, Any]]]) -> UserGroup
+    """simulate_deployment_scenario: two core services, weighted 2 to 1,
+    load balanced over all servers, with about 60 users per server."""
+    servers = _servers(env, max(1, int(math.ceil(num_users / 60.0))))
+    svc_1, svc_2 = _core_svcs(env, streams, servers, servers)
+    grp = UserGroup(env, num_users, "UserTypeX", [(svc_1, 2), (svc_2, 1)],
+                    min_think_time, max_think_time, svc_req_log=svc_req_log,
+                    rng=streams.stream("users"))
+    grp.activate_users()
+    return grp
+
+
+def deployment_composite(env, num_users, streams, svc_req_log=None):
+    # type: (simpy.Environment, int, RandomStreams, Optional[List[Tuple[str, Any]]]) -> UserGroup
+    """The services of deployment_flat composed into Seq/Par trees: a
+    checkout is svc_1 followed by a fan-out of three svc_2 and a final
+    svc_2, a browse is a fan-out of two svc_2.  Twice as many servers per
+    user as deployment_flat for about twice the compute units per
+    request."""
+    servers = _servers(env, max(1, int(math.ceil(num_users / 30.0))))
+    svc_1, svc_2 = _core_svcs(env, streams, servers, servers)
+    fan_out = Par(env, "fan_out", [svc_2, svc_2, svc_2])
+    checkout = Seq(env, "checkout", [svc_1, fan_out, svc_2])
+    browse = Par(env, "browse", [svc_2, svc_2])
+    grp = UserGroup(env, num_users, "UserTypeX", [(checkout, 1), (browse, 2)],
+                    min_think_time, max_think_time, svc_req_log=svc_req_log,
+                    rng=streams.stream("users"))
+    grp.activate_users()
+    return grp
+
+
+def microservices_curve(env, num_users, streams, svc_req_log=None):
+    # type: (simpy.Environment, int, RandomStreams, Optional[List[Tuple[str, Any]]]) -> UserGroup
+    """microservices_example with its users curve scaled to num_users
+    peak users and compressed five-fold in time, and svc_2 deployed on
+    its own fifth of the servers."""
+    n = max(2, int(math.ceil(num_users / 60.0)))
+    servers = _servers(env, n)
+    split = max(1, int(n * 0.8))
+    svc_1, svc_2 = _core_svcs(env, streams, servers[:split], servers[split:])
+    low = int(num_users * 650 / 900)
+    users_curve = [(0, num_users), (10, low), (20, num_users), (30, low)]
+    grp = UserGroup(env, users_curve, "UserTypeX", [(svc_1, 2), (svc_2, 1)],
+                    min_think_time, max_think_time, svc_req_log=svc_req_log,
+                    rng=streams.stream("users"))
+    grp.activate_users()
+    return grp
+
+
+SCENARIOS = [
+    Scenario("deployment_flat", deployment_flat,
+             "core services, load balanced"),
+    Scenario("deployment_composite", deployment_composite,
+             "Seq/Par trees of core services"),
+    Scenario("microservices_curve", microservices_curve,
+             "time-varying number of users"),
+]  # type: List[Scenario]
+
+SCALES = {
+    "quick": (1000, 10000),
+    "full": (1000, 10000, 100000),
+}
@@ -12,7 +12,9 @@ import const
 from .measuredresource import MeasuredResource
 from .server import Server
 from .service import (
-    SvcRequest, SvcRequester, CoreSvcRequester, Async, Blkg, Seq, Par)
+    SvcRequest, SvcRequester, CoreSvcRequester, Async, AsyncQueue, Blkg,
+    Seq, Par)
+from .plan import Compiled
 from .usergroup import UserGroup
 from .util import nullary, curried_nullary
 
@@ -30,6 +32,7 @@ def _closeLogfile():
 
 atexit.register(_closeLogfile)
 
-logging.basicConfig(level=logging.INFO,
-                    format='%(levelname)-4s %(message)s',
-                    stream=const.logfile)
+# Applications configure logging, the library only provides a handler
+# that discards records if they do not.  Request-level events are
+# available through the trace module.
+logging.getLogger(__name__).addHandler(logging.NullHandler())
@@ -0,0 +1,333 @@
+"""
+Analytic estimates of deployment scenarios with Mean Value Analysis (MVA).
+
+A deployment is described the way simulations describe it: servers with
+*max_concurrency* hardware threads and an aggregate *speed*, services with
+their mean compute units and the servers they are load-balanced across,
+and groups of users that issue weighted mixes of service requests
+separated by think times.  The deployment is solved as a closed,
+multi-class queueing network: each user group is a class, think times are
+a delay station and each server is a queueing station.
+
+Multi-server stations are handled with Seidmann's approximation: a server
+with c hardware threads and processing duration S per request is replaced
+by a single-server queue with duration S / c in series with a delay of
+S * (c - 1) / c.  With that transformation, the network is solved either
+exactly, by the MVA recursion over all population vectors, or
+approximately, by the Bard-Schweitzer fixed-point iteration, which is
+what the "auto" method uses when the number of population vectors is
+large.
+
+Estimates are meant to prune dominated configurations before simulating;
+they ignore software thread limits and assume load balancers that split
+requests evenly among a service's servers.
+"""
+
+from __future__ import division
+
+import collections
+import itertools
+from typing import Any, Dict, List, Sequence, Tuple
+
+
+ServerSpec = collections.namedtuple("ServerSpec",
+                                    "name max_concurrency speed")
+ServerSpec.__doc__ = """A server, with the meaning of the Server arguments
+of the same names."""
+
+SvcSpec = collections.namedtuple("SvcSpec", "name comp_units servers")
+SvcSpec.__doc__ = """A service: its mean compute units per request and the
+indices of the servers its requests are evenly load-balanced across."""
+
+UserClass = collections.namedtuple("UserClass",
+                                   "name num_users think_time weighted_svcs")
+UserClass.__doc__ = """A group of identical users: their number, their mean
+think time and a sequence of (service name, weight) pairs, as the
+weighted_svcs argument of UserGroup."""
+
+
+# Population sizes above which the "auto" method approximates
+EXACT_MAX_POPULATIONS = 100000
+
+
+class MvaResult(object):
+    """Estimated steady-state metrics of a deployment.
+
+    Times are in simulation time units, with the *_ms variants converted
+    to milliseconds using the time_unit_ms argument of solve().
+
+    Attributes:
+        method (str): "exact" or "approximate".
+        class_names (List[str]): Names of the user classes.
+        throughput (Dict[str, float]): Requests per unit of time for each
+            user class.
+        avg_response_time (Dict[str, float]): Mean response time for each
+            user class, excluding think time.
+        svc_avg_response_time (Dict[Tuple[str, str], float]): Mean
+            response time for each (user class name, service name).
+        server_names (List[str]): Names of the servers.
+        server_utilization (List[float]): Fraction of the hardware
+            threads of each server in use.
+        server_throughput (List[float]): Requests per unit of time
+            processed by each server.
+        server_queue_length (List[float]): Mean number of requests at
+            each server, waiting or being processed.
+        iterations (int): Number of fixed-point iterations of the
+            approximate method, 0 for the exact method.
+    """
+
+    def __init__(self, method, time_unit_ms):
+        # type: (str, float) -> None
+        self.method = method
+        self.time_unit_ms = time_unit_ms
+        self.class_names = []  # type: List[str]
+        self.throughput = {}  # type: Dict[str, float]
+        self.avg_response_time = {}  # type: Dict[str, float]
+        self.svc_avg_response_time = {}  # type: Dict[Tuple[str, str], float]
+        self.server_names = []  # type: List[str]
+        self.server_utilization = []  # type: List[float]
+        self.server_throughput = []  # type: List[float]
+        self.server_queue_length = []  # type: List[float]
+        self.iterations = 0
+
+    @property
+    def avg_response_time_ms(self):
+        # type: () -> Dict[str, float]
+        """avg_response_time in milliseconds."""
+        return dict((k, v * self.time_unit_ms)
+                    for (k, v) in self.avg_response_time.items())
+
+    @property
+    def svc_avg_response_time_ms(self):
+        # type: () -> Dict[Tuple[str, str], float]
+        """svc_avg_response_time in milliseconds."""
+        return dict((k, v * self.time_unit_ms)
+                    for (k, v) in self.svc_avg_response_time.items())
+
+    @property
+    def total_throughput(self):
+        # type: () -> float
+        """Requests per unit of time across all user classes."""
+        return sum(self.throughput.values())
+
+    def __repr__(self):
+        """Printable representation of this object."""
+        return type(self).__name__ + repr(self.__dict__)
+
+
+class _Network(object):
+    """Per-class demands of the queueing and delay parts of each server."""
+
+    def __init__(self, servers, svcs, classes):
+        # type: (Sequence[ServerSpec], Sequence[SvcSpec], Sequence[UserClass]) -> None
+        svcs_by_name = dict((svc.name, svc) for svc in svcs)
+        num_servers = len(servers)
+        # processing duration of a request on each server
+        self.durations = [server.max_concurrency / server.speed
+                          for server in servers]
+        self.concurrency = [server.max_concurrency for server in servers]
+        self.populations = [c.num_users for c in classes]
+        self.think_times = [c.think_time for c in classes]
+        # visits[c][k]: visits per request of class c to server k
+        self.visits = []  # type: List[List[float]]
+        # svc_visits[c]: (svc name, probability, {server: visits}) list
+        self.svc_visits = []  # type: List[List[Tuple[str, float, Dict[int, float]]]]
+        # queueing and delay demands per request of class c at server k
+        self.q_demands = []  # type: List[List[float]]
+        self.d_demands = []  # type: List[List[float]]
+        for cls in classes:
+            total_weight = float(sum(w for (_, w) in cls.weighted_svcs))
+            visits = [0.0] * num_servers
+            demands = [0.0] * num_servers
+            svc_visits = []
+            for (svc_name, weight) in cls.weighted_svcs:
+                svc = svcs_by_name[svc_name]
+                prob = weight / total_weight
+                per_server = 1.0 / len(svc.servers)
+                server_visits = {}
+                for k in svc.servers:
+                    visits[k] += prob * per_server
+                    demands[k] += prob * per_server * svc.comp_units * \
+                        self.durations[k]
+                    server_visits[k] = per_server * svc.comp_units
+                svc_visits.append((svc_name, prob, server_visits))
+            self.visits.append(visits)
+            self.svc_visits.append(svc_visits)
+            self.q_demands.append([d / c for (d, c)
+                                   in zip(demands, self.concurrency)])
+            self.d_demands.append([d * (c - 1) / c for (d, c)
+                                   in zip(demands, self.concurrency)])
+
+    def step(self, c, seen, population):
+        # type: (int, Sequence[float], int) -> Tuple[float, List[float]]
+        """Throughput of class c and its residence times at the servers'
+        queueing parts, given the queue lengths seen on arrival."""
+        residence = [d * (1 + a) for (d, a) in zip(self.q_demands[c], seen)]
+        cycle = self.think_times[c] + sum(residence) + sum(self.d_demands[c])
+        throughput = population / cycle if population > 0 else 0.0
+        return throughput, residence
+
+
+def _solve_exact(net):
+    # type: (_Network) -> Tuple[List[float], List[List[float]], List[List[float]]]
+    """Exact multi-class MVA over all population vectors."""
+    num_classes = len(net.populations)
+    num_servers = len(net.durations)
+    zero = tuple([0] * num_classes)
+    queues = {zero: [0.0] * num_servers}  # total queue length per vector
+    ranges = [range(n + 1) for n in net.populations]
+    # vectors in order of total population, so that every n - e_c is known
+    vectors = sorted(itertools.product(*ranges), key=sum)
+    result = None
+    for n in vectors:
+        if n == zero:
+            continue
+        throughputs = [0.0] * num_classes
+        residences = [[0.0] * num_servers for _ in range(num_classes)]
+        for c in range(num_classes):
+            if n[c] == 0:
+                continue
+            prev = n[:c] + (n[c] - 1,) + n[c + 1:]
+            throughputs[c], residences[c] = net.step(c, queues[prev], n[c])
+        queues[n] = [sum(throughputs[c] * residences[c][k]
+                         for c in range(num_classes))
+                     for k in range(num_servers)]
+        result = throughputs, residences
+    throughputs, residences = result
+    seen = []
+    for c in range(num_classes):
+        prev = tuple(n - 1 if i == c else n
+                     for (i, n) in enumerate(net.populations))
+        seen.append(queues[prev] if min(prev) >= 0
+                    else [0.0] * num_servers)
+    return throughputs, residences, seen
+
+
+def _solve_approximate(net, tolerance, max_iterations):
+    # type: (_Network, float, int) -> Tuple[List[float], List[List[float]], List[List[float]], int]
+    """Bard-Schweitzer approximate multi-class MVA."""
+    num_classes = len(net.populations)
+    num_servers = len(net.durations)
+    # start with each class spread evenly over its servers
+    per_class = []
+    for c in range(num_classes):
+        used = [k for k in range(num_servers) if net.q_demands[c][k] > 0]
+        q = [0.0] * num_servers
+        for k in used:
+            q[k] = net.populations[c] / float(len(used))
+        per_class.append(q)
+    iterations = 0
+    while True:
+        iterations += 1
+        totals = [sum(per_class[c][k] for c in range(num_classes))
+                  for k in range(num_servers)]
+        seen = []
+        throughputs = []
+        residences = []
+        for c in range(num_classes):
+            n = net.populations[c]
+            own = (n - 1) / n if n > 0 else 0.0
+            a = [totals[k] - per_class[c][k] * (1 - own)
+                 for k in range(num_servers)]
+            x, r = net.step(c, a, n)
+            seen.append(a)
+            throughputs.append(x)
+            residences.append(r)
+        new = [[throughputs[c] * residences[c][k] for k in range(num_servers)]
+               for c in range(num_classes)]
+        delta = max([abs(new[c][k] - per_class[c][k])
+                     for c in range(num_classes)
+                     for k in range(num_servers)] + [0.0])
+        per_class = new
+        if delta < tolerance or iterations >= max_iterations:
+            return throughputs, residences, seen, iterations
+
+
+def solve(servers, svcs, classes, method="auto", time_unit_ms=1000.0,
+          tolerance=1e-8, max_iterations=10000):
+    # type: (Sequence[ServerSpec], Sequence[SvcSpec], Sequence[UserClass], str, float, float, int) -> MvaResult
+    """Solve a deployment with Mean Value Analysis.
+
+    Args:
+        servers: The servers.
+        svcs: The services.  Their servers are indices into servers.
+        classes: The user classes.  Their services are referred to by
+            name.
+        method: "exact", "approximate", or "auto", which is exact if the
+            number of population vectors is at most
+            EXACT_MAX_POPULATIONS.
+        time_unit_ms: Milliseconds per simulation time unit, for the
+            *_ms metrics.
+        tolerance: Convergence tolerance on queue lengths for the
+            approximate method.
+        max_iterations: Iteration limit for the approximate method.
+
+    Returns:
+        The estimated metrics.
+    """
+    assert method in ("exact", "approximate", "auto"), \
+        "unknown method " + method
+    net = _Network(servers, svcs, classes)
+    if method == "auto":
+        num_vectors = 1
+        for n in net.populations:
+            num_vectors *= n + 1
+        method = "exact" if num_vectors <= EXACT_MAX_POPULATIONS \
+            else "approximate"
+
+    res = MvaResult(method, time_unit_ms)
+    if method == "exact":
+        throughputs, residences, seen = _solve_exact(net)
+    else:
+        throughputs, residences, seen, res.iterations = \
+            _solve_approximate(net, tolerance, max_iterations)
+
+    num_servers = len(servers)
+    res.class_names = [c.name for c in classes]
+    res.server_names = [s.name for s in servers]
+    for c, cls in enumerate(classes):
+        x = throughputs[c]
+        res.throughput[cls.name] = x
+        res.avg_response_time[cls.name] = \
+            sum(residences[c]) + sum(net.d_demands[c])
+        for (svc_name, _, server_visits) in net.svc_visits[c]:
+            # per request: queueing part seen on arrival plus delay part
+            res.svc_avg_response_time[(cls.name, svc_name)] = sum(
+                units * net.durations[k] / net.concurrency[k] *
+                (1 + seen[c][k] + net.concurrency[k] - 1)
+                for (k, units) in server_visits.items())
+    for k in range(num_servers):
+        res.server_throughput.append(
+            sum(throughputs[c] * net.visits[c][k]
+                for c in range(len(classes))))
+        res.server_utilization.append(
+            sum(throughputs[c] * net.q_demands[c][k]
+                for c in range(len(classes))))
+        res.server_queue_length.append(
+            sum(throughputs[c] * (residences[c][k] + net.d_demands[c][k])
+                for c in range(len(classes))))
+    return res
+
+
+def deployment_scenario(num_users, weight1, weight2, server_range1,
+                        server_range2, hw_threads=10, speed=20,
+                        svc_1_comp_units=2.0, svc_2_comp_units=1.0,
+                        min_think_time=2.0, max_think_time=10.0, **kwargs):
+    # type: (int, float, float, Sequence[int], Sequence[int], int, float, float, float, float, float, **Any) -> MvaResult
+    """Solve the deployment of simulate_deployment_scenario.
+
+    Takes the same arguments as simulate_deployment_scenario, with that
+    function's constants as keyword arguments (mean compute units and
+    think time bounds; think times are uniformly distributed, so only
+    their mean matters here).  Further keyword arguments are passed on
+    to solve().
+    """
+    n_servers = max(server_range1[-1] + 1, server_range2[-1] + 1)
+    servers = [ServerSpec("AppServer_%s" % i, hw_threads, speed)
+               for i in range(n_servers)]
+    svcs = [SvcSpec("svc_1", svc_1_comp_units, list(server_range1)),
+            SvcSpec("svc_2", svc_2_comp_units, list(server_range2))]
+    users = UserClass("UserTypeX", num_users,
+                      (min_think_time + max_think_time) / 2.0,
+                      [("svc_1", weight1), ("svc_2", weight2)])
+    return solve(servers, svcs, [users], **kwargs)
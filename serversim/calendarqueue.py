@@ -0,0 +1,183 @@
+"""
+SimPy environment with a calendar event queue.
+
+simpy.Environment keeps all scheduled events in one binary heap, so each
+schedule and step costs O(log n) tuple comparisons for n pending events.
+With many users, nearly all pending events are think-time timeouts far
+in the future.  CalendarEnvironment splits the simulated time into
+buckets of equal width, like a calendar queue, in two levels:
+
+- the current bucket, holding the events due before its end, is a heap;
+- future buckets are unsorted lists, to which events are appended in
+  O(1), kept in a dict by bucket number, with a heap of the numbers of
+  the non-empty buckets.
+
+When the current bucket runs out, the next non-empty future bucket is
+heapified in linear time and becomes current.  Heaps thus only hold the
+events of one bucket.  With the default adaptive width, the width is
+rescaled, rebuilding the buckets, whenever buckets hold on average far
+more or far fewer events than a target.
+
+Events are processed in exactly the same order as by simpy.Environment
+(by time, priority and scheduling order), so simulations produce
+identical results.  CalendarEnvironment can be used wherever
+simpy.Environment is, e.g., for Server, SvcRequester and UserGroup.
+Whether it is faster depends on the number of pending events: see
+benchmarks.eventqueue for the crossover.
+"""
+
+from __future__ import division
+
+from heapq import heappush, heappop, heapify
+from typing import Any, Dict, List, Optional, Tuple
+
+import simpy
+from simpy.core import EmptySchedule, Infinity
+from simpy.events import NORMAL
+
+
+Entry = Tuple[float, int, int, Any]
+
+
+class CalendarEnvironment(simpy.Environment):
+    """A simpy.Environment with a calendar event queue (see module
+    docstring).
+
+    Attributes:
+        << See __init__. >>
+        << Additional attributes: >>
+
+        adaptive (bool): Whether bucket_width is adapted.
+        resizes (int): Number of times the buckets were rebuilt with a new
+            width.
+    """
+
+    # target average number of events per bucket
+    TARGET = 32
+    # number of buckets over which the average is taken
+    WINDOW = 16
+
+    def __init__(self, initial_time=0, bucket_width=None):
+        # type: (float, Optional[float]) -> None
+        """Initializer.
+
+        Args:
+            initial_time: See simpy.Environment.
+            bucket_width: Width of the buckets in units of simulated time.
+                If None, the width starts at 1 and is adapted.
+        """
+        simpy.Environment.__init__(self, initial_time)
+        self.adaptive = bucket_width is None
+        self.bucket_width = bucket_width if bucket_width is not None \
+            else 1.0
+        self.resizes = 0
+        self._inv_width = 1.0 / self.bucket_width
+        self._cur = int(initial_time * self._inv_width)
+        self._near = []  # type: List[Entry]
+        self._far = {}  # type: Dict[int, List[Entry]]
+        self._buckets = []  # type: List[int]
+        self._refills = 0
+        self._refilled = 0
+
+    def schedule(self, event, priority=NORMAL, delay=0):
+        """Schedule an *event* with a given *priority* and a *delay*."""
+        t = self._now + delay
+        entry = (t, priority, next(self._eid), event)
+        b = int(t * self._inv_width)
+        if b <= self._cur:
+            heappush(self._near, entry)
+        else:
+            bucket = self._far.get(b)
+            if bucket is None:
+                self._far[b] = [entry]
+                heappush(self._buckets, b)
+            else:
+                bucket.append(entry)
+
+    def _refill(self):
+        # type: () -> bool
+        """Make the next non-empty bucket current; False if there is
+        none."""
+        if not self._buckets:
+            return False
+        b = heappop(self._buckets)
+        near = self._far.pop(b)
+        heapify(near)
+        self._near = near
+        self._cur = b
+        if self.adaptive:
+            self._refills += 1
+            self._refilled += len(near)
+            # a far too wide bucket does not wait for the window
+            if self._refills == self.WINDOW or \
+                    len(near) > 16 * self.TARGET:
+                avg = self._refilled / self._refills
+                self._refills = self._refilled = 0
+                if avg > 4 * self.TARGET or avg < self.TARGET / 4:
+                    factor = min(64.0, max(1 / 64.0, self.TARGET / avg))
+                    self._rebuild(self.bucket_width * factor)
+        return True
+
+    def _rebuild(self, width):
+        # type: (float) -> None
+        """Redistribute all pending events into buckets of a new width."""
+        entries = self._near
+        for bucket in self._far.values():
+            entries.extend(bucket)
+        self.bucket_width = width
+        inv = self._inv_width = 1.0 / width
+        cur = self._cur = int(self._now * inv)
+        near = []  # type: List[Entry]
+        far = {}  # type: Dict[int, List[Entry]]
+        for entry in entries:
+            b = int(entry[0] * inv)
+            if b <= cur:
+                near.append(entry)
+            else:
+                bucket = far.get(b)
+                if bucket is None:
+                    far[b] = [entry]
+                else:
+                    bucket.append(entry)
+        heapify(near)
+        buckets = list(far)
+        heapify(buckets)
+        self._near = near
+        self._far = far
+        self._buckets = buckets
+        self.resizes += 1
+
+    def _peek_entry(self):
+        # type: () -> Optional[Entry]
+        """The next scheduled (time, priority, id, event), or None."""
+        while not self._near:
+            if not self._refill():
+                return None
+        return self._near[0]
+
+    def peek(self):
+        """Get the time of the next scheduled event. Return
+        Infinity if there is no further event."""
+        entry = self._peek_entry()
+        return entry[0] if entry is not None else Infinity
+
+    def step(self):
+        """Process the next event.
+
+        Raise an EmptySchedule if no further events are available.
+        """
+        while not self._near:  # a rebuild may leave the current one empty
+            if not self._refill():
+                raise EmptySchedule()
+        # the base class pops the entry from its (otherwise empty) heap
+        # and processes it, so that its handling of callbacks and
+        # failures applies unchanged
+        self._queue.append(heappop(self._near))
+        simpy.Environment.step(self)
+
+    @property
+    def pending_count(self):
+        # type: () -> int
+        """Number of scheduled events."""
+        return len(self._near) + sum(len(b) for b in self._far.values()) \
+            + len(self._queue)
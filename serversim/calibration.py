@@ -0,0 +1,568 @@
+"""
+Calibration of compute unit distributions from measured service times.
+
+Instead of guessing the *fcompunits* function of a CoreSvcRequester, it
+can be fitted to per-request service times measured in production:
+
+1. Accumulate the measured times of each service in a SampleStats,
+   chunk by chunk, e.g., with a Calibrator fed by read_service_times.  A
+   SampleStats keeps sums, for the moments and log-moments, and a
+   histogram with logarithmically spaced bins, so its memory does not
+   depend on the number of samples, and each chunk is processed with a
+   few vectorized NumPy operations.
+2. Fit candidate distributions with fit_all: exponential, lognormal and
+   gamma by maximum likelihood, two-phase hyperexponential by
+   expectation-maximization on the histogram (only for coefficients of
+   variation above 1) and the empirical distribution, i.e., the
+   histogram itself.
+3. Compare them with their goodness-of-fit metrics, computed on the
+   histogram: the Kolmogorov-Smirnov distance between the fitted and
+   empirical CDFs at the bin edges, and the log-likelihood and AIC of the
+   binned samples.  fit_all ranks the fits by AIC.
+4. Make the fcompunits function of the chosen fit with fcompunits().
+   It draws with the random module's generators and converts times to
+   compute units with the speed of a server's hardware thread, i.e.,
+   speed / max_concurrency, the inverse of Server.process_duration.
+
+Measured service times that include queueing overstate the demand.
+When utilization samples of the server are available, service_demand()
+gives the mean demand per request by the service demand law, and the
+*scale* argument of fcompunits() rescales a fit to that mean.
+
+Depends on numpy.  read_service_times requires pandas.
+"""
+
+from __future__ import division
+
+import bisect
+import collections
+import math
+import random
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, \
+    Sequence, Tuple
+
+import numpy as np
+
+
+class SampleStats(object):
+    """Streaming summary of positive samples: count, sums of powers and
+    of logs, extremes and a histogram with logarithmically spaced bins.
+
+    Values below *low* or above *high* are counted in an underflow and an
+    overflow bin.  Non-positive values are not accumulated, only counted.
+
+    Attributes:
+        << See __init__. >>
+        << Additional attributes: >>
+
+        count (int): Number of positive samples.
+        dropped (int): Number of non-positive samples.
+        edges (np.ndarray): Bin edges, from 0 to infinity.
+        counts (np.ndarray): Samples per bin, len(edges) - 1 bins.
+    """
+
+    def __init__(self, low=1e-6, high=1e6, bins_per_decade=50):
+        # type: (float, float, int) -> None
+        """Initializer.
+
+        Args:
+            low: Lower edge of the first regular bin.
+            high: Upper edge of the last regular bin.
+            bins_per_decade: Resolution of the histogram.
+        """
+        self.low = low
+        self.high = high
+        self.bins_per_decade = bins_per_decade
+        self._log_low = math.log10(low)
+        n_bins = int(math.ceil((math.log10(high) - self._log_low) *
+                               bins_per_decade))
+        self.edges = np.concatenate(
+            ([0.0], np.logspace(self._log_low, math.log10(high), n_bins + 1),
+             [np.inf]))
+        self.counts = np.zeros(n_bins + 2, dtype=np.int64)
+        self.count = 0
+        self.dropped = 0
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        self.sum_log = 0.0
+        self.sum_log_sq = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def __repr__(self):
+        """Printable representation of this object."""
+        return type(self).__name__ + repr(self.__dict__)
+
+    def add(self, values):
+        # type: (Sequence[float]) -> None
+        """Accumulate a chunk of samples."""
+        x = np.asarray(values, dtype=np.float64)
+        positive = x > 0
+        if not positive.all():
+            self.dropped += int(x.size - np.count_nonzero(positive))
+            x = x[positive]
+        if x.size == 0:
+            return
+        logs = np.log(x)
+        self.count += int(x.size)
+        self.sum += float(x.sum())
+        self.sum_sq += float(np.dot(x, x))
+        self.sum_log += float(logs.sum())
+        self.sum_log_sq += float(np.dot(logs, logs))
+        self.min = min(self.min, float(x.min()))
+        self.max = max(self.max, float(x.max()))
+        # bin 0 is the underflow bin, bin -1 the overflow bin
+        idx = np.floor((logs / math.log(10) - self._log_low) *
+                       self.bins_per_decade).astype(np.int64) + 1
+        np.clip(idx, 0, len(self.counts) - 1, out=idx)
+        self.counts += np.bincount(idx, minlength=len(self.counts))
+
+    @property
+    def mean(self):
+        # type: () -> float
+        return self.sum / self.count
+
+    @property
+    def variance(self):
+        # type: () -> float
+        """Population variance."""
+        return max(0.0, self.sum_sq / self.count - self.mean ** 2)
+
+    @property
+    def scv(self):
+        # type: () -> float
+        """Squared coefficient of variation."""
+        return self.variance / self.mean ** 2
+
+    @property
+    def mean_log(self):
+        # type: () -> float
+        return self.sum_log / self.count
+
+
+class Fit(object):
+    """A distribution fitted to samples.
+
+    Attributes:
+        << See __init__. >>
+        << Additional attributes: >>
+
+        ks (float): Kolmogorov-Smirnov distance to the samples' histogram.
+        log_likelihood (float): Log-likelihood of the binned samples.
+        aic (float): Akaike information criterion of the binned samples.
+    """
+
+    def __init__(self, name, params, mean, cdf, sampler, num_params):
+        # type: (str, Dict[str, float], float, Callable[[np.ndarray], np.ndarray], Callable[[random.Random], Callable[[], float]], int) -> None
+        """Initializer.
+
+        Args:
+            name: Name of the distribution family.
+            params: The fitted parameters, by name.
+            mean: Mean of the fitted distribution.
+            cdf: Vectorized cumulative distribution function.
+            sampler: Function that takes a random generator and returns a
+                nullary function drawing from the fitted distribution.
+            num_params: Number of fitted parameters, for the AIC.
+        """
+        self.name = name
+        self.params = params
+        self.mean = mean
+        self.cdf = cdf
+        self.sampler = sampler
+        self.num_params = num_params
+        self.ks = None  # type: Optional[float]
+        self.log_likelihood = None  # type: Optional[float]
+        self.aic = None  # type: Optional[float]
+
+    def __repr__(self):
+        """Printable representation of this object."""
+        return "%s(%s, %r, ks=%r, aic=%r)" % (
+            type(self).__name__, self.name, self.params, self.ks, self.aic)
+
+
+# Special functions
+
+def _digamma(x):
+    # type: (float) -> float
+    result = 0.0
+    while x < 6:
+        result -= 1 / x
+        x += 1
+    f = 1 / (x * x)
+    return result + math.log(x) - 0.5 / x - \
+        f * (1 / 12 - f * (1 / 120 - f * (1 / 252 - f * (1 / 240))))
+
+
+def _trigamma(x):
+    # type: (float) -> float
+    result = 0.0
+    while x < 6:
+        result += 1 / (x * x)
+        x += 1
+    f = 1 / (x * x)
+    return result + 1 / x + f / 2 + \
+        f / x * (1 / 6 - f * (1 / 30 - f * (1 / 42 - f / 30)))
+
+
+def _gamma_p(a, x):
+    # type: (float, float) -> float
+    """Regularized lower incomplete gamma function P(a, x)."""
+    if x <= 0:
+        return 0.0
+    if math.isinf(x):
+        return 1.0
+    log_prefix = a * math.log(x) - x - math.lgamma(a)
+    if x < a + 1:
+        # series
+        term = total = 1 / a
+        n = a
+        for _ in range(1000):
+            n += 1
+            term *= x / n
+            total += term
+            if abs(term) < abs(total) * 1e-15:
+                break
+        return min(1.0, total * math.exp(log_prefix))
+    # continued fraction for Q(a, x) (modified Lentz)
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 1000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return max(0.0, 1.0 - math.exp(log_prefix) * h)
+
+
+_erf = np.vectorize(math.erf, otypes=[np.float64])
+
+
+# Fits
+
+def fit_exponential(stats):
+    # type: (SampleStats) -> Fit
+    """Maximum likelihood exponential fit."""
+    rate = 1 / stats.mean
+
+    def cdf(x):
+        return -np.expm1(-rate * x)
+
+    def sampler(rng):
+        return lambda: rng.expovariate(rate)
+
+    return Fit("exponential", {"rate": rate}, stats.mean, cdf, sampler, 1)
+
+
+def fit_lognormal(stats):
+    # type: (SampleStats) -> Fit
+    """Maximum likelihood lognormal fit."""
+    mu = stats.mean_log
+    sigma = math.sqrt(max(1e-300, stats.sum_log_sq / stats.count - mu ** 2))
+
+    def cdf(x):
+        with np.errstate(divide="ignore"):
+            z = (np.log(x) - mu) / (sigma * math.sqrt(2))
+        return 0.5 * (1 + _erf(z))
+
+    def sampler(rng):
+        return lambda: rng.lognormvariate(mu, sigma)
+
+    return Fit("lognormal", {"mu": mu, "sigma": sigma},
+               math.exp(mu + sigma ** 2 / 2), cdf, sampler, 2)
+
+
+def fit_gamma(stats, iterations=20):
+    # type: (SampleStats, int) -> Fit
+    """Maximum likelihood gamma fit (Minka's Newton iteration for the
+    shape)."""
+    s = math.log(stats.mean) - stats.mean_log
+    s = max(s, 1e-12)
+    shape = (3 - s + math.sqrt((s - 3) ** 2 + 24 * s)) / (12 * s)
+    for _ in range(iterations):
+        num = math.log(shape) - _digamma(shape) - s
+        den = shape * shape * (1 / shape - _trigamma(shape))
+        new = 1 / (1 / shape + num / den)
+        if abs(new - shape) < 1e-12 * shape:
+            shape = new
+            break
+        shape = new
+    scale = stats.mean / shape
+    gamma_p = np.vectorize(lambda v: _gamma_p(shape, v / scale),
+                           otypes=[np.float64])
+
+    def sampler(rng):
+        return lambda: rng.gammavariate(shape, scale)
+
+    return Fit("gamma", {"shape": shape, "scale": scale}, stats.mean,
+               gamma_p, sampler, 2)
+
+
+def _bounded_edges(stats):
+    # type: (SampleStats) -> np.ndarray
+    """The bin edges, with the underflow and overflow bins bounded by the
+    smallest and largest samples."""
+    edges = stats.edges.copy()
+    edges[0] = min(stats.min, stats.low)
+    edges[-1] = max(stats.max, stats.high)
+    return edges
+
+
+def _bin_points(stats):
+    # type: (SampleStats) -> Tuple[np.ndarray, np.ndarray]
+    """Representative values, the geometric midpoints, and counts of the
+    non-empty bins."""
+    edges = _bounded_edges(stats)
+    mids = np.sqrt(edges[:-1] * edges[1:])
+    nonzero = stats.counts > 0
+    return mids[nonzero], stats.counts[nonzero].astype(np.float64)
+
+
+def fit_hyperexponential(stats, iterations=200):
+    # type: (SampleStats, int) -> Optional[Fit]
+    """Two-phase hyperexponential fit, by expectation-maximization on the
+    histogram, starting from the fit matching the mean and the squared
+    coefficient of variation with balanced means (p1 / rate1 = p2 /
+    rate2).  None unless the coefficient of variation is above 1, as
+    the fit would then be an exponential one."""
+    scv = stats.scv
+    if scv <= 1:
+        return None
+    mean = stats.mean
+    p = (1 + math.sqrt((scv - 1) / (scv + 1))) / 2
+    rate1 = 2 * p / mean
+    rate2 = 2 * (1 - p) / mean
+    x, w = _bin_points(stats)
+    total = w.sum()
+    for _ in range(iterations):
+        d1 = p * rate1 * np.exp(-rate1 * x)
+        d2 = (1 - p) * rate2 * np.exp(-rate2 * x)
+        r1 = w * d1 / np.maximum(d1 + d2, 1e-300)
+        r2 = w - r1
+        w1 = r1.sum()
+        if w1 <= 0 or w1 >= total:
+            break
+        p = w1 / total
+        rate1 = w1 / np.dot(r1, x)
+        rate2 = (total - w1) / np.dot(r2, x)
+    p, rate1, rate2 = float(p), float(rate1), float(rate2)
+
+    def cdf(x):
+        return 1 - p * np.exp(-rate1 * x) - (1 - p) * np.exp(-rate2 * x)
+
+    def sampler(rng):
+        def draw():
+            rate = rate1 if rng.random() < p else rate2
+            return rng.expovariate(rate)
+        return draw
+
+    return Fit("hyperexponential", {"p": p, "rate1": rate1, "rate2": rate2},
+               p / rate1 + (1 - p) / rate2, cdf, sampler, 3)
+
+
+def fit_empirical(stats):
+    # type: (SampleStats) -> Fit
+    """The histogram as a distribution, uniform in log scale within each
+    bin, with the bins bounded by the smallest and largest samples."""
+    edges = np.clip(_bounded_edges(stats), stats.min, stats.max)
+    cum = np.cumsum(stats.counts) / stats.count
+    cum_edges = np.concatenate(([0.0], cum))
+    bounds = edges.tolist()
+    cum_list = cum.tolist()
+    cum_list[-1] = 1.0
+    log_edges = np.log(edges)
+
+    def cdf(x):
+        x = np.asarray(x, dtype=np.float64)
+        with np.errstate(divide="ignore"):
+            return np.interp(np.log(np.clip(x, edges[0], edges[-1])),
+                             log_edges, cum_edges) * (x >= edges[0])
+
+    def sampler(rng):
+        def draw():
+            u = rng.random()
+            i = bisect.bisect_right(cum_list, u)
+            lo, hi = bounds[i], bounds[i + 1]
+            return lo * (hi / lo) ** rng.random()
+        return draw
+
+    nonzero = int(np.count_nonzero(stats.counts))
+    return Fit("empirical", {"bins": nonzero}, stats.mean, cdf, sampler,
+               max(1, nonzero - 1))
+
+
+def goodness_of_fit(fit, stats):
+    # type: (Fit, SampleStats) -> Fit
+    """Set the goodness-of-fit metrics of fit against the samples of
+    stats, and return it."""
+    model = fit.cdf(stats.edges)
+    model[0], model[-1] = 0.0, 1.0
+    empirical = np.concatenate(([0.0], np.cumsum(stats.counts))) / \
+        stats.count
+    fit.ks = float(np.max(np.abs(model - empirical)))
+    probs = np.maximum(np.diff(model), 1e-300)
+    counts = stats.counts
+    fit.log_likelihood = float(np.dot(counts, np.log(probs)))
+    fit.aic = 2 * fit.num_params - 2 * fit.log_likelihood
+    return fit
+
+
+FITTERS = (fit_exponential, fit_lognormal, fit_gamma, fit_hyperexponential,
+           fit_empirical)
+
+
+def fit_all(stats, fitters=FITTERS):
+    # type: (SampleStats, Sequence[Callable[[SampleStats], Optional[Fit]]]) -> List[Fit]
+    """Fits of the candidate distributions, with their goodness-of-fit
+    metrics, ranked by increasing AIC.
+
+    The empirical fit has one parameter per non-empty bin but no
+    modelling error, so it ranks first when the parametric fits are
+    clearly wrong; compare the KS distances to judge how wrong."""
+    fits = [goodness_of_fit(fit, stats)
+            for fit in (fitter(stats) for fitter in fitters)
+            if fit is not None]
+    return sorted(fits, key=lambda f: f.aic)
+
+
+def fcompunits(fit, thread_speed=1.0, rng=None, scale=1.0):
+    # type: (Fit, float, Optional[random.Random], float) -> Callable[[], float]
+    """Nullary function drawing compute units from a fit of service
+    times, for CoreSvcRequester.
+
+    Args:
+        fit: A fit of service times.
+        thread_speed: Speed of a hardware thread of the target server,
+            i.e., its speed / max_concurrency.
+        rng: Random generator, the random module by default.
+        scale: Factor applied to the service times, e.g., to match a
+            mean demand from service_demand: demand / fit.mean.
+    """
+    draw = fit.sampler(rng if rng is not None else random)
+    factor = thread_speed * scale
+    return lambda: factor * draw()
+
+
+def service_demand(utilizations, completions, max_concurrency=1):
+    # type: (Sequence[float], Sequence[float], int) -> float
+    """Mean service demand per request by the service demand law.
+
+    Args:
+        utilizations: Utilization samples of a server over equal
+            intervals, in [0, 1].
+        completions: Number of requests completed by the server in each
+            of the intervals.
+        max_concurrency: Hardware threads of the server.
+
+    Returns:
+        The mean busy time of a hardware thread per request, in units of
+        the intervals' length.
+    """
+    busy = float(np.sum(np.asarray(utilizations, dtype=np.float64))) * \
+        max_concurrency
+    return busy / float(np.sum(np.asarray(completions, dtype=np.float64)))
+
+
+def read_service_times(path, svc_col, time_col, chunk_size=1000000):
+    # type: (str, str, str, int) -> Iterator[Tuple[np.ndarray, np.ndarray]]
+    """Chunks of (service names, service times) arrays from the named
+    columns of a CSV file with a header row, parsed by pandas.  Requires
+    pandas."""
+    try:
+        import pandas as pd
+    except ImportError:
+        raise ImportError("Reading service times requires pandas.")
+    reader = pd.read_csv(path, usecols=[svc_col, time_col],
+                         dtype={svc_col: str, time_col: np.float64},
+                         chunksize=chunk_size)
+    for chunk in reader:
+        yield (np.asarray(chunk[svc_col], dtype=str),
+               np.asarray(chunk[time_col], dtype=np.float64))
+
+
+class Calibrator(object):
+    """Accumulates the service times of several services, chunk by chunk,
+    and fits each.
+
+    Attributes:
+        << See __init__. >>
+        << Additional attributes: >>
+
+        stats (Dict[str, SampleStats]): Samples of each service, by name.
+    """
+
+    def __init__(self, **stats_args):
+        """Initializer.
+
+        Args:
+            **stats_args: Arguments of the SampleStats of each service.
+        """
+        self.stats_args = stats_args
+        self.stats = collections.OrderedDict()  # type: Dict[str, SampleStats]
+
+    def __repr__(self):
+        """Printable representation of this object."""
+        return type(self).__name__ + repr(self.__dict__)
+
+    def _stats(self, svc_name):
+        # type: (str) -> SampleStats
+        stats = self.stats.get(svc_name)
+        if stats is None:
+            stats = self.stats[svc_name] = SampleStats(**self.stats_args)
+        return stats
+
+    def add(self, svc_name, times):
+        # type: (str, Sequence[float]) -> None
+        """Accumulate service times of one service."""
+        self._stats(svc_name).add(times)
+
+    def add_chunk(self, svc_names, times):
+        # type: (Sequence[str], Sequence[float]) -> None
+        """Accumulate service times of several services, given with their
+        service names."""
+        names = np.asarray(svc_names)
+        times = np.asarray(times, dtype=np.float64)
+        unique, inverse = np.unique(names, return_inverse=True)
+        order = np.argsort(inverse, kind="stable")
+        bounds = np.searchsorted(inverse[order], np.arange(len(unique) + 1))
+        for (i, svc_name) in enumerate(unique.tolist()):
+            self._stats(svc_name).add(times[order[bounds[i]:bounds[i + 1]]])
+
+    def add_all(self, chunks):
+        # type: (Iterable[Tuple[Sequence[str], Sequence[float]]]) -> None
+        """Accumulate chunks of (service names, service times), e.g., from
+        read_service_times."""
+        for (svc_names, times) in chunks:
+            self.add_chunk(svc_names, times)
+
+    def fits(self, fitters=FITTERS):
+        # type: (Sequence[Callable[[SampleStats], Optional[Fit]]]) -> Dict[str, List[Fit]]
+        """Ranked fits of each service (see fit_all)."""
+        return collections.OrderedDict(
+            (svc_name, fit_all(stats, fitters))
+            for (svc_name, stats) in self.stats.items())
+
+    def report(self, fitters=FITTERS):
+        # type: (Sequence[Callable[[SampleStats], Optional[Fit]]]) -> str
+        """Table of the fits of each service."""
+        lines = ["%-20s %-16s %10s %8s %14s  %s"
+                 % ("service", "distribution", "mean", "ks", "aic",
+                    "parameters")]
+        for (svc_name, fits) in self.fits(fitters).items():
+            for fit in fits:
+                params = ", ".join("%s=%.4g" % (k, v)
+                                   for (k, v) in sorted(fit.params.items()))
+                lines.append("%-20s %-16s %10.4g %8.4f %14.6g  %s"
+                             % (svc_name, fit.name, fit.mean, fit.ks,
+                                fit.aic, params))
+        return "\n".join(lines)
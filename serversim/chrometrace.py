@@ -0,0 +1,158 @@
+"""
+Export of simulated request spans in the Chrome trace-event format.
+
+The exported JSON can be loaded in chrome://tracing or in the Perfetto
+UI.  Each top-level request and its sub-requests are shown as nested
+async spans, and each server gets a track group with the phases of the
+core requests it executed: waiting for a software thread, waiting for a
+hardware thread, and processing.
+
+Spans are written as requests complete, so memory use does not grow
+with the length of the run.  A configurable fraction of the top-level
+requests is exported; the choice is a deterministic function of the
+top-level request's id, so the whole tree of a sampled request is
+exported.
+"""
+
+import json
+from typing import Any, Dict, IO, Optional, Union
+
+from .trace import COMPLETED, CANCELLED
+
+
+# Phases of core requests on servers, as (name, start label, end label)
+_PHASES = (
+    ("sw_queue", "sw_thread_requested", "sw_thread_acquired"),
+    ("hw_queue", "hw_thread_requested", "hw_thread_acquired"),
+    ("processing", "hw_thread_acquired", "hw_thread_released"),
+)
+
+_REQUESTS_PID = 0
+
+
+def _root(svc_req):
+    # type: (Any) -> Any
+    while svc_req.parent is not None:
+        svc_req = svc_req.parent
+    return svc_req
+
+
+class ChromeTraceExporter(object):
+    """Tracer subscriber that streams request spans to a Chrome
+    trace-event JSON file.
+
+    Usage:
+        exporter = ChromeTraceExporter("trace.json", sample_rate=0.01)
+        tracer.subscribe(exporter, ChromeTraceExporter.KINDS, env)
+        ...
+        tracer.unsubscribe(exporter)
+        exporter.close()
+
+    Attributes:
+        << See __init__. >>
+        << Additional attributes: >>
+
+        exported_count (int): Number of spans of requests written.
+        sampled_out_count (int): Number of finished requests not written
+            because their top-level request was not sampled.
+    """
+
+    KINDS = (COMPLETED, CANCELLED)  # the event kinds to subscribe to
+
+    def __init__(self, file, sample_rate=1.0, time_scale=1e6):
+        # type: (Union[str, IO[str]], float, float) -> None
+        """Initializer.
+
+        Args:
+            file: A path, or a text file object opened for writing.
+                A file opened from a path is closed by close().
+            sample_rate: Fraction of top-level requests whose trees are
+                exported, between 0 and 1.
+            time_scale: Number of microseconds, the trace-event time
+                unit, per unit of simulated time.
+        """
+        assert 0 <= sample_rate <= 1, "sample_rate must be between 0 and 1"
+        if not hasattr(file, "write"):
+            self._file = open(file, "w")
+            self._owns_file = True
+        else:
+            self._file = file
+            self._owns_file = False
+        self.sample_rate = sample_rate
+        self.time_scale = time_scale
+        self.exported_count = 0
+        self.sampled_out_count = 0
+        self._threshold = int(sample_rate * 2 ** 32)
+        self._server_pids = {}  # type: Dict[str, int]
+        self._separator = "[\n"
+
+    def _sampled(self, root_id):
+        # type: (int) -> bool
+        # Knuth's multiplicative hash spreads consecutive ids
+        return (root_id * 2654435761) % 2 ** 32 < self._threshold
+
+    def _write(self, event):
+        # type: (Dict[str, Any]) -> None
+        self._file.write(self._separator)
+        self._file.write(json.dumps(event, separators=(",", ":")))
+        self._separator = ",\n"
+
+    def _server_pid(self, name):
+        # type: (str) -> int
+        pid = self._server_pids.get(name)
+        if pid is None:
+            pid = self._server_pids[name] = len(self._server_pids) + 1
+            self._write({"name": "process_name", "ph": "M", "pid": pid,
+                         "args": {"name": name}})
+        return pid
+
+    def _span(self, pid, cat, span_id, name, start, end, args=None):
+        # type: (int, str, int, str, float, float, Optional[Dict[str, Any]]) -> None
+        scale = self.time_scale
+        begin = {"name": name, "cat": cat, "ph": "b", "id": span_id,
+                 "pid": pid, "tid": 0, "ts": start * scale}
+        if args is not None:
+            begin["args"] = args
+        self._write(begin)
+        self._write({"name": name, "cat": cat, "ph": "e", "id": span_id,
+                     "pid": pid, "tid": 0, "ts": end * scale})
+
+    def __call__(self, kind, time, svc_req):
+        # type: (int, float, Any) -> None
+        root = _root(svc_req)
+        if not self._sampled(root.id):
+            self.sampled_out_count += 1
+            return
+        if self.exported_count == 0:
+            self._write({"name": "process_name", "ph": "M",
+                         "pid": _REQUESTS_PID, "args": {"name": "Requests"}})
+        self.exported_count += 1
+
+        times = svc_req.time_dict
+        parent = svc_req.parent
+        args = {"id": svc_req.id,
+                "parent": parent.id if parent is not None else None}
+        if kind == CANCELLED:
+            args["cancelled"] = True
+        self._span(_REQUESTS_PID, "request", root.id, svc_req.svc_name,
+                   times.get("submitted", time), time, args)
+
+        server = svc_req.server
+        if server is None or "hw_thread_requested" not in times:
+            return  # not a core request
+        pid = self._server_pid(server.name)
+        for (name, start_label, end_label) in _PHASES:
+            if start_label in times and end_label in times:
+                self._span(pid, name, svc_req.id, svc_req.svc_name,
+                           times[start_label], times[end_label])
+
+    def close(self):
+        # type: () -> None
+        """Terminate the JSON array and flush the file, closing it if it
+        was opened by this exporter."""
+        if self._separator == "[\n":
+            self._file.write("[")
+        self._file.write("\n]\n")
+        self._file.flush()
+        if self._owns_file:
+            self._file.close()
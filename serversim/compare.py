@@ -0,0 +1,183 @@
+"""
+Paired comparison of two scenarios under common random numbers.
+
+Each replication runs both scenarios with RandomStreams built from the same
+seed, so that, as far as the scenarios share sources of randomness, they
+see the same think times, service choices and compute units.  The
+resulting positive correlation between the two scenarios' metrics makes
+the paired differences much less variable than the differences between
+independent runs, so a winner can be called with fewer replications.
+
+For every replication, the response times of each scenario are grouped
+into time windows by submission time, and the mean and a tail quantile of
+each window are computed.  Confidence intervals for the mean paired
+difference (second scenario minus first) are obtained with a percentile
+bootstrap over replications, vectorized with NumPy.
+
+Depends on numpy.
+"""
+
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .randutil import RandomStreams
+
+
+def response_times(svc_req_log):
+    # type: (Sequence[Tuple[str, Any]]) -> Tuple[np.ndarray, np.ndarray]
+    """Submission times and response times of the completed requests in a
+    service request log, such as UserGroup.svc_req_log."""
+    submitted = []
+    responses = []
+    for (_, svc_req) in svc_req_log:
+        if svc_req.is_completed:
+            times = svc_req.time_dict
+            submitted.append(times["submitted"])
+            responses.append(times["completed"] - times["submitted"])
+    return np.array(submitted), np.array(responses)
+
+
+def window_metrics(submitted, responses, window, num_windows, quantile):
+    # type: (np.ndarray, np.ndarray, float, int, float) -> Tuple[np.ndarray, np.ndarray]
+    """Mean and quantile of the response times in each time window, NaN
+    for windows without responses."""
+    idx = (submitted // window).astype(np.int64)
+    keep = idx < num_windows
+    idx = idx[keep]
+    responses = responses[keep]
+    counts = np.bincount(idx, minlength=num_windows)
+    sums = np.bincount(idx, responses, minlength=num_windows)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+    tails = np.full(num_windows, np.nan)
+    order = np.lexsort((responses, idx))
+    bounds = np.searchsorted(idx[order], np.arange(num_windows + 1))
+    sorted_responses = responses[order]
+    for w in np.nonzero(counts)[0]:
+        tails[w] = np.quantile(sorted_responses[bounds[w]:bounds[w + 1]],
+                               quantile)
+    return means, tails
+
+
+def bootstrap_ci(diffs, num_resamples=2000, confidence=0.95, seed=0):
+    # type: (np.ndarray, int, float, int) -> np.ndarray
+    """Percentile bootstrap confidence intervals of the mean over axis 0.
+
+    Args:
+        diffs: Array of shape (R, W) of paired differences, one row per
+            replication.  NaNs are ignored.
+        num_resamples: Number of bootstrap resamples.
+        confidence: Confidence level.
+        seed: Seed of the resampling.
+
+    Returns:
+        Array of shape (W, 2) with the lower and upper bounds.
+    """
+    diffs = np.asarray(diffs, dtype=np.float64)
+    if diffs.ndim == 1:
+        diffs = diffs[:, None]
+    num_reps = diffs.shape[0]
+    rng = np.random.RandomState(seed)
+    # resampled replication indices, all resamples at once
+    picks = rng.randint(0, num_reps, size=(num_resamples, num_reps))
+    with np.errstate(invalid="ignore"):
+        means = np.nanmean(diffs[picks], axis=1)  # (num_resamples, W)
+    alpha = (1 - confidence) / 2
+    return np.nanpercentile(means, [100 * alpha, 100 * (1 - alpha)],
+                            axis=0).T
+
+
+class PairedComparison(object):
+    """Paired differences between two scenarios, second minus first.
+
+    Attributes:
+        window_starts (np.ndarray): Start time of each window.
+        mean_a, mean_b (np.ndarray): Arrays of shape (R, W) with the mean
+            response time per replication and window of each scenario.
+        tail_a, tail_b (np.ndarray): Same for the tail quantile.
+        mean_diff, tail_diff (np.ndarray): Mean paired difference per
+            window, shape (W,).
+        mean_ci, tail_ci (np.ndarray): Bootstrap confidence intervals of
+            mean_diff and tail_diff, shape (W, 2).
+        overall_mean_diff, overall_tail_diff (float): Paired difference
+            averaged over windows and replications.
+        overall_mean_ci, overall_tail_ci (np.ndarray): Their confidence
+            intervals, shape (2,).
+    """
+
+    def __init__(self, window_starts, mean_a, mean_b, tail_a, tail_b,
+                 num_resamples, confidence, seed):
+        # type: (np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, int, float, int) -> None
+        self.window_starts = window_starts
+        self.mean_a = mean_a
+        self.mean_b = mean_b
+        self.tail_a = tail_a
+        self.tail_b = tail_b
+        with np.errstate(invalid="ignore"):
+            mean_d = mean_b - mean_a
+            tail_d = tail_b - tail_a
+            self.mean_diff = np.nanmean(mean_d, axis=0)
+            self.tail_diff = np.nanmean(tail_d, axis=0)
+            per_rep = np.column_stack([np.nanmean(mean_d, axis=1),
+                                       np.nanmean(tail_d, axis=1)])
+        self.mean_ci = bootstrap_ci(mean_d, num_resamples, confidence, seed)
+        self.tail_ci = bootstrap_ci(tail_d, num_resamples, confidence, seed)
+        overall_ci = bootstrap_ci(per_rep, num_resamples, confidence, seed)
+        self.overall_mean_diff, self.overall_tail_diff = \
+            np.nanmean(per_rep, axis=0).tolist()
+        self.overall_mean_ci = overall_ci[0]
+        self.overall_tail_ci = overall_ci[1]
+
+    def winner(self, metric="tail"):
+        # type: (str) -> Optional[str]
+        """The scenario, "a" or "b", with a significantly lower overall
+        metric ("mean" or "tail"), or None if the difference is not
+        significant."""
+        low, high = self.overall_tail_ci if metric == "tail" \
+            else self.overall_mean_ci
+        if low > 0:
+            return "a"
+        if high < 0:
+            return "b"
+        return None
+
+
+def compare_scenarios(scenario_a, scenario_b, replications, horizon, window,
+                      quantile=0.99, seed=0, num_resamples=2000,
+                      confidence=0.95):
+    # type: (Callable[[RandomStreams], Sequence[Tuple[str, Any]]], Callable[[RandomStreams], Sequence[Tuple[str, Any]]], int, float, float, float, int, int, float) -> PairedComparison
+    """Run two scenarios in pairs under common random numbers and compare
+    their response times.
+
+    Args:
+        scenario_a, scenario_b: Functions that run a scenario drawing all
+            random numbers from the given RandomStreams, and return a
+            service request log with the requests to be measured, e.g.,
+            UserGroup.svc_req_log.
+        replications: Number of replication pairs.  Replication i runs
+            both scenarios with RandomStreams(seed + i).
+        horizon: End of the last window.
+        window: Window width.
+        quantile: Tail quantile.
+        seed: Seed of the first replication and of the bootstrap.
+        num_resamples: Number of bootstrap resamples.
+        confidence: Confidence level of the intervals.
+
+    Returns:
+        The comparison.
+    """
+    num_windows = int(np.ceil(horizon / float(window)))
+    metrics = ([], [], [], [])  # type: Tuple[List[np.ndarray], ...]
+    for i in range(replications):
+        for (j, scenario) in enumerate((scenario_a, scenario_b)):
+            submitted, responses = response_times(
+                scenario(RandomStreams(seed + i)))
+            means, tails = window_metrics(submitted, responses, window,
+                                          num_windows, quantile)
+            metrics[j].append(means)
+            metrics[j + 2].append(tails)
+    mean_a, mean_b, tail_a, tail_b = [np.array(m) for m in metrics]
+    return PairedComparison(np.arange(num_windows) * float(window),
+                            mean_a, mean_b, tail_a, tail_b, num_resamples,
+                            confidence, seed)
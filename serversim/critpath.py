@@ -0,0 +1,337 @@
+"""
+Critical-path latency attribution for composite service requests.
+
+A ColumnarTrace records finished service requests as columns of numpy
+arrays.  critical_path_attribution() finds, for every top-level request
+in the trace, the critical path through its tree of sub-requests, and
+attributes the end-to-end service time along that path to software
+thread queueing, hardware thread queueing, processing and other time,
+per service and server.
+
+The critical path of a request is found by walking backwards from its
+completion: the sub-request that completed last before that time is on
+the path, then the one that completed last before that sub-request was
+submitted, and so on.  Time not covered by sub-requests is attributed
+to the request itself.  This handles Seq (consecutive children), Par
+(the last child the composite waited for) and Blkg (the enclosed
+request, plus the Blkg request's own wait for a thread) uniformly.
+
+Depends on numpy.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .trace import COMPLETED, CANCELLED
+
+
+# Time columns, in order
+TIME_LABELS = ("submitted", "completed", "sw_thread_requested",
+               "sw_thread_acquired", "hw_thread_requested",
+               "hw_thread_acquired", "hw_thread_released")
+
+PHASES = ("sw_queue", "hw_queue", "processing", "other")
+
+# (start column, end column) of each phase but "other"
+_PHASE_COLUMNS = ((2, 3), (4, 5), (5, 6))
+
+
+class ColumnarTrace(object):
+    """Columnar record of finished service requests.
+
+    Rows are added with add(), or by subscribing the trace to the tracer
+    (see the trace module), in which case each request is recorded when
+    it completes or is cancelled:
+
+        trace = ColumnarTrace()
+        tracer.subscribe(trace, ColumnarTrace.KINDS, env)
+
+    Rows are kept in Python lists while they are being added; the
+    column properties convert them to numpy arrays on first access
+    after a change.
+
+    Attributes:
+        svc_names (List[str]): Service names, indexed by the codes in
+            *svc*.
+        server_names (List[str]): Server names, indexed by the codes in
+            *server*.
+    """
+
+    KINDS = (COMPLETED, CANCELLED)  # the event kinds to subscribe to
+
+    def __init__(self):
+        # type: () -> None
+        self.svc_names = []  # type: List[str]
+        self.server_names = []  # type: List[str]
+        self._svc_codes = {}  # type: Dict[str, int]
+        self._server_codes = {}  # type: Dict[str, int]
+        self._ids = []  # type: List[int]
+        self._parent_ids = []  # type: List[int]
+        self._svcs = []  # type: List[int]
+        self._servers = []  # type: List[int]
+        self._times = []  # type: List[Tuple[float, ...]]
+        self._arrays = None  # type: Optional[Tuple[np.ndarray, ...]]
+
+    def __len__(self):
+        # type: () -> int
+        return len(self._ids)
+
+    def __call__(self, _kind, _time, svc_req):
+        # type: (int, float, Any) -> None
+        self.add(svc_req)
+
+    @staticmethod
+    def _code(name, names, codes):
+        # type: (str, List[str], Dict[str, int]) -> int
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(names)
+            names.append(name)
+        return code
+
+    def add(self, svc_req):
+        # type: (Any) -> None
+        """Record svc_req, which should have completed or been
+        cancelled."""
+        parent = svc_req.parent
+        server = svc_req.server
+        times = svc_req.time_dict
+        nan = np.nan
+        self._ids.append(svc_req.id)
+        self._parent_ids.append(parent.id if parent is not None else 0)
+        self._svcs.append(self._code(svc_req.svc_name, self.svc_names,
+                                     self._svc_codes))
+        self._servers.append(
+            self._code(server.name, self.server_names, self._server_codes)
+            if server is not None else -1)
+        self._times.append(tuple(times.get(label, nan)
+                                 for label in TIME_LABELS))
+        self._arrays = None
+
+    def _columns(self):
+        # type: () -> Tuple[np.ndarray, ...]
+        if self._arrays is None:
+            self._arrays = (
+                np.array(self._ids, dtype=np.int64),
+                np.array(self._parent_ids, dtype=np.int64),
+                np.array(self._svcs, dtype=np.int32),
+                np.array(self._servers, dtype=np.int32),
+                np.array(self._times, dtype=np.float64).reshape(
+                    len(self._times), len(TIME_LABELS)))
+        return self._arrays
+
+    @property
+    def req_id(self):
+        # type: () -> np.ndarray
+        """Request ids."""
+        return self._columns()[0]
+
+    @property
+    def parent_id(self):
+        # type: () -> np.ndarray
+        """Parent request ids, 0 for top-level requests."""
+        return self._columns()[1]
+
+    @property
+    def svc(self):
+        # type: () -> np.ndarray
+        """Service name codes."""
+        return self._columns()[2]
+
+    @property
+    def server(self):
+        # type: () -> np.ndarray
+        """Server name codes, -1 for requests without a server."""
+        return self._columns()[3]
+
+    @property
+    def times(self):
+        # type: () -> np.ndarray
+        """Times of the events in TIME_LABELS, one column per label, NaN
+        where the event did not occur."""
+        return self._columns()[4]
+
+
+class CriticalPathAttribution(object):
+    """Critical-path time per service and server, aggregated over the
+    top-level requests of a trace.
+
+    Attributes:
+        keys (List[Tuple[str, Optional[str]]]): (service name, server
+            name) pairs.  The server name is None for requests without
+            a server.
+        times (np.ndarray): Array with a row per key and a column per
+            phase in PHASES, holding the total time of the phase on the
+            critical paths.
+        root_count (int): Number of top-level requests.
+        root_time (float): Total service time of the top-level requests,
+            which equals times.sum().
+    """
+
+    def __init__(self, keys, times, root_count, root_time):
+        # type: (List[Tuple[str, Optional[str]]], np.ndarray, int, float) -> None
+        self.keys = keys
+        self.times = times
+        self.root_count = root_count
+        self.root_time = root_time
+
+    def fractions(self):
+        # type: () -> np.ndarray
+        """*times* as fractions of *root_time*."""
+        return self.times / self.root_time if self.root_time > 0 \
+            else np.zeros_like(self.times)
+
+    def as_dict(self):
+        # type: () -> Dict[Tuple[str, Optional[str]], Dict[str, float]]
+        """Mapping from each key to a mapping from phase to time."""
+        return dict((key, dict(zip(PHASES, row.tolist())))
+                    for key, row in zip(self.keys, self.times))
+
+
+def _first_at_or_before(keys, lo, hi, t):
+    # type: (np.ndarray, np.ndarray, np.ndarray, np.ndarray) -> np.ndarray
+    """For each i, the first index in [lo[i], hi[i]) at which keys, which
+    are descending in each such range, are <= t[i], or hi[i] if none.
+    Bisects all the ranges at once."""
+    lo = lo.copy()
+    hi = hi.copy()
+    last = max(len(keys) - 1, 0)
+    while True:
+        active = lo < hi
+        if not active.any():
+            return lo
+        mid = (lo + hi) // 2
+        after = active & (keys[np.minimum(mid, last)] > t)
+        lo = np.where(after, mid + 1, lo)
+        hi = np.where(active & ~after, mid, hi)
+
+
+def _critical_segments(trace):
+    # type: (ColumnarTrace) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+    """The segments of the critical paths of the top-level requests, as
+    arrays (rows, starts, ends), together with the top-level rows.  Each
+    segment is a time interval attributed to a row of the trace.
+
+    The trees are walked level by level: at each iteration, every request
+    whose critical path is being followed picks, among its remaining
+    children, the last one that completed before its current time."""
+    ids = trace.req_id
+    parent_ids = trace.parent_id
+    submitted = trace.times[:, 0]
+    completed = trace.times[:, 1]
+    n = len(ids)
+
+    # row of each request's parent, -1 for top-level or unknown parents
+    by_id = np.argsort(ids, kind="mergesort")
+    pos = np.searchsorted(ids[by_id], parent_ids)
+    pos[pos >= n] = 0
+    parent_rows = np.where((parent_ids != 0) & (n > 0) &
+                           (ids[by_id[pos]] == parent_ids),
+                           by_id[pos], -1)
+
+    # children of each row, most recently completed first, skipping
+    # children that did not complete
+    finished = ~np.isnan(completed)
+    order = np.lexsort((-completed, parent_rows))
+    order = order[finished[order] & (parent_rows[order] >= 0)]
+    order_completed = completed[order]
+    sorted_parents = parent_rows[order]
+    first = np.searchsorted(sorted_parents, np.arange(n), side="left")
+    last = np.searchsorted(sorted_parents, np.arange(n), side="right")
+
+    roots = np.nonzero((parent_ids == 0) & finished)[0]
+
+    # Each cursor follows the critical path of a request over
+    # [lo, t], t decreasing, with the children before index pos of
+    # order already passed over.
+    rows = roots
+    lo = submitted[roots]
+    t = completed[roots]
+    pos = first[roots]
+    live = t > lo
+    rows, lo, t, pos = rows[live], lo[live], t[live], pos[live]
+    seg_rows = []  # type: List[np.ndarray]
+    seg_starts = []  # type: List[np.ndarray]
+    seg_ends = []  # type: List[np.ndarray]
+    while len(rows):
+        idx = _first_at_or_before(order_completed, pos, last[rows], t)
+        has_child = idx < last[rows]
+
+        # requests without further children: the rest of their interval
+        done = ~has_child
+        seg_rows.append(rows[done])
+        seg_starts.append(lo[done])
+        seg_ends.append(t[done])
+
+        rows, lo, t, idx = rows[has_child], lo[has_child], t[has_child], \
+            idx[has_child]
+        children = order[idx]
+        end = completed[children]
+        start = np.maximum(submitted[children], lo)
+
+        # the gap between the child's completion and the current time
+        gap = end < t
+        seg_rows.append(rows[gap])
+        seg_starts.append(end[gap])
+        seg_ends.append(t[gap])
+
+        # continue with the children and, before them, their parents
+        rows = np.concatenate((children, rows))
+        lo = np.concatenate((start, lo))
+        t = np.concatenate((end, start))
+        pos = np.concatenate((first[children], idx + 1))
+        live = t > lo
+        rows, lo, t, pos = rows[live], lo[live], t[live], pos[live]
+
+    if not seg_rows:
+        return (np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0),
+                roots)
+    return (np.concatenate(seg_rows).astype(np.int64),
+            np.concatenate(seg_starts).astype(np.float64),
+            np.concatenate(seg_ends).astype(np.float64),
+            roots)
+
+
+def critical_path_attribution(trace):
+    # type: (ColumnarTrace) -> CriticalPathAttribution
+    """Attribute the service time of the top-level requests in trace to
+    phases along their critical paths, per service and server.
+
+    Args:
+        trace: The trace.  Top-level requests are those without a parent;
+            requests whose parent is not in the trace are ignored.
+
+    Returns:
+        The attribution.
+    """
+    rows, starts, ends, roots = _critical_segments(trace)
+    times = trace.times[rows]
+
+    # overlap of each segment with each phase interval
+    phase_times = np.zeros((len(rows), len(PHASES)))
+    for i, (a, b) in enumerate(_PHASE_COLUMNS):
+        overlap = np.minimum(ends, times[:, b]) - \
+            np.maximum(starts, times[:, a])
+        phase_times[:, i] = np.where(np.isnan(overlap), 0.0,
+                                     np.maximum(overlap, 0.0))
+    phase_times[:, -1] = (ends - starts) - phase_times[:, :-1].sum(axis=1)
+
+    # aggregate by (service, server)
+    num_servers = len(trace.server_names) + 1  # + 1 for "no server"
+    codes = trace.svc[rows].astype(np.int64) * num_servers + \
+        (trace.server[rows] + 1)
+    uniq, inverse = np.unique(codes, return_inverse=True)
+    totals = np.zeros((len(uniq), len(PHASES)))
+    np.add.at(totals, inverse, phase_times)
+
+    keys = []
+    for code in uniq.tolist():
+        svc_code, server_code = divmod(code, num_servers)
+        keys.append((trace.svc_names[svc_code],
+                     trace.server_names[server_code - 1]
+                     if server_code > 0 else None))
+
+    root_times = trace.times[roots, 1] - trace.times[roots, 0]
+    return CriticalPathAttribution(keys, totals, len(roots),
+                                   float(root_times.sum()))
@@ -0,0 +1,290 @@
+"""
+Load balancers usable as the *fserver* argument of CoreSvcRequester.
+
+Each load balancer is a callable that takes a service name and returns a
+Server.  The least-loaded balancers keep an index of server loads that is
+updated incrementally from resource state changes, so a selection costs
+O(log n) in the number of servers instead of a scan of all servers.
+"""
+
+import bisect
+import random
+from typing import Callable, Mapping, Optional, Sequence, Tuple
+
+from .server import Server
+
+
+def hw_load(server):
+    # type: (Server) -> int
+    """Number of requests queued for or holding a hardware thread."""
+    return server.hw_queue_length + server.hw_in_process_count
+
+
+def thread_load(server):
+    # type: (Server) -> int
+    """Number of requests queued for or holding a software thread, i.e.,
+    requests outstanding on the server."""
+    return server.thread_queue_length + server.thread_in_use_count
+
+
+class RoundRobin(object):
+    """Picks servers in cyclic order.
+
+    Attributes:
+        << See __init__. >>
+    """
+
+    def __init__(self, servers):
+        # type: (Sequence[Server]) -> None
+        """Initializer.
+
+        Args:
+            servers: The servers to be picked from.
+        """
+        assert len(servers) > 0, "List of servers must be non-empty"
+        self.servers = list(servers)
+        self._next = 0
+
+    def __call__(self, _svc_name):
+        # type: (str) -> Server
+        server = self.servers[self._next]
+        self._next += 1
+        if self._next == len(self.servers):
+            self._next = 0
+        return server
+
+
+class WeightedRandom(object):
+    """Picks servers randomly with probabilities proportional to weights.
+
+    Attributes:
+        << See __init__. >>
+    """
+
+    def __init__(self, weighted_servers, rng=None):
+        # type: (Sequence[Tuple[Server, float]], Optional[random.Random]) -> None
+        """Initializer.
+
+        Args:
+            weighted_servers: Server-weight pairs.  The weights do not need
+                to add up to 1.
+            rng: Random number generator from which the servers are drawn,
+                e.g., a stream of a randutil.RandomStreams.  Defaults to
+                the random module.
+        """
+        assert len(weighted_servers) > 0, "List of servers must be non-empty"
+        self.weighted_servers = weighted_servers
+        self.rng = rng if rng is not None else random
+        self._servers = [p[0] for p in weighted_servers]
+        self._cum_weights = []
+        cum = 0.0
+        for _, weight in weighted_servers:
+            cum += weight
+            self._cum_weights.append(cum)
+        self._total = cum
+
+    def __call__(self, _svc_name):
+        # type: (str) -> Server
+        x = self.rng.random() * self._total
+        idx = bisect.bisect_right(self._cum_weights, x)
+        return self._servers[min(idx, len(self._servers) - 1)]
+
+
+class PowerOfTwoChoices(object):
+    """Samples two distinct servers at random and picks the less loaded one.
+
+    Needs no index, as it only looks at two servers per selection.
+
+    Attributes:
+        << See __init__. >>
+    """
+
+    def __init__(self, servers, load=hw_load, rng=None):
+        # type: (Sequence[Server], Callable[[Server], float], Optional[random.Random]) -> None
+        """Initializer.
+
+        Args:
+            servers: The servers to be picked from.
+            load: Function that returns the current load of a server.
+                Defaults to hw_load.
+            rng: Random number generator from which the servers are
+                sampled, e.g., a stream of a randutil.RandomStreams.
+                Defaults to the random module.
+        """
+        assert len(servers) > 0, "List of servers must be non-empty"
+        self.servers = list(servers)
+        self.load = load
+        self.rng = rng if rng is not None else random
+
+    def __call__(self, _svc_name):
+        # type: (str) -> Server
+        n = len(self.servers)
+        if n == 1:
+            return self.servers[0]
+        rng = self.rng
+        i = rng.randrange(n)
+        j = rng.randrange(n - 1)
+        if j >= i:
+            j += 1
+        s1 = self.servers[i]
+        s2 = self.servers[j]
+        return s2 if self.load(s2) < self.load(s1) else s1
+
+
+class _LoadIndex(object):
+    """Indexed binary min-heap of servers keyed by (load, position).
+
+    Ties are broken by the server's position in the list of servers.
+    """
+
+    def __init__(self, servers, load):
+        # type: (Sequence[Server], Callable[[Server], float]) -> None
+        self._servers = list(servers)
+        self._load = load
+        n = len(self._servers)
+        self._keys = [load(s) for s in self._servers]
+        self._heap = list(range(n))  # heap of server positions
+        self._pos = list(range(n))  # position in heap of each server
+        for k in range(n // 2 - 1, -1, -1):
+            self._sift_down(k)
+
+    def _less(self, i, j):
+        # type: (int, int) -> bool
+        ki = self._keys[i]
+        kj = self._keys[j]
+        return ki < kj or (ki == kj and i < j)
+
+    def _swap(self, a, b):
+        # type: (int, int) -> None
+        heap = self._heap
+        heap[a], heap[b] = heap[b], heap[a]
+        self._pos[heap[a]] = a
+        self._pos[heap[b]] = b
+
+    def _sift_up(self, k):
+        # type: (int) -> None
+        heap = self._heap
+        while k > 0:
+            parent = (k - 1) // 2
+            if not self._less(heap[k], heap[parent]):
+                break
+            self._swap(k, parent)
+            k = parent
+
+    def _sift_down(self, k):
+        # type: (int) -> None
+        heap = self._heap
+        n = len(heap)
+        while True:
+            child = 2 * k + 1
+            if child >= n:
+                break
+            if child + 1 < n and self._less(heap[child + 1], heap[child]):
+                child += 1
+            if not self._less(heap[child], heap[k]):
+                break
+            self._swap(k, child)
+            k = child
+
+    def update(self, i):
+        # type: (int) -> None
+        """Refresh the key of the server at position i."""
+        old = self._keys[i]
+        new = self._load(self._servers[i])
+        if new == old:
+            return
+        self._keys[i] = new
+        if new < old:
+            self._sift_up(self._pos[i])
+        else:
+            self._sift_down(self._pos[i])
+
+    def min(self):
+        # type: () -> Server
+        """The least loaded server."""
+        return self._servers[self._heap[0]]
+
+
+class LeastLoaded(object):
+    """Picks the server with the least load.
+
+    Server loads are kept in an index that is updated whenever a server's
+    resources change state, so that a selection costs O(log n).
+    Ties are broken in favor of the server that comes first in the list
+    of servers.
+
+    Attributes:
+        << See __init__. >>
+    """
+
+    def __init__(self, servers, load, add_listener):
+        # type: (Sequence[Server], Callable[[Server], float], Callable[[Server, Callable[[], None]], None]) -> None
+        """Initializer.
+
+        Args:
+            servers: The servers to be picked from.
+            load: Function that returns the current load of a server.
+            add_listener: Function that registers a listener with a server,
+                to be called whenever the server's load may have changed,
+                e.g., Server.add_hw_listener.
+        """
+        assert len(servers) > 0, "List of servers must be non-empty"
+        self.servers = list(servers)
+        self.load = load
+        self._index = _LoadIndex(self.servers, load)
+        for i, server in enumerate(self.servers):
+            add_listener(server, self._listener(i))
+
+    def _listener(self, i):
+        # type: (int) -> Callable[[], None]
+        index = self._index
+
+        def listener():
+            index.update(i)
+
+        return listener
+
+    def __call__(self, _svc_name):
+        # type: (str) -> Server
+        return self._index.min()
+
+
+class JoinShortestQueue(LeastLoaded):
+    """Picks the server with the fewest requests queued for or holding
+    a hardware thread."""
+
+    def __init__(self, servers):
+        # type: (Sequence[Server]) -> None
+        LeastLoaded.__init__(self, servers, hw_load, Server.add_hw_listener)
+
+
+class LeastOutstandingRequests(LeastLoaded):
+    """Picks the server with the fewest requests queued for or holding
+    a software thread."""
+
+    def __init__(self, servers):
+        # type: (Sequence[Server]) -> None
+        LeastLoaded.__init__(self, servers, thread_load,
+                             Server.add_thread_listener)
+
+
+class ServiceRouter(object):
+    """Dispatches to a different load balancer for each service name.
+
+    Attributes:
+        << See __init__. >>
+    """
+
+    def __init__(self, balancers):
+        # type: (Mapping[str, Callable[[str], Server]]) -> None
+        """Initializer.
+
+        Args:
+            balancers: Map from service name to the load balancer for
+                that service.
+        """
+        self.balancers = balancers
+
+    def __call__(self, svc_name):
+        # type: (str) -> Server
+        return self.balancers[svc_name](svc_name)
@@ -0,0 +1,220 @@
+"""
+Vectorized evaluation of single-tier FIFO scenarios with the multi-server
+Lindley (Kiefer-Wolfowitz) recursion.
+
+A single-tier scenario is an open workload sent through a load balancer to
+identical servers, each equivalent to a Server with *max_concurrency*
+hardware threads and enough software threads never to be the bottleneck.
+The hardware queue of such a server is a FIFO multi-server queue, whose
+waiting times satisfy
+
+    w[n] = min(W[n]),  W[n+1] = max(W[n] + s[n] e(argmin W[n]) - a[n+1], 0)
+
+where W[n] is the vector of remaining work on each hardware thread seen
+by request n, s[n] is its processing duration and a[n+1] the time between
+arrivals n and n+1.  The recursion is sequential in n, but independent
+across scenarios, servers and replications, so a batch of them is
+evaluated in lockstep with NumPy, one request at a time for all rows.
+
+Depends on numpy.
+"""
+
+from typing import Callable, Optional, Sequence, Union
+
+import numpy as np
+
+
+def lindley_waits(interarrivals, durations, num_threads):
+    # type: (np.ndarray, np.ndarray, Union[int, np.ndarray]) -> np.ndarray
+    """Waiting times of requests in a batch of FIFO multi-server queues.
+
+    Args:
+        interarrivals: Array of shape (R, N).  interarrivals[r, n] is the
+            time between arrivals n - 1 and n in queue r; the first
+            column is the time of the first arrival.
+        durations: Array of shape (R, N) of processing durations.
+        num_threads: Number of servers (hardware threads) of each queue,
+            an int or an int array of shape (R,).
+
+    Returns:
+        Array of shape (R, N) with the time each request waits before
+        starting to be processed.
+    """
+    interarrivals = np.asarray(interarrivals, dtype=np.float64)
+    durations = np.asarray(durations, dtype=np.float64)
+    num_rows, num_reqs = durations.shape
+    threads = np.broadcast_to(np.asarray(num_threads), (num_rows,))
+    width = int(threads.max())
+
+    # remaining work per thread; threads a queue does not have never free up
+    work = np.zeros((num_rows, width))
+    work[np.arange(width)[None, :] >= threads[:, None]] = np.inf
+    rows = np.arange(num_rows)
+    waits = np.empty((num_rows, num_reqs))
+    for n in range(num_reqs):
+        work -= interarrivals[:, n, None]
+        np.maximum(work, 0.0, out=work)
+        idx = work.argmin(axis=1)
+        wait = work[rows, idx]
+        waits[:, n] = wait
+        work[rows, idx] = wait + durations[:, n]
+    return waits
+
+
+class SingleTierResult(object):
+    """Metrics of a batch of single-tier scenarios, one array element per
+    scenario, named after the corresponding UserGroup and Server methods.
+
+    Attributes:
+        response_times (np.ndarray): Array of shape (S, M) with the
+            response times of the measured requests of each scenario,
+            padded with NaN for scenarios with fewer servers than others.
+        hw_queue_times (np.ndarray): Array of shape (S, M) with the
+            corresponding times spent waiting for a hardware thread.
+        avg_response_time (np.ndarray): Average response time.
+        std_dev_response_time (np.ndarray): Standard deviation of the
+            response time.
+        max_response_time (np.ndarray): Maximum response time.
+        avg_hw_queue_time (np.ndarray): Average time waiting for a
+            hardware thread.
+        throughput (np.ndarray): Requests completed per unit of time,
+            across all servers.
+        utilization (np.ndarray): Average hardware utilization of the
+            servers.
+    """
+
+    def __init__(self, response_times, hw_queue_times, throughput,
+                 utilization):
+        # type: (np.ndarray, np.ndarray, np.ndarray, np.ndarray) -> None
+        self.response_times = response_times
+        self.hw_queue_times = hw_queue_times
+        self.avg_response_time = np.nanmean(response_times, axis=1)
+        self.std_dev_response_time = np.nanstd(response_times, axis=1)
+        self.max_response_time = np.nanmax(response_times, axis=1)
+        self.avg_hw_queue_time = np.nanmean(hw_queue_times, axis=1)
+        self.throughput = throughput
+        self.utilization = utilization
+
+    def response_time_quantiles(self, quantiles=(0.5, 0.95, 0.99)):
+        # type: (Sequence[float]) -> np.ndarray
+        """Array of shape (S, len(quantiles)) of response time
+        quantiles."""
+        return np.nanpercentile(self.response_times,
+                                100 * np.asarray(quantiles), axis=1).T
+
+
+def exponential_comp_units(mean):
+    # type: (float) -> Callable[[np.random.RandomState, tuple], np.ndarray]
+    """Sampler of exponentially distributed compute units with the given
+    mean, for SingleTierBatch."""
+    def sample(rng, shape):
+        return rng.exponential(mean, shape)
+    return sample
+
+
+def constant_comp_units(value):
+    # type: (float) -> Callable[[np.random.RandomState, tuple], np.ndarray]
+    """Sampler of constant compute units, for SingleTierBatch."""
+    def sample(_rng, shape):
+        return np.full(shape, float(value))
+    return sample
+
+
+class SingleTierBatch(object):
+    """A batch of single-tier scenarios with Poisson arrivals.
+
+    Scenario parameters are scalars or arrays of shape (S,), broadcast
+    against each other.  Each scenario is evaluated on every server
+    independently, which is exact for the "random" load balancer
+    (Poisson splitting) and for "round_robin" (each server receives
+    every num_servers-th arrival, so its interarrival times are
+    Erlang distributed).
+
+    Attributes:
+        << See __init__. >>
+    """
+
+    LOAD_BALANCERS = ("random", "round_robin")
+
+    def __init__(self, arrival_rate, num_servers, max_concurrency, speed,
+                 fcompunits, lb="random", num_requests=10000,
+                 warmup_requests=0, seed=None):
+        # type: (Union[float, np.ndarray], Union[int, np.ndarray], Union[int, np.ndarray], Union[float, np.ndarray], Callable[[np.random.RandomState, tuple], np.ndarray], str, int, int, Optional[int]) -> None
+        """Initializer.
+
+        Args:
+            arrival_rate: Total arrival rate of requests at the load
+                balancer.
+            num_servers: Number of servers behind the load balancer.
+            max_concurrency: Number of hardware threads of each server.
+            speed: Aggregate speed of each server, as for Server.
+            fcompunits: Function that takes a numpy RandomState and a
+                shape and returns an array of that shape of compute
+                units (see exponential_comp_units and
+                constant_comp_units).
+            lb: The load balancer, one of LOAD_BALANCERS.
+            num_requests: Number of requests simulated per server.
+            warmup_requests: Number of initial requests per server
+                excluded from the metrics.
+            seed: Seed of the numpy RandomState.
+        """
+        assert lb in self.LOAD_BALANCERS, "unknown load balancer " + lb
+        assert 0 <= warmup_requests < num_requests, \
+            "warmup_requests must be less than num_requests"
+        (self.arrival_rate, self.num_servers, self.max_concurrency,
+         self.speed) = np.broadcast_arrays(
+            np.atleast_1d(np.asarray(arrival_rate, dtype=np.float64)),
+            np.atleast_1d(np.asarray(num_servers, dtype=np.int64)),
+            np.atleast_1d(np.asarray(max_concurrency, dtype=np.int64)),
+            np.atleast_1d(np.asarray(speed, dtype=np.float64)))
+        self.fcompunits = fcompunits
+        self.lb = lb
+        self.num_requests = num_requests
+        self.warmup_requests = warmup_requests
+        self.seed = seed
+
+    def run(self):
+        # type: () -> SingleTierResult
+        """Evaluate all the scenarios."""
+        rng = np.random.RandomState(self.seed)
+        num_scenarios = len(self.arrival_rate)
+        max_servers = int(self.num_servers.max())
+        shape = (num_scenarios * max_servers, self.num_requests)
+
+        # one row per (scenario, server), unused servers included
+        per_server_rate = np.repeat(self.arrival_rate / self.num_servers,
+                                    max_servers)
+        if self.lb == "random":
+            interarrivals = rng.exponential(1.0, shape) / \
+                per_server_rate[:, None]
+        else:
+            erlang_k = np.repeat(self.num_servers, max_servers)
+            interarrivals = rng.gamma(erlang_k[:, None], 1.0, shape) / \
+                (erlang_k * per_server_rate)[:, None]
+        threads = np.repeat(self.max_concurrency, max_servers)
+        durations = self.fcompunits(rng, shape) / \
+            np.repeat(self.speed / self.max_concurrency, max_servers)[:, None]
+
+        waits = lindley_waits(interarrivals, durations, threads)
+
+        # measured requests, NaN for servers a scenario does not have
+        used = (np.arange(max_servers)[None, :] <
+                self.num_servers[:, None]).reshape(-1, 1)
+        measured = slice(self.warmup_requests, None)
+        waits = np.where(used, waits[:, measured], np.nan)
+        durations = np.where(used, durations[:, measured], np.nan)
+        horizon = interarrivals[:, measured].sum(axis=1)
+        num_measured = self.num_requests - self.warmup_requests
+
+        def by_scenario(x):
+            return x.reshape(num_scenarios, -1)
+
+        server_throughput = np.where(used[:, 0], num_measured / horizon,
+                                     np.nan)
+        server_utilization = np.nansum(durations, axis=1) / \
+            (horizon * threads)
+        server_utilization[~used[:, 0]] = np.nan
+        return SingleTierResult(
+            by_scenario(waits + durations), by_scenario(waits),
+            np.nansum(by_scenario(server_throughput), axis=1),
+            np.nanmean(by_scenario(server_utilization), axis=1))
@@ -0,0 +1,277 @@
+"""
+Time-varying numbers of users for UserGroup.
+
+A load profile gives the number of active users of a group as a function
+of time.  UserGroup accepts one as its *num_users* argument, besides the
+int and step function list it always accepted, which are turned into a
+StepProfile.  Profiles:
+
+- StepProfile: a step function, given by (time, users) pairs.
+- RampProfile: a piecewise-linear function through (time, users) points.
+- DiurnalProfile: a sinusoid, e.g., with a period of a simulated day.
+- trace_profile: a step or piecewise-linear profile from samples of
+  a measured number of users, e.g., read with read_samples.
+
+Non-integer numbers of users are rounded to the nearest integer.
+
+Besides count(t), which looks the number of users up in O(log n) for n
+breakpoints (O(1) for DiurnalProfile), a profile enumerates its changes,
+i.e., the times at which the rounded number of users changes, in order.
+The group's controller process sleeps until each change and then
+starts or wakes up exactly the users that become active.  Users that
+become inactive finish their current think time and request, then wait
+until they are woken up again, without intermediate wake-ups.
+"""
+
+from __future__ import division
+
+import bisect
+import csv
+import math
+from typing import Iterable, Iterator, List, Sequence, TextIO, Tuple
+
+
+def _users(y):
+    # type: (float) -> int
+    """The number of users y, rounded half up."""
+    return max(0, int(math.floor(y + 0.5)))
+
+
+class LoadProfile(object):
+    """Base class of load profiles.
+
+    Attributes:
+        max_users (int): Maximum number of users over time.
+    """
+
+    max_users = 0
+
+    def __repr__(self):
+        """Printable representation of this object."""
+        return type(self).__name__ + repr(self.__dict__)
+
+    def count(self, t):
+        # type: (float) -> int
+        """Number of active users at time t >= 0."""
+        raise NotImplementedError("'LoadProfile' is an abstract class.")
+
+    def changes(self):
+        # type: () -> Iterator[Tuple[float, int]]
+        """The (time, users) pairs at which the number of users changes,
+        in increasing time order, starting with (0, count(0)).  May be
+        infinite."""
+        raise NotImplementedError("'LoadProfile' is an abstract class.")
+
+
+def _check_points(points):
+    # type: (Sequence[Tuple[float, float]]) -> None
+    if not points or points[0][0] != 0:
+        raise ValueError("The first point of a load profile must have 0 "
+                         "as its time.")
+    for (p, q) in zip(points, points[1:]):
+        if not p[0] < q[0]:
+            raise ValueError("The times of a load profile must be "
+                             "increasing.")
+
+
+class StepProfile(LoadProfile):
+    """Step function of time.
+
+    Attributes:
+        << See __init__. >>
+        << Additional attributes: >>
+
+        max_users (int): See base class.
+    """
+
+    def __init__(self, steps):
+        # type: (Sequence[Tuple[float, int]]) -> None
+        """Initializer.
+
+        Args:
+            steps: Sequence of (time, users) pairs, with increasing times,
+                the first of which is 0.  Each pair is a step, from its
+                time (inclusive) to the time of the next pair (exclusive).
+        """
+        steps = list(steps)
+        _check_points(steps)
+        self.steps = steps
+        self._times = [p[0] for p in steps]
+        self._values = [_users(p[1]) for p in steps]
+        self.max_users = max(self._values)
+
+    def count(self, t):
+        # type: (float) -> int
+        """See base class."""
+        return self._values[bisect.bisect_right(self._times, t) - 1]
+
+    def changes(self):
+        # type: () -> Iterator[Tuple[float, int]]
+        """See base class."""
+        last = None
+        for (t, users) in zip(self._times, self._values):
+            if users != last:
+                yield t, users
+                last = users
+
+
+class RampProfile(LoadProfile):
+    """Piecewise-linear function of time, constant after its last point.
+
+    Attributes:
+        << See __init__. >>
+        << Additional attributes: >>
+
+        max_users (int): See base class.
+    """
+
+    def __init__(self, points):
+        # type: (Sequence[Tuple[float, float]]) -> None
+        """Initializer.
+
+        Args:
+            points: Sequence of (time, users) points, with increasing
+                times, the first of which is 0, and non-negative numbers
+                of users.
+        """
+        points = list(points)
+        _check_points(points)
+        assert all(p[1] >= 0 for p in points), \
+            "Numbers of users must be non-negative."
+        self.points = points
+        self._times = [p[0] for p in points]
+        self.max_users = max(_users(p[1]) for p in points)
+
+    def _value(self, t):
+        # type: (float) -> float
+        points = self.points
+        i = bisect.bisect_right(self._times, t) - 1
+        if i == len(points) - 1:
+            return points[i][1]
+        (ta, ya), (tb, yb) = points[i], points[i + 1]
+        return ya + (yb - ya) * (t - ta) / (tb - ta)
+
+    def count(self, t):
+        # type: (float) -> int
+        """See base class."""
+        return _users(self._value(t))
+
+    def changes(self):
+        # type: () -> Iterator[Tuple[float, int]]
+        """See base class."""
+        c = _users(self.points[0][1])
+        yield 0, c
+        for ((ta, ya), (tb, yb)) in zip(self.points, self.points[1:]):
+            # the rounded count changes where y crosses c +/- 0.5
+            while c + 0.5 <= yb:
+                c += 1
+                yield ta + (c - 0.5 - ya) * (tb - ta) / (yb - ya), c
+            while c - 0.5 > yb:
+                c -= 1
+                yield ta + (c + 0.5 - ya) * (tb - ta) / (yb - ya), c
+
+
+class DiurnalProfile(LoadProfile):
+    """Sinusoidal function of time:
+    mean + amplitude * sin(2 * pi * (t - phase) / period).
+
+    Attributes:
+        << See __init__. >>
+        << Additional attributes: >>
+
+        max_users (int): See base class.
+    """
+
+    def __init__(self, mean, amplitude, period, phase=0.0):
+        # type: (float, float, float, float) -> None
+        """Initializer.
+
+        Args:
+            mean: Mean number of users.
+            amplitude: Amplitude of the variation around the mean, at most
+                the mean.
+            period: Period, e.g., 24 * 3600 for a day in seconds.
+            phase: Time at which the number of users is the mean and
+                increasing.  The peak is a quarter period later.
+        """
+        assert 0 <= amplitude <= mean, \
+            "The amplitude must be non-negative and at most the mean."
+        assert period > 0, "The period must be positive."
+        self.mean = mean
+        self.amplitude = amplitude
+        self.period = period
+        self.phase = phase
+        self.max_users = _users(mean + amplitude)
+
+    def count(self, t):
+        # type: (float) -> int
+        """See base class."""
+        return _users(self.mean + self.amplitude *
+                      math.sin(2 * math.pi * (t - self.phase) / self.period))
+
+    def changes(self):
+        # type: () -> Iterator[Tuple[float, int]]
+        """See base class.  Infinite unless the amplitude is 0."""
+        c = self.count(0)
+        yield 0, c
+        mean, amplitude = self.mean, self.amplitude
+        if amplitude == 0:
+            return
+        scale = self.period / (2 * math.pi)
+        phase = self.phase
+        # alternately rising and falling half periods, from troughs to
+        # peaks and back, starting with the one that contains t = 0
+        half = int(math.floor((-phase / scale + math.pi / 2) / math.pi))
+        last = 0.0
+        while True:
+            cycle = 2 * math.pi * (half // 2)
+            if half % 2 == 0:
+                while c + 0.5 <= mean + amplitude:
+                    c += 1
+                    u = math.asin((c - 0.5 - mean) / amplitude)
+                    last = max(last, phase + (cycle + u) * scale)
+                    yield last, c
+            else:
+                while c - 0.5 > mean - amplitude:
+                    c -= 1
+                    u = math.pi - math.asin((c + 0.5 - mean) / amplitude)
+                    last = max(last, phase + (cycle + u) * scale)
+                    yield last, c
+            half += 1
+
+
+def trace_profile(samples, scale=1.0, interpolate=False):
+    # type: (Iterable[Tuple[float, float]], float, bool) -> LoadProfile
+    """Profile replaying measured numbers of users.
+
+    Args:
+        samples: (time, users) samples in increasing time order.  Times
+            are shifted so that the first sample is at time 0.
+        scale: Factor applied to the numbers of users, e.g., to replay
+            a production trace at a fraction of its load.
+        interpolate: If true, the numbers of users are interpolated
+            linearly between samples (a RampProfile); otherwise each
+            sample holds until the next one (a StepProfile).
+    """
+    samples = list(samples)
+    if not samples:
+        raise ValueError("A trace profile needs at least one sample.")
+    t0 = samples[0][0]
+    points = [(t - t0, users * scale) for (t, users) in samples]
+    return RampProfile(points) if interpolate else StepProfile(points)
+
+
+def read_samples(file):
+    # type: (TextIO) -> List[Tuple[float, float]]
+    """(time, users) samples from the first two columns of a CSV file,
+    skipping a header row, if any."""
+    samples = []  # type: List[Tuple[float, float]]
+    for row in csv.reader(file):
+        if not row:
+            continue
+        try:
+            samples.append((float(row[0]), float(row[1])))
+        except ValueError:
+            if samples:
+                raise
+    return samples
@@ -2,7 +2,7 @@
 Extension of simpy.Resource to collect basic metrics.
 """
 
-from typing import List, Optional, TYPE_CHECKING
+from typing import Callable, List, Optional, TYPE_CHECKING
 
 import simpy
 import simpy.resources.resource as simpyrr
@@ -43,6 +43,22 @@ class MeasuredResource(simpy.Resource):
         self.cum_service_time = 0  # type: float
         self.queue_length = 0  # type: int
         self.in_use_count = 0  # type: int
+        self._listeners = []  # type: List[Callable[[], None]]
+
+    def add_listener(self, listener):
+        # type: (Callable[[], None]) -> None
+        """Register a nullary function to be called whenever queue_length
+        or in_use_count changes.
+
+        Listeners allow load indexes (see serversim.lb) to be maintained
+        incrementally instead of scanning resources on every decision.
+        """
+        self._listeners.append(listener)
+
+    def _notify(self):
+        # type: () -> None
+        for listener in self._listeners:
+            listener()
 
     def request(self):
         # type: (Optional[SvcRequest]) -> simpyrr.Request
@@ -50,24 +66,60 @@ class MeasuredResource(simpy.Resource):
 
         submission_time = self.env.now
         self.queue_length += 1
+        if self._listeners:
+            self._notify()
 
         def cb(_evt):
             # type: (simpyrr.Request) -> None
+            if req.withdrawn:
+                return
             self.cum_queue_time += self.env.now - submission_time
             self.queue_length -= 1
             self.in_use_count += 1
+            if self._listeners:
+                self._notify()
 
         req = simpy.Resource.request(self)
         req.submission_time = submission_time  # ad-hoc attribute
+        req.withdrawn = False  # ad-hoc attribute
         req.callbacks.append(cb)
         return req
 
+    def cancel(self, req):
+        # type: (simpyrr.Request) -> bool
+        """Withdraw a request that has not been granted yet.
+
+        The request is removed from the queue and then triggered, so that
+        the process waiting for it resumes.  It does not count towards the
+        metrics, and releasing it is a no-op.
+
+        Returns:
+            True if the request was withdrawn, False if it had already
+            been granted.
+        """
+        if req.triggered:
+            return False
+        req.cancel()
+        req.withdrawn = True
+        self.queue_length -= 1
+        if self._listeners:
+            self._notify()
+        req.succeed()
+        return True
+
     def release(self, req):
-        # type: (simpyrr.Request) -> simpyrr.Release
-        """Overrides parent class method to support metrics."""
+        # type: (simpyrr.Request) -> Optional[simpyrr.Release]
+        """Overrides parent class method to support metrics.
+
+        Returns None, without doing anything, if req was withdrawn.
+        """
+        if req.withdrawn:
+            return None
         self.releases += 1
         self.in_use_count -= 1
         self.cum_service_time += self.env.now - req.__dict__["submission_time"]
+        if self._listeners:
+            self._notify()
         return simpy.Resource.release(self, req)
         
     @property
@@ -0,0 +1,331 @@
+"""
+Compilation of service requester trees into flat execution plans.
+
+A service requester tree built with Seq, Par, Blkg and Async produces, on
+every call, one SvcRequest and one SimPy process per node.  Compiling the
+tree yields an ExecutionPlan, a flat list of steps that is executed by a
+single interpreter process per top-level request.  Additional processes
+are created only where concurrency is required, i.e., for the branches of
+Par and for Async calls.
+"""
+
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+import simpy
+
+from .server import Server
+from .service import SvcRequest, SvcRequester, CoreSvcRequester, Async, \
+    Blkg, Seq, Par, CountdownLatch
+
+
+# Step op-codes
+CORE = 0
+THREAD_ACQ = 1
+THREAD_REL = 2
+PAR = 3
+ASYNC = 4
+OPAQUE = 5
+
+
+class ExecutionPlan(object):
+    """A flattened, reusable execution plan for a service requester tree.
+
+    Servers are held in registers.  Register 0 holds the server assigned
+    to the plan's root by its container, if any.  A register that is
+    still empty when a step needs it is filled using the register's
+    selector, which is the load-balancer of the head core requester of
+    the node that owns the register.
+
+    Attributes:
+        steps (List[tuple]): The steps, each a tuple whose first component
+            is an op-code:
+                (CORE, requester, reg, in_blocking_call): execute a
+                    CoreSvcRequester on the server in register reg.
+                (THREAD_ACQ, reg, slot): acquire a software thread on the
+                    server in register reg and keep it in slot.
+                (THREAD_REL, slot): release the software thread in slot.
+                (PAR, requester, reg, branch_plans): execute the
+                    branch plans concurrently and join.
+                (ASYNC, child_plan): fire and forget child_plan.
+                (OPAQUE, requester, reg, in_blocking_call): submit a
+                    request produced by a requester that cannot be
+                    compiled.
+        selectors (List[Optional[Callable[[], Server]]]): Register
+            selectors.
+        num_slots (int): Number of software thread slots.
+    """
+
+    def __init__(self):
+        # type: () -> None
+        self.steps = []  # type: List[tuple]
+        self.selectors = [None]  # type: List[Optional[Callable[[], Server]]]
+        self.num_slots = 0
+
+    def __repr__(self):
+        """Printable representation of this object."""
+        return type(self).__name__ + repr(self.steps)
+
+
+def _head_core(requester):
+    # type: (SvcRequester) -> Optional[CoreSvcRequester]
+    """The core requester whose server a request produced by requester
+    adopts as its own server, if any."""
+    while True:
+        if isinstance(requester, CoreSvcRequester):
+            return requester
+        elif isinstance(requester, Seq):
+            requester = requester.svc_requesters[0]
+        elif isinstance(requester, Blkg):
+            requester = requester.svc_requester
+        elif isinstance(requester, Par) and requester.cont:
+            requester = requester.svc_requesters[0]
+        else:
+            return None
+
+
+def _selector(requester):
+    # type: (SvcRequester) -> Optional[Callable[[], Server]]
+    core = _head_core(requester)
+    return core._select_server if core is not None else None
+
+
+def _is_compilable_core(requester):
+    # type: (SvcRequester) -> bool
+    return (isinstance(requester, CoreSvcRequester)
+            and not requester._gen_overridden)
+
+
+class _Compiler(object):
+    """Builds an ExecutionPlan by walking a requester tree."""
+
+    def __init__(self, root):
+        # type: (SvcRequester) -> None
+        self.plan = ExecutionPlan()
+        self.plan.selectors[0] = _selector(root)
+
+    def _new_reg(self, requester):
+        # type: (SvcRequester) -> int
+        self.plan.selectors.append(_selector(requester))
+        return len(self.plan.selectors) - 1
+
+    def _new_slot(self):
+        # type: () -> int
+        self.plan.num_slots += 1
+        return self.plan.num_slots - 1
+
+    def compile(self, requester, reg, in_blocking_call):
+        # type: (SvcRequester, int, bool) -> None
+        """Append the steps for requester, whose server is in register
+        reg, mirroring the semantics of the requester's _gen."""
+        steps = self.plan.steps
+        if _is_compilable_core(requester):
+            steps.append((CORE, requester, reg, in_blocking_call))
+        elif isinstance(requester, Seq):
+            self.compile(requester.svc_requesters[0], reg, in_blocking_call)
+            # tail requests are continuations only if cont is true
+            others_in_blocking_call = \
+                in_blocking_call if requester.cont else False
+            for tail in requester.svc_requesters[1:]:
+                tail_reg = reg if requester.cont else self._new_reg(tail)
+                self.compile(tail, tail_reg, others_in_blocking_call)
+        elif isinstance(requester, Blkg):
+            slot = None
+            if not in_blocking_call:
+                slot = self._new_slot()
+                steps.append((THREAD_ACQ, reg, slot))
+            self.compile(requester.svc_requester, reg, in_blocking_call)
+            if not in_blocking_call:
+                steps.append((THREAD_REL, slot))
+        elif isinstance(requester, Par):
+            # With parallel calls, in_blocking_call is always False.
+            branch_plans = [compile_plan(child, False)
+                            for child in requester.svc_requesters]
+            steps.append((PAR, requester, reg, branch_plans))
+        elif isinstance(requester, Async) and requester.queue is None:
+            steps.append((ASYNC, compile_plan(requester.svc_requester, False)))
+        else:
+            steps.append((OPAQUE, requester, reg, in_blocking_call))
+
+
+def compile_plan(requester, in_blocking_call=False):
+    # type: (SvcRequester, bool) -> ExecutionPlan
+    """Compile a service requester tree into an ExecutionPlan.
+
+    Args:
+        requester: The root of the tree.
+        in_blocking_call: The in_blocking_call flag of the requests to
+            be executed with the plan.
+
+    Returns:
+        The execution plan.
+    """
+    compiler = _Compiler(requester)
+    compiler.compile(requester, 0, in_blocking_call)
+    return compiler.plan
+
+
+def _execute(env, plan, svc_req, server, val, finish):
+    # type: (simpy.Environment, ExecutionPlan, SvcRequest, Optional[Server], Any, Callable[[Any, Optional[Server]], None]) -> Iterator[simpy.Event]
+    """Interpreter generator that executes plan.
+
+    Args:
+        env: The SimPy Environment.
+        plan: The plan to execute.
+        svc_req: The top-level service request, passed to servers for
+            logging.
+        server: The server assigned to the plan's root, or None.
+        val: The input value.
+        finish: Function called with the output value and the root's
+            server when the plan completes.
+    """
+    regs = [server] + [None] * (len(plan.selectors) - 1)
+    selectors = plan.selectors
+    slots = [None] * plan.num_slots
+
+    for step in plan.steps:
+        op = step[0]
+
+        if op == CORE:
+            _, requester, reg, in_blocking_call = step
+            server = regs[reg]
+            if server is None:
+                select = selectors[reg] or requester._select_server
+                server = regs[reg] = select()
+            comp_units = requester.fcompunits()
+            thread_req = None
+            if not in_blocking_call:
+                thread_req = server.thread_request(svc_req)
+                yield thread_req
+            hw_req = server.hw_request(svc_req)
+            yield hw_req
+            yield env.timeout(server.process_duration(comp_units))
+            server.hw_release(hw_req)
+            val = requester.f(val)
+            if not in_blocking_call:
+                server.thread_release(thread_req)
+
+        elif op == THREAD_ACQ:
+            _, reg, slot = step
+            server = regs[reg]
+            if server is None and selectors[reg] is not None:
+                server = regs[reg] = selectors[reg]()
+            assert server is not None, \
+                "Blkg at top level may only wrap a SvcRequest " \
+                "with a non-null server."
+            thread_req = server.thread_request(svc_req)
+            slots[slot] = (server, thread_req)
+            yield thread_req
+
+        elif op == THREAD_REL:
+            server, thread_req = slots[step[1]]
+            slots[step[1]] = None
+            server.thread_release(thread_req)
+
+        elif op == PAR:
+            _, requester, reg, branch_plans = step
+            branch_server = None
+            if requester.cont:
+                branch_server = regs[reg]
+                if branch_server is None:
+                    branch_server = regs[reg] = selectors[reg]()
+            out_vals = [None] * len(branch_plans)
+            join = CountdownLatch(env, requester.k)
+            for i, branch_plan in enumerate(branch_plans):
+                proc = env.process(_execute(env, branch_plan, svc_req,
+                                            branch_server, val,
+                                            _setter(out_vals, i)))
+                proc.callbacks.append(join.count_down)
+            yield join
+            val = requester.f(list(out_vals))
+
+        elif op == ASYNC:
+            env.process(_execute(env, step[1], svc_req, None, val,
+                                 _ignore))
+            val = None
+
+        else:  # OPAQUE
+            _, requester, reg, in_blocking_call = step
+            request = requester.make_svc_request(svc_req, val,
+                                                 in_blocking_call)
+            if regs[reg] is not None:
+                request.server = regs[reg]
+            yield request.submit()
+            if regs[reg] is None:
+                regs[reg] = request.resolve_server()
+            val = request.out_val
+            svc_req.children.append(request)
+
+    finish(val, regs[0])
+
+
+def _setter(lst, i):
+    # type: (List[Any], int) -> Callable[[Any, Optional[Server]], None]
+    def finish(val, _server):
+        lst[i] = val
+    return finish
+
+
+def _ignore(_val, _server):
+    # type: (Any, Optional[Server]) -> None
+    pass
+
+
+class Compiled(SvcRequester):
+    """Wraps a service requester tree to produce service requests that
+    are executed from a flat ExecutionPlan.
+
+    A request produced by this requester runs the whole tree in a single
+    interpreter process, without producing a service request or process
+    for each node.  Processes are only created for the branches of Par
+    and for Async calls.  Software threads are acquired and released
+    exactly as by the uncompiled tree, so the blocking and continuation
+    semantics of *in_blocking_call* and *cont* are preserved.
+
+    Differences from the uncompiled tree: servers are selected when each
+    step is reached (as with late binding); nodes do not produce service
+    requests, so the logs and sinks of the wrapped requesters are not
+    populated, servers log the top-level request instead and their sinks
+    receive no records; Par stragglers are not cancelled, they run to
+    completion.  Requesters of unknown types are executed as usual, as
+    opaque steps.
+
+    Attributes:
+        << See __init__. >>
+    """
+
+    def __init__(self, env, svc_requester, log=None):
+        # type: (simpy.Environment, SvcRequester, Optional[List[Tuple[str, SvcRequest]]]) -> None
+        """Initializer.
+
+        Args:
+            env: See base class.
+            svc_requester: The root of the requester tree to be compiled.
+            log: See base class.
+        """
+        svc_name = "Compiled(" + svc_requester.svc_name + ")"
+        SvcRequester.__init__(self, env, svc_name, log)
+        self.svc_requester = svc_requester
+        self._plans = {}  # plan for each value of in_blocking_call
+
+    def plan(self, in_blocking_call=False):
+        # type: (bool) -> ExecutionPlan
+        """The execution plan for requests with the given
+        in_blocking_call, compiled on first use."""
+        plan = self._plans.get(in_blocking_call)
+        if plan is None:
+            plan = compile_plan(self.svc_requester, in_blocking_call)
+            self._plans[in_blocking_call] = plan
+        return plan
+
+    def _gen(self, svc_req):
+        # type: (SvcRequest) -> Iterator[simpy.Event]
+        """Generator that will be part of each produced service request.
+
+        See base class.
+        """
+        def finish(val, server):
+            svc_req.server = server
+            svc_req.complete(val)
+
+        return _execute(self.env, self.plan(svc_req.in_blocking_call),
+                        svc_req, svc_req.server, svc_req.in_val, finish)
@@ -0,0 +1,326 @@
+"""
+Capacity planning: search for the cheapest server counts that meet
+latency targets.
+
+The planner treats a scenario as a black box *evaluate(counts, seed)*,
+which runs one replication of a simulation with the given number of
+servers in each pool and returns the measured latency metric (e.g., the
+99th percentile response time) of each service.  The server count of
+each pool is found by bisection, assuming that latencies do not increase
+when servers are added.  Candidates are evaluated with batches of
+replications, in parallel processes if requested, and each candidate is
+decided as soon as the confidence intervals of its metrics are clearly
+inside or outside the targets.
+
+An optional *estimate(counts)*, e.g., based on the analytic module,
+seeds the search: counts at which the estimate already misses a target
+are ruled out without simulation, so the estimate must be optimistic,
+i.e., a lower bound of the simulated metric, such as the mean response
+time for a percentile target.
+"""
+
+from __future__ import division
+
+import math
+import multiprocessing
+from typing import Any, Callable, Dict, List, Mapping, Optional, \
+    Sequence, Tuple
+
+
+Counts = Dict[str, int]
+
+
+def _call(args):
+    # type: (Tuple[Callable[[Counts, int], Mapping[str, float]], Counts, int]) -> Mapping[str, float]
+    evaluate, counts, seed = args
+    return evaluate(counts, seed)
+
+
+class Candidate(object):
+    """The evaluation of one assignment of server counts.
+
+    Attributes:
+        counts (Dict[str, int]): Server count of each pool.
+        samples (Dict[str, List[float]]): Metric of each service in each
+            replication.
+        verdicts (Dict[str, Optional[bool]]): For each service, whether
+            it meets its target, or None while undecided.
+    """
+
+    def __init__(self, counts):
+        # type: (Counts) -> None
+        self.counts = counts
+        self.samples = {}  # type: Dict[str, List[float]]
+        self.verdicts = {}  # type: Dict[str, Optional[bool]]
+
+    @property
+    def replications(self):
+        # type: () -> int
+        """Number of replications run."""
+        return len(next(iter(self.samples.values()))) if self.samples else 0
+
+    def mean(self, svc):
+        # type: (str) -> float
+        """Mean metric of svc over the replications."""
+        xs = self.samples[svc]
+        return sum(xs) / len(xs)
+
+    def half_width(self, svc, z):
+        # type: (str, float) -> float
+        """Half-width of the confidence interval of the mean metric of svc,
+        for the normal quantile z."""
+        xs = self.samples[svc]
+        n = len(xs)
+        if n < 2:
+            return float("inf")
+        m = sum(xs) / n
+        var = sum((x - m) ** 2 for x in xs) / (n - 1)
+        return z * math.sqrt(var / n)
+
+    def __repr__(self):
+        """Printable representation of this object."""
+        return type(self).__name__ + repr(self.__dict__)
+
+
+class PlanResult(object):
+    """Outcome of CapacityPlanner.plan().
+
+    Attributes:
+        counts (Optional[Dict[str, int]]): The cheapest server counts
+            found to meet all targets, or None if the maximum counts do
+            not meet them.
+        cost (Optional[float]): The cost of counts.
+        candidates (List[Candidate]): All candidates evaluated, in order.
+    """
+
+    def __init__(self, counts, cost, candidates):
+        # type: (Optional[Counts], Optional[float], List[Candidate]) -> None
+        self.counts = counts
+        self.cost = cost
+        self.candidates = candidates
+
+    @property
+    def replications(self):
+        # type: () -> int
+        """Total number of replications run."""
+        return sum(c.replications for c in self.candidates)
+
+    def __repr__(self):
+        """Printable representation of this object."""
+        return type(self).__name__ + repr(self.__dict__)
+
+
+class CapacityPlanner(object):
+    """Searches minimal server counts meeting latency targets.
+
+    Attributes:
+        << See __init__. >>
+    """
+
+    def __init__(self, evaluate, pools, sla, min_counts, max_counts,
+                 cost=None, estimate=None, min_replications=3,
+                 max_replications=20, batch_size=None, z=1.96,
+                 processes=1, seed=0):
+        # type: (Callable[[Counts, int], Mapping[str, float]], Mapping[str, Sequence[str]], Mapping[str, float], Counts, Counts, Optional[Callable[[Counts], float]], Optional[Callable[[Counts], Mapping[str, float]]], int, int, Optional[int], float, int, int) -> None
+        """Initializer.
+
+        Args:
+            evaluate: Function of (counts, seed) that runs one replication
+                with counts[pool] servers in each pool and returns a
+                mapping from service name to the measured metric.  Must
+                be picklable (e.g., a module-level function) if
+                processes > 1.
+            pools: Mapping from pool name to the names of the services
+                whose latency depends on the pool's server count.
+            sla: Mapping from service name to its target: the metric
+                must be below the target.
+            min_counts: Smallest server count of each pool.
+            max_counts: Largest server count of each pool.
+            cost: Cost of counts, used to choose which pool to grow when
+                the counts found per pool do not meet the targets
+                together.  Defaults to the total number of servers.
+            estimate: Optional optimistic estimate of the metrics for
+                counts (see module docstring).
+            min_replications: Replications run before a candidate can be
+                decided.
+            max_replications: Replications after which a candidate is
+                decided on its mean metrics.
+            batch_size: Replications run between decisions.  Defaults to
+                max(processes, 2).
+            z: Normal quantile of the confidence intervals.
+            processes: Number of processes running replications in
+                parallel.
+            seed: Seed of the first replication.  Replication i uses
+                seed + i for every candidate, so that candidates are
+                compared with common random numbers.
+        """
+        self.evaluate = evaluate
+        self.pools = pools
+        self.sla = sla
+        self.min_counts = dict(min_counts)
+        self.max_counts = dict(max_counts)
+        if cost is None:
+            def cost(counts): return sum(counts.values())
+        self.cost = cost
+        self.estimate = estimate
+        self.min_replications = min_replications
+        self.max_replications = max_replications
+        self.batch_size = batch_size if batch_size is not None \
+            else max(processes, 2)
+        self.z = z
+        self.processes = processes
+        self.seed = seed
+        self._candidates = {}  # type: Dict[Tuple[Tuple[str, int], ...], Candidate]
+        self._order = []  # type: List[Candidate]
+        self._pool = None  # type: Any
+
+    def _map(self, args):
+        # type: (List[tuple]) -> List[Mapping[str, float]]
+        if self.processes <= 1:
+            return [_call(a) for a in args]
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self.processes)
+        return self._pool.map(_call, args)
+
+    def _decide(self, candidate, svcs, final):
+        # type: (Candidate, Sequence[str], bool) -> Optional[bool]
+        """Update the verdicts of svcs; return whether they all meet their
+        targets, or None if undecided."""
+        if candidate.replications == 0:
+            return None
+        for svc in svcs:
+            if candidate.verdicts.get(svc) is not None:
+                continue
+            mean = candidate.mean(svc)
+            target = self.sla[svc]
+            if final:
+                candidate.verdicts[svc] = mean < target
+            elif candidate.replications >= self.min_replications:
+                hw = candidate.half_width(svc, self.z)
+                if mean + hw < target:
+                    candidate.verdicts[svc] = True
+                elif mean - hw > target:
+                    candidate.verdicts[svc] = False
+        verdicts = [candidate.verdicts.get(svc) for svc in svcs]
+        if False in verdicts:
+            return False
+        if None in verdicts:
+            return None
+        return True
+
+    def meets(self, counts, svcs=None):
+        # type: (Counts, Optional[Sequence[str]]) -> bool
+        """Whether counts meet the targets of svcs (all services by
+        default), running replications as needed."""
+        if svcs is None:
+            svcs = list(self.sla)
+        if self.estimate is not None:
+            estimated = self.estimate(counts)
+            if any(estimated[svc] >= self.sla[svc] for svc in svcs):
+                return False
+        key = tuple(sorted(counts.items()))
+        candidate = self._candidates.get(key)
+        if candidate is None:
+            candidate = self._candidates[key] = Candidate(dict(counts))
+            self._order.append(candidate)
+        while True:
+            done = candidate.replications >= self.max_replications
+            verdict = self._decide(candidate, svcs, done)
+            if verdict is not None:
+                return verdict
+            start = candidate.replications
+            n = min(self.batch_size, self.max_replications - start)
+            results = self._map([(self.evaluate, dict(counts),
+                                  self.seed + start + i) for i in range(n)])
+            for metrics in results:
+                for svc in self.sla:
+                    candidate.samples.setdefault(svc, []).append(metrics[svc])
+
+    def _seed_count(self, pool, counts):
+        # type: (str, Counts) -> int
+        """The smallest count of pool that the estimate does not rule out,
+        with the other pools at counts."""
+        lo = self.min_counts[pool]
+        if self.estimate is None:
+            return lo
+        hi = self.max_counts[pool]
+        svcs = self.pools[pool]
+
+        def ok(n):
+            trial = dict(counts)
+            trial[pool] = n
+            estimated = self.estimate(trial)
+            return all(estimated[svc] < self.sla[svc] for svc in svcs)
+
+        if not ok(hi):
+            return hi
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ok(mid):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def _search_pool(self, pool, counts):
+        # type: (str, Counts) -> Optional[int]
+        """Minimal count of pool meeting the targets of its services, with
+        the other pools at counts, or None if the maximum does not."""
+        svcs = self.pools[pool]
+        top = self.max_counts[pool]
+
+        def meets(n):
+            trial = dict(counts)
+            trial[pool] = n
+            return self.meets(trial, svcs)
+
+        # bracket: lo fails or is the minimum, hi meets the targets
+        lo = self._seed_count(pool, counts)
+        hi = lo
+        while not meets(hi):
+            if hi >= top:
+                return None
+            lo = hi + 1
+            hi = min(top, max(hi * 2, hi + 1))
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if meets(mid):
+                hi = mid
+            else:
+                lo = mid + 1
+        return hi
+
+    def plan(self):
+        # type: () -> PlanResult
+        """Run the search."""
+        try:
+            counts = dict(self.max_counts)
+            for pool in self.pools:
+                n = self._search_pool(pool, counts)
+                if n is None:
+                    return PlanResult(None, None, self._order)
+                counts[pool] = n
+
+            # pools were sized with the pools searched before them at
+            # their maximum; grow the cheapest failing pool until all
+            # targets are met together
+            while not self.meets(counts):
+                failing = [pool for pool in self.pools
+                           if not self.meets(counts, self.pools[pool])
+                           and counts[pool] < self.max_counts[pool]]
+                if not failing:
+                    return PlanResult(None, None, self._order)
+
+                def grown(pool):
+                    trial = dict(counts)
+                    trial[pool] += 1
+                    return trial
+
+                counts = min((grown(pool) for pool in failing),
+                             key=self.cost)
+            return PlanResult(counts, self.cost(counts), self._order)
+        finally:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+                self._pool = None
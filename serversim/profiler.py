@@ -0,0 +1,387 @@
+"""
+Opt-in profiler attributing wall-clock time and event counts to the
+components of a simulation.
+
+While installed on an environment, the profiler times steps of the
+environment, i.e., the processing of one SimPy event, and attributes them
+to the component whose code the step runs, found among the event's
+callbacks:
+
+- a service requester, by type and service name, for the steps of its
+  service requests' processes and of the fast path of CoreSvcRequester;
+- a user group, for the steps of its users' processes (think times,
+  service choice, submission of the top-level request and tallies);
+- the generator name of any other process, or the event type for events
+  that resume no process, e.g., resource releases.
+
+Each step is also attributed to a server, that of the service request
+run by the step if any, and to a group, the request group that submitted
+the top-level request of the service request's tree, if the profiler is
+given the group.  Load balancing and timestamp logging can additionally
+be timed on their own; their time is then reported under their own
+components instead of the steps calling them.
+
+By default, one step in *sample_every* (64) on average is timed and
+attributed, at random intervals, and stands for *sample_every* steps in
+the statistics, so times and event counts are estimates.  The other
+steps only cost a counter decrement.
+
+Example:
+
+    profiler = Profiler(env, requesters=[svc_1, svc_2], groups=[users])
+    with profiler:
+        env.run(until=simtime)
+    print(profiler.format_report())
+
+The profiler only affects its environment, and the requesters and groups
+it is given, so profilers of different environments can be installed at
+the same time.  Steps are attributed by looking at the next event of the
+environment and at the processes it resumes, which are SimPy internals
+(see simpyinternals.next_event and process_locals).  With a SimPy
+release whose internals are not supported, steps cannot be attributed
+and are not timed.
+"""
+
+from __future__ import print_function, division
+
+import random
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import simpy
+from simpy.events import Process
+
+from .service import SvcRequest, SvcRequester, CoreSvcRequester, _CoreRun
+from .simpyinternals import next_event, process_locals
+from .usergroup import RequestGroup
+from .util import nullary
+
+
+_clock = getattr(time, "perf_counter", time.time)
+
+NONE = "-"
+
+# component, server, group
+Key = Tuple[str, str, str]
+
+# Profilers timing SvcRequest.log_time, by environment.  While there are
+# any, SvcRequest.log_time is replaced by _dispatched_log_time, which
+# only times the calls for the requests of these environments.
+_log_time_profilers = {}  # type: Dict[simpy.Environment, Profiler]
+_saved_log_time = []  # type: List[Any]
+
+
+def _dispatched_log_time(svc_req, label):
+    # type: (SvcRequest, str) -> None
+    profiler = _log_time_profilers.get(svc_req._env)
+    if profiler is None:
+        return _saved_log_time[0](svc_req, label)
+    return profiler._timed_log_time(svc_req, label)
+
+
+def _root_group(svc_req):
+    # type: (SvcRequest) -> str
+    while svc_req.parent is not None:
+        svc_req = svc_req.parent
+    tag = svc_req.__dict__.get("_profile_group")
+    # the tag of a recycled request is stale, it has a former id
+    if tag is None or tag[0] != svc_req.id:
+        return NONE
+    return tag[1]
+
+
+class Profiler(object):
+    """Attributes time and events of an environment's steps to components,
+    servers and groups (see module docstring).
+
+    Attributes:
+        << See __init__. >>
+        << Additional attributes: >>
+
+        stats (Dict[Tuple[str, str, str], List[float]]): Map from
+            (component, server, group) to [seconds, count], where count
+            is the number of events processed, or of calls for load
+            balancing and logging, estimated from the sampled steps.
+        installed (bool): Whether the profiler is installed.
+    """
+
+    def __init__(self, env, requesters=(), log_time=False, sample_every=64,
+                 seed=0, groups=()):
+        # type: (simpy.Environment, Sequence[CoreSvcRequester], bool, int, int, Sequence[RequestGroup]) -> None
+        """Initializer.
+
+        Args:
+            env: The SimPy Environment.
+            requesters: CoreSvcRequesters whose load balancers (fserver)
+                are timed separately.
+            log_time: If true, SvcRequest.log_time is timed separately,
+                for the service requests of env.
+            sample_every: Average number of steps per timed step.  If 1,
+                every step is timed, which gives exact event counts.  On
+                the scenarios of the benchmarks (1000 users), the default
+                of 64 slows simulations down by 2-10% (CPU time), about
+                5% on average, low enough to leave the profiler on in
+                sweeps, against 35-45% for 1; the overhead grows as
+                sample_every decreases (about 10% for 16).
+            seed: Seed of the profiler's own random number generator,
+                which draws the intervals between timed steps.  The
+                simulation's random numbers are not affected.
+            groups: RequestGroups whose service requests are attributed
+                to them, with their sub-requests.  The steps of other
+                groups' requests are attributed to no group.
+        """
+        assert sample_every >= 1, "sample_every must be at least 1"
+        self.env = env
+        self.requesters = list(requesters)
+        self.groups = list(groups)
+        self.log_time = log_time
+        self.sample_every = sample_every
+        self.stats = {}  # type: Dict[Key, List[float]]
+        self.installed = False
+        self._rng = random.Random(seed)
+        self._countdown = self._drawn = self._interval()
+        self._sampling = False  # whether the current step is timed
+        self._components = {}  # type: Dict[Any, str]
+        self._server = NONE
+        self._group = NONE
+        self._nested = 0.0  # time of nested timings in the current step
+        self._saved_fservers = []  # type: List[Tuple[CoreSvcRequester, Any, Any]]
+        self._saved_submitted = []  # type: List[Tuple[RequestGroup, Any]]
+        self._timed_log_time = None  # type: Any
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.uninstall()
+        return False
+
+    def __repr__(self):
+        """Printable representation of this object."""
+        return type(self).__name__ + repr(self.__dict__)
+
+    def install(self):
+        # type: () -> None
+        """Start profiling the environment."""
+        assert not self.installed, "Profiler already installed."
+        env = self.env
+        self._step = env.step
+        env.step = self._profiled_step
+        for requester in self.requesters:
+            self._saved_fservers.append(
+                (requester, requester.fserver, requester._select_server))
+            fserver = self._timed(requester.fserver,
+                                  "load balancing " + requester.svc_name)
+            requester.fserver = fserver
+            requester._select_server = nullary(fserver, requester.svc_name)
+        for group in self.groups:
+            self._saved_submitted.append(
+                (group, group.__dict__.get("_submitted")))
+            group._submitted = self._tagged(group)
+        if self.log_time:
+            assert env not in _log_time_profilers, \
+                "log_time already timed for this environment."
+            if not _log_time_profilers:
+                _saved_log_time.append(SvcRequest.log_time)
+                SvcRequest.log_time = _dispatched_log_time
+            self._timed_log_time = self._timed(_saved_log_time[0],
+                                               "log_time")
+            _log_time_profilers[env] = self
+        self.installed = True
+
+    def uninstall(self):
+        # type: () -> None
+        """Stop profiling, restoring the environment."""
+        if not self.installed:
+            return
+        del self.env.step
+        for (requester, fserver, select_server) in self._saved_fservers:
+            requester.fserver = fserver
+            requester._select_server = select_server
+        self._saved_fservers = []
+        for (group, submitted) in self._saved_submitted:
+            if submitted is None:
+                del group._submitted
+            else:
+                group._submitted = submitted
+        self._saved_submitted = []
+        if _log_time_profilers.get(self.env) is self:
+            del _log_time_profilers[self.env]
+            self._timed_log_time = None
+            if not _log_time_profilers:
+                SvcRequest.log_time = _saved_log_time.pop()
+        self.installed = False
+
+    def _interval(self):
+        # type: () -> int
+        """Number of steps until the next timed step, sample_every on
+        average."""
+        n = self.sample_every
+        return 1 if n == 1 else self._rng.randint(1, 2 * n - 1)
+
+    @property
+    def step_count(self):
+        # type: () -> int
+        """Number of steps processed while installed, timed or not."""
+        return self._drawn - self._countdown
+
+    def _timed(self, f, component):
+        """f, timing its calls under component in the timed steps."""
+        profiler = self
+
+        def timed(*args):
+            if not profiler._sampling:
+                return f(*args)
+            start = _clock()
+            try:
+                return f(*args)
+            finally:
+                elapsed = _clock() - start
+                profiler._nested += elapsed
+                profiler._add((component, profiler._server, profiler._group),
+                              elapsed)
+        return timed
+
+    @staticmethod
+    def _tagged(group):
+        # type: (RequestGroup) -> Any
+        """group._submitted, tagging the service requests with the
+        group."""
+        submitted = group._submitted
+
+        def tagged(svc, svc_req):
+            # ad-hoc attribute
+            svc_req._profile_group = (svc_req.id, group.name)
+            submitted(svc, svc_req)
+        return tagged
+
+    def _add(self, key, elapsed):
+        # type: (Key, float) -> None
+        """Account for a timing in a timed step, which stands for
+        sample_every steps."""
+        n = self.sample_every
+        entry = self.stats.get(key)
+        if entry is None:
+            self.stats[key] = [elapsed * n, n]
+        else:
+            entry[0] += elapsed * n
+            entry[1] += n
+
+    def _component(self, owner):
+        # type: (Any) -> str
+        component = self._components.get(owner)
+        if component is None:
+            if isinstance(owner, SvcRequester):
+                component = type(owner).__name__ + " " + owner.svc_name
+            elif isinstance(owner, RequestGroup):
+                component = type(owner).__name__ + " " + owner.name
+            else:
+                component = type(owner).__name__
+            self._components[owner] = component
+        return component
+
+    @staticmethod
+    def _tag(proc):
+        # type: (Process) -> Tuple[Any, Optional[SvcRequest]]
+        """Tag a process with the object running it, its generator's
+        *self*, or else the generator's name, and with its service
+        request, if any."""
+        generator, f_locals = process_locals(proc)
+        owner = f_locals.get("self")
+        if not isinstance(owner, (SvcRequester, RequestGroup)):
+            owner = getattr(generator, "__name__", type(generator).__name__)
+        svc_req = f_locals.get("svc_req")
+        if not isinstance(svc_req, SvcRequest):
+            svc_req = None
+        tag = proc._profile_tag = (owner, svc_req)  # ad-hoc attribute
+        return tag
+
+    def _classify(self, event):
+        # type: (simpy.Event) -> Tuple[str, str, str]
+        """Component, server and group of the step processing event."""
+        for callback in event.callbacks or ():
+            owner = getattr(callback, "__self__", None)
+            if type(owner) is _CoreRun:
+                return (self._component(owner.requester), owner.server.name,
+                        _root_group(owner.svc_req))
+            if isinstance(owner, Process):
+                tag = owner.__dict__.get("_profile_tag")
+                if tag is None:
+                    tag = self._tag(owner)
+                proc_owner, svc_req = tag
+                if isinstance(proc_owner, str):
+                    return proc_owner, NONE, NONE
+                if isinstance(proc_owner, RequestGroup):
+                    return self._component(proc_owner), NONE, proc_owner.name
+                if svc_req is not None:
+                    server = svc_req.server
+                    return (self._component(proc_owner),
+                            server.name if server is not None else NONE,
+                            _root_group(svc_req))
+                return self._component(proc_owner), NONE, NONE
+        return "simpy " + type(event).__name__, NONE, NONE
+
+    def _profiled_step(self):
+        # type: () -> None
+        """Environment.step, timed and attributed if sampled."""
+        self._countdown -= 1
+        if self._countdown:
+            return self._step()
+        self._timed_step()
+
+    def _timed_step(self):
+        # type: () -> None
+        """Environment.step, timed and attributed."""
+        interval = self._interval()
+        self._countdown = interval
+        self._drawn += interval
+        event = next_event(self.env)
+        if event is None:
+            return self._step()
+        component, server, group = self._classify(event)
+        self._server = server
+        self._group = group
+        self._nested = 0.0
+        self._sampling = True
+        start = _clock()
+        try:
+            self._step()
+        finally:
+            elapsed = _clock() - start - self._nested
+            self._sampling = False
+            self._add((component, server, group), elapsed)
+
+    def totals(self, by="component"):
+        # type: (str) -> List[Tuple[str, float, int]]
+        """(name, seconds, count) per component, server or group, ranked
+        by decreasing time."""
+        index = ("component", "server", "group").index(by)
+        totals = {}  # type: Dict[str, List[float]]
+        for (key, (elapsed, count)) in self.stats.items():
+            entry = totals.setdefault(key[index], [0.0, 0])
+            entry[0] += elapsed
+            entry[1] += count
+        return sorted(((name, t, int(n)) for (name, (t, n)) in totals.items()),
+                      key=lambda row: -row[1])
+
+    @property
+    def total_time(self):
+        # type: () -> float
+        """Total time attributed."""
+        return sum(entry[0] for entry in self.stats.values())
+
+    def format_report(self, top=10):
+        # type: (int) -> str
+        """Ranked report of the top components, servers and groups."""
+        total = self.total_time or 1.0
+        lines = []
+        for by in ("component", "server", "group"):
+            lines.append("%-40s %10s %7s %10s" % ("By " + by, "seconds", "%",
+                                                  "events"))
+            for (name, elapsed, count) in self.totals(by)[:top]:
+                lines.append("%-40s %10.4f %6.1f%% %10d"
+                             % (name[:40], elapsed, 100 * elapsed / total,
+                                count))
+            lines.append("")
+        return "\n".join(lines)
@@ -2,8 +2,9 @@
 Utilities for random generation and choice of values.
 """
 
+import hashlib
 import random
-from typing import Tuple, TypeVar, Callable
+from typing import Dict, Tuple, TypeVar, Callable
 
 from .util import curried_nullary
 
@@ -28,6 +29,15 @@ def prob_chooser(*weighted_items):
         a function that randomly picks a key in weighted_items with a
             probability proportional to the associated values.
     """
+    return rng_prob_chooser(random, *weighted_items)
+
+
+def rng_prob_chooser(rng, *weighted_items):
+    # type: (random.Random, *Tuple[T, float]) -> Callable[[], T]
+    """
+    Same as prob_chooser, drawing random numbers from rng, which can be
+    a random.Random instance or the random module.
+    """
     items = [z[0] for z in weighted_items]
     raw_freqs = [z[1] for z in weighted_items]
     sum_raw_freqs = float(sum(raw_freqs))
@@ -41,7 +51,7 @@ def prob_chooser(*weighted_items):
     cum_freqs[len(freqs)-1] = 1.0  # eliminate possible rounding error
     
     def ret():
-        random_num = random.random()
+        random_num = rng.random()
         for i in range(0, len(weighted_items)):
             if cum_freqs[i] > random_num:  # Random.random() is in [0.0, 1.0)
                 return items[i]
@@ -49,6 +59,35 @@ def prob_chooser(*weighted_items):
     return ret
 
 
+class RandomStreams(object):
+    """
+    Independent, named streams of random numbers derived from a seed.
+
+    Each stream is a random.Random instance whose seed is a hash of the
+    base seed and the stream's name, so the numbers drawn from a stream
+    do not depend on the use of the other streams.  Giving each source of
+    randomness of a model (think times, compute units, load balancing,
+    ...) its own stream makes two scenarios run with the same base seed
+    see the same random inputs where they share the source, i.e., be
+    compared with common random numbers.
+    """
+
+    def __init__(self, seed):
+        # type: (int) -> None
+        self.seed = seed
+        self._streams = {}  # type: Dict[str, random.Random]
+
+    def stream(self, name):
+        # type: (str) -> random.Random
+        """The stream with the given name, created on first use."""
+        rng = self._streams.get(name)
+        if rng is None:
+            digest = hashlib.sha256(
+                ("%s/%s" % (self.seed, name)).encode("utf-8")).hexdigest()
+            rng = self._streams[name] = random.Random(int(digest[:16], 16))
+        return rng
+
+
 rand_int = random.randint
 
 gen_int = curried_nullary(rand_int)
@@ -0,0 +1,113 @@
+"""
+Compact records of completed service requests, delivered to sinks.
+
+The service request logs of SvcRequester, Server and UserGroup keep the
+SvcRequest objects themselves, and with them their parents, children,
+generators and SimPy events, until the end of the simulation.  A sink is
+the alternative for long simulations: a callable that is invoked once
+for each request when it completes, with an immutable RequestRecord that
+holds the request's timings and no reference to any simulation object.
+The request can then be recycled or garbage collected right away.
+
+Sinks are attached through the *sink* arguments or attributes of
+SvcRequester, Server and UserGroup.  Any callable taking a record is a
+sink, e.g., the append method of a list, a function updating running
+statistics, or a RecordWriter, which appends records to a CSV file that
+can be read back with read_records.  Cancelled requests never complete,
+so they are not delivered to sinks.
+"""
+
+import collections
+import csv
+from typing import Any, Iterator, TextIO
+
+
+class RequestRecord(collections.namedtuple(
+        "RequestRecord",
+        "name req_id parent_id svc_name server_name submitted completed "
+        "hw_queue_time process_time")):
+    """Immutable summary of a completed service request.
+
+    Attributes:
+        name (str): Name of the component that delivered the record: the
+            service name for a SvcRequester, the server name for a Server,
+            or the group name for a UserGroup, like the names in the
+            corresponding logs.
+        req_id (int): The request's id.
+        parent_id (Optional[int]): The id of its parent request, if any.
+        svc_name (str): Name of the request's service.
+        server_name (Optional[str]): Name of its target server, if any.
+        submitted (float): Submission time.
+        completed (float): Completion time.
+        hw_queue_time (Optional[float]): See SvcRequest.hw_queue_time.
+        process_time (Optional[float]): See SvcRequest.process_time.
+    """
+    __slots__ = ()
+
+
+def request_record(name, svc_req):
+    # type: (str, Any) -> RequestRecord
+    """The record of a completed service request, delivered on behalf of
+    the component called name."""
+    times = svc_req.time_dict
+    parent = svc_req.parent
+    server = svc_req.server
+    return RequestRecord(
+        name, svc_req.id,
+        parent.id if parent is not None else None,
+        svc_req.svc_name,
+        server.name if server is not None else None,
+        times["submitted"], times["completed"],
+        svc_req.hw_queue_time, svc_req.process_time)
+
+
+def response_time(record):
+    # type: (RequestRecord) -> float
+    """End-to-end response time of the request of a record."""
+    return record.completed - record.submitted
+
+
+class RecordWriter(object):
+    """Sink that writes records as CSV rows, after a header row, to a
+    text file.
+
+    Attributes:
+        << See __init__. >>
+    """
+
+    def __init__(self, file):
+        # type: (TextIO) -> None
+        """Initializer.
+
+        Args:
+            file: Text file open for writing, e.g., with
+                open(path, "w", newline="") on Python 3.  It is not
+                closed by the writer.
+        """
+        self.file = file
+        self._writer = csv.writer(file)
+        self._writer.writerow(RequestRecord._fields)
+
+    def __repr__(self):
+        """Printable representation of this object."""
+        return type(self).__name__ + repr(self.__dict__)
+
+    def __call__(self, record):
+        # type: (RequestRecord) -> None
+        self._writer.writerow(record)
+
+
+def _optional(text, convert):
+    return convert(text) if text != "" else None
+
+
+def read_records(file):
+    # type: (TextIO) -> Iterator[RequestRecord]
+    """Records of a CSV file written by a RecordWriter."""
+    reader = csv.reader(file)
+    next(reader)  # header
+    for row in reader:
+        yield RequestRecord(
+            row[0], int(row[1]), _optional(row[2], int), row[3],
+            _optional(row[4], str), float(row[5]), float(row[6]),
+            _optional(row[7], float), _optional(row[8], float))
@@ -0,0 +1,285 @@
+"""
+Trace-driven replay of request arrivals, e.g., from production access
+logs.
+
+A TraceReplayGroup submits a service request at each arrival of a trace,
+open-loop, i.e., whether or not earlier requests have responded, and
+reports response times through the same methods as UserGroup (see
+usergroup.RequestGroup).  Each arrival has a timestamp, an endpoint
+name, mapped to a service requester, and optionally the compute units
+of the request.  Arrivals are replayed at their original rate or at a
+multiple of it.
+
+Traces are read in chunks by read_arrivals, so that only one chunk is in
+memory at a time, whatever the length of the trace:
+
+- CSV files are parsed incrementally.
+- NPY files, holding a structured array with a field per column, are
+  memory-mapped.
+- Parquet files are read one record batch at a time.  This requires
+  pyarrow.
+
+Depends on numpy.
+"""
+
+import collections
+import csv
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, \
+    Sequence, Tuple
+
+import numpy as np
+import simpy
+
+from .service import CoreSvcRequester, SvcRequester, SvcRequest
+from .usergroup import RequestGroup
+
+
+# A chunk of arrivals: timestamps in seconds, endpoint names and compute
+# units, or None if the trace has none.
+Chunk = Tuple[np.ndarray, List[str], Optional[np.ndarray]]
+
+
+def _seconds(values):
+    # type: (np.ndarray) -> np.ndarray
+    """Timestamps as float seconds, from numbers or datetime64 values."""
+    values = np.asarray(values)
+    if values.dtype.kind == "M":
+        return values.astype("datetime64[ns]").astype(np.int64) / 1e9
+    return values.astype(np.float64)
+
+
+def _names(values):
+    # type: (Sequence[Any]) -> List[str]
+    """Endpoint names as str, decoding bytes."""
+    return [v.decode("utf-8") if isinstance(v, bytes) else v
+            for v in values]
+
+
+def csv_arrivals(path, time_col, endpoint_col, comp_units_col=None,
+                 chunk_size=65536):
+    # type: (str, str, str, Optional[str], int) -> Iterator[Chunk]
+    """Chunks of arrivals from the named columns of a CSV file with a
+    header row."""
+    with open(path) as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        i_time = header.index(time_col)
+        i_endpoint = header.index(endpoint_col)
+        i_comp = header.index(comp_units_col) \
+            if comp_units_col is not None else None
+        while True:
+            times = []  # type: List[float]
+            endpoints = []  # type: List[str]
+            comp_units = []  # type: List[float]
+            for row in reader:
+                times.append(float(row[i_time]))
+                endpoints.append(row[i_endpoint])
+                if i_comp is not None:
+                    comp_units.append(float(row[i_comp]))
+                if len(times) == chunk_size:
+                    break
+            if not times:
+                return
+            yield (np.array(times), endpoints,
+                   np.array(comp_units) if i_comp is not None else None)
+
+
+def npy_arrivals(path, time_col, endpoint_col, comp_units_col=None,
+                 chunk_size=65536):
+    # type: (str, str, str, Optional[str], int) -> Iterator[Chunk]
+    """Chunks of arrivals from the named fields of a structured array
+    saved in an NPY file, which is memory-mapped."""
+    data = np.load(path, mmap_mode="r")
+    for start in range(0, len(data), chunk_size):
+        rows = data[start:start + chunk_size]
+        yield (_seconds(rows[time_col]),
+               _names(rows[endpoint_col].tolist()),
+               np.array(rows[comp_units_col], dtype=np.float64)
+               if comp_units_col is not None else None)
+
+
+def parquet_arrivals(path, time_col, endpoint_col, comp_units_col=None,
+                     chunk_size=65536):
+    # type: (str, str, str, Optional[str], int) -> Iterator[Chunk]
+    """Chunks of arrivals from the named columns of a Parquet file, read
+    one record batch at a time.  Requires pyarrow."""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Reading Parquet traces requires pyarrow.")
+    columns = [time_col, endpoint_col]
+    if comp_units_col is not None:
+        columns.append(comp_units_col)
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size,
+                                                   columns=columns):
+        yield (_seconds(batch.column(0).to_numpy()),
+               _names(batch.column(1).to_pylist()),
+               np.asarray(batch.column(2).to_numpy(), dtype=np.float64)
+               if comp_units_col is not None else None)
+
+
+_READERS = {
+    ".csv": csv_arrivals,
+    ".npy": npy_arrivals,
+    ".parquet": parquet_arrivals,
+}
+
+
+def read_arrivals(path, time_col="timestamp", endpoint_col="endpoint",
+                  comp_units_col=None, chunk_size=65536):
+    # type: (str, str, str, Optional[str], int) -> Iterator[Chunk]
+    """Chunks of arrivals from a CSV, NPY or Parquet file, according to
+    its extension.
+
+    Args:
+        path: The file.
+        time_col: Column of the timestamps, numbers of seconds or, in NPY
+            and Parquet files, datetime values.  Timestamps must be
+            non-decreasing.
+        endpoint_col: Column of the endpoint names.
+        comp_units_col: Optional column of the compute units of the
+            requests.
+        chunk_size: Number of arrivals per chunk.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in _READERS:
+        raise ValueError("Unsupported trace file type: " + ext)
+    return _READERS[ext](path, time_col, endpoint_col, comp_units_col,
+                         chunk_size)
+
+
+class TraceReplayGroup(RequestGroup):
+    """Submits a service request at each arrival of a trace.
+
+    Arrival n is submitted at the simulated time
+    start + (timestamp[n] - timestamp[0]) / rate, where start is the
+    time at which activate_users() is called.  Arrivals whose endpoint
+    is not mapped are skipped, unless there is a *default* requester.
+
+    When the trace has compute units, each request of a CoreSvcRequester
+    endpoint is executed with the compute units of its arrival instead of
+    those drawn from the requester's fcompunits.  They are not applied to
+    composite endpoints.
+
+    Attributes:
+        << See __init__ args >>
+        << Additional attributes: >>
+
+        svcs (List[SvcRequester]): The distinct requesters of *endpoints*
+            and *default*, whose statistics are reported separately.
+        skipped_count (int): Number of arrivals skipped so far.
+        finished (bool): Whether all arrivals have been submitted.
+    """
+
+    def __init__(self, env, arrivals, name, endpoints, rate=1.0,
+                 default=None, quantiles=None, svc_req_log=None, sink=None):
+        # type: (simpy.Environment, Iterable[Chunk], str, Mapping[str, SvcRequester], float, Optional[SvcRequester], Optional[Sequence[float]], Optional[List[Tuple[str, SvcRequest]]], Optional[Any]) -> None
+        """Initializer.
+
+        Args:
+            env: The Simpy Environment.
+            arrivals: Iterable of chunks of arrivals, e.g., from
+                read_arrivals.  It is iterated once, lazily.
+            name: This group's name.
+            endpoints: Mapping from endpoint names to the service
+                requesters that model them.
+            rate: Replay speed relative to the trace, e.g., 2 to replay
+                arrivals twice as fast.
+            default: Optional service requester for the endpoints not in
+                *endpoints*.
+            quantiles: See base class.
+            svc_req_log: See base class.
+            sink: See base class.
+        """
+        assert rate > 0, "rate must be positive"
+        svcs = []  # type: List[SvcRequester]
+        for svc in list(endpoints.values()) + [default]:
+            if svc is not None and not any(svc is s for s in svcs):
+                svcs.append(svc)
+        RequestGroup.__init__(self, env, name, svcs, quantiles, svc_req_log,
+                              sink)
+        self.arrivals = arrivals
+        self.endpoints = endpoints
+        self.rate = rate
+        self.default = default
+        self.skipped_count = 0
+        self.finished = False
+        # per requester, the requester executing requests with the compute
+        # units of the trace, and the compute units it is to use next
+        self._comp_units_requesters = \
+            {}  # type: Dict[SvcRequester, Tuple[CoreSvcRequester, collections.deque]]
+
+    def _comp_units_requester(self, svc):
+        # type: (SvcRequester) -> Tuple[SvcRequester, Optional[collections.deque]]
+        """The requester executing svc's requests with the compute units
+        of the trace, and its queue of compute units, or (svc, None) if
+        they do not apply."""
+        entry = self._comp_units_requesters.get(svc)
+        if entry is None:
+            if not isinstance(svc, CoreSvcRequester):
+                return svc, None
+            # requests draw their compute units once, in submission order
+            pending = collections.deque()
+            requester = CoreSvcRequester(
+                self.env, svc.svc_name, pending.popleft, svc.fserver,
+                log=svc.log, f=svc.f, late_binding=svc.late_binding,
+                pool=svc.pool, sink=svc.sink)
+            entry = self._comp_units_requesters[svc] = (requester, pending)
+        return entry
+
+    def _submit(self, svc, comp_units):
+        # type: (SvcRequester, Optional[float]) -> None
+        """Submit a request of svc, tallying its response when it
+        completes."""
+        requester = svc
+        if comp_units is not None:
+            requester, pending = self._comp_units_requester(svc)
+            if pending is not None:
+                pending.append(comp_units)
+        svc_req = requester.make_svc_request(None)
+        self._submitted(svc, svc_req)
+        start_time = self.env.now
+
+        def responded(_evt):
+            self._responded(svc, svc_req, self.env.now - start_time)
+
+        done = svc_req.submit()
+        if done.callbacks is None:  # completed synchronously
+            responded(done)
+        else:
+            done.callbacks.append(responded)
+
+    def _replay(self):
+        """
+        Process that submits the requests at the arrival times.
+        """
+        env = self.env
+        start = env.now
+        first = None
+        endpoints = self.endpoints
+        default = self.default
+        rate = self.rate
+        for (times, names, comp_units) in self.arrivals:
+            times = times.tolist()
+            comp_units = comp_units.tolist() if comp_units is not None \
+                else None
+            if first is None and times:
+                first = times[0]
+            for i in range(len(times)):
+                svc = endpoints.get(names[i], default)
+                if svc is None:
+                    self.skipped_count += 1
+                    continue
+                t = start + (times[i] - first) / rate
+                if t > env.now:
+                    yield env.timeout(t - env.now)
+                self._submit(svc, comp_units[i] if comp_units is not None
+                             else None)
+        self.finished = True
+
+    def activate_users(self):
+        """
+        Start the replay, like UserGroup.activate_users.
+        """
+        self.env.process(self._replay())
@@ -0,0 +1,284 @@
+"""
+Memory-bounded service request logs.
+
+A full service request log (the *svc_req_log* of UserGroup or the *log*
+of a SvcRequester) keeps every request until the end of the simulation.
+The logs of this module can be passed in their place: like lists, they
+are appended (name, svc_req) entries and iterate over the entries they
+keep, so analyses written for full logs, e.g., minibatch_resp_times in
+report_resp_times.py, work unchanged on them, but they keep at most a
+fixed number of entries:
+
+- ReservoirLog keeps a uniform random sample of the entries appended.
+- StratifiedLog keeps a uniform random sample of each service's
+  entries, so rare services are represented too.  Statistics over
+  several services must weight each entry by weight(svc_name).
+- TailLog keeps the requests whose response time exceeds a running
+  estimate of a high quantile, e.g., the 99th percentile, up to a cap,
+  beyond which the fastest of them are evicted.
+
+Sampled entries are selected when they are appended, i.e., when the
+requests are submitted, independently of their outcome, so the sampled
+response times are an unbiased sample of those of a full log.  TailLog
+deliberately is not: it receives completions through the trace module
+and must be closed when no longer used.
+"""
+
+from __future__ import division
+
+from heapq import heappush, heapreplace
+import itertools
+import math
+import random
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from livestats.livestats import Quantile
+
+from . import trace
+
+
+Entry = Tuple[str, Any]
+
+
+def _response_time(svc_req):
+    # type: (Any) -> float
+    times = svc_req.time_dict
+    return times["completed"] - times["submitted"]
+
+
+class ReservoirLog(object):
+    """Uniform random sample of at most *capacity* log entries.
+
+    Uses Algorithm L (Li, 1994), which draws random numbers only when an
+    entry is kept, so that appending a skipped entry costs a counter
+    update.
+
+    Attributes:
+        << See __init__. >>
+        << Additional attributes: >>
+
+        seen_count (int): Number of entries appended.
+    """
+
+    def __init__(self, capacity, rng=None):
+        # type: (int, Optional[random.Random]) -> None
+        """Initializer.
+
+        Args:
+            capacity: Maximum number of entries kept.
+            rng: Random generator.  Defaults to a new random.Random().
+        """
+        assert capacity > 0, "capacity must be positive"
+        self.capacity = capacity
+        self.rng = rng if rng is not None else random.Random()
+        self.seen_count = 0
+        self._entries = []  # type: List[Entry]
+        self._w = math.exp(math.log(self._uniform()) / capacity)
+        self._next = capacity + self._skip()
+
+    def __repr__(self):
+        """Printable representation of this object."""
+        return type(self).__name__ + repr(self.__dict__)
+
+    def _uniform(self):
+        # type: () -> float
+        """Random number in the open interval (0, 1)."""
+        u = self.rng.random()
+        while u == 0.0:
+            u = self.rng.random()
+        return u
+
+    def _skip(self):
+        # type: () -> int
+        w = self._w
+        if w >= 1.0:
+            return 1
+        return int(math.log(self._uniform()) / math.log(1.0 - w)) + 1
+
+    def append(self, entry):
+        # type: (Entry) -> None
+        """Offer an entry to the sample."""
+        self.seen_count += 1
+        n = self.seen_count
+        if n <= self.capacity:
+            self._entries.append(entry)
+        elif n == self._next:
+            self._entries[self.rng.randrange(self.capacity)] = entry
+            self._w *= math.exp(math.log(self._uniform()) / self.capacity)
+            self._next += self._skip()
+
+    def __iter__(self):
+        # type: () -> Iterator[Entry]
+        return iter(self._entries)
+
+    def __len__(self):
+        # type: () -> int
+        return len(self._entries)
+
+    @property
+    def weight(self):
+        # type: () -> float
+        """Number of appended entries represented by each kept entry."""
+        return self.seen_count / len(self._entries) if self._entries else 0.0
+
+
+class StratifiedLog(object):
+    """A ReservoirLog of at most *capacity* entries per service.
+
+    Attributes:
+        << See __init__. >>
+        << Additional attributes: >>
+
+        strata (Dict[str, ReservoirLog]): The sample of each service,
+            by service name.
+    """
+
+    def __init__(self, capacity, rng=None):
+        # type: (int, Optional[random.Random]) -> None
+        """Initializer.
+
+        Args:
+            capacity: Maximum number of entries kept per service.
+            rng: Random generator shared by the strata.  Defaults to a
+                new random.Random().
+        """
+        self.capacity = capacity
+        self.rng = rng if rng is not None else random.Random()
+        self.strata = {}  # type: Dict[str, ReservoirLog]
+
+    def __repr__(self):
+        """Printable representation of this object."""
+        return type(self).__name__ + repr(self.__dict__)
+
+    def append(self, entry):
+        # type: (Entry) -> None
+        """Offer an entry to the sample of its request's service."""
+        svc_name = entry[1].svc_name
+        stratum = self.strata.get(svc_name)
+        if stratum is None:
+            stratum = self.strata[svc_name] = \
+                ReservoirLog(self.capacity, self.rng)
+        stratum.append(entry)
+
+    def __iter__(self):
+        # type: () -> Iterator[Entry]
+        return itertools.chain.from_iterable(self.strata.values())
+
+    def __len__(self):
+        # type: () -> int
+        return sum(len(stratum) for stratum in self.strata.values())
+
+    @property
+    def seen_count(self):
+        # type: () -> int
+        """Number of entries appended."""
+        return sum(stratum.seen_count for stratum in self.strata.values())
+
+    def weight(self, svc_name):
+        # type: (str) -> float
+        """Number of appended entries of a service represented by each of
+        its kept entries."""
+        return self.strata[svc_name].weight
+
+
+class TailLog(object):
+    """The appended entries whose requests completed with a response time
+    above the running estimate of a quantile, at most *capacity* of
+    them, the slowest being kept.
+
+    Completions are received from the trace module's tracer while the
+    log is open, for the environment of the request of the first entry
+    appended.  Entries whose requests have not completed yet are held
+    until they complete or are cancelled, so the log also references the
+    requests in flight.
+
+    Attributes:
+        << See __init__. >>
+        << Additional attributes: >>
+
+        seen_count (int): Number of entries appended.
+        completed_count (int): Number of their requests completed.
+    """
+
+    def __init__(self, capacity, quantile=0.99):
+        # type: (int, float) -> None
+        """Initializer.
+
+        Args:
+            capacity: Maximum number of entries kept.
+            quantile: Quantile of the response times above which entries
+                are kept.
+        """
+        assert capacity > 0, "capacity must be positive"
+        self.capacity = capacity
+        self.quantile = quantile
+        self.seen_count = 0
+        self.completed_count = 0
+        self._estimator = Quantile(quantile)
+        self._pending = {}  # type: Dict[Any, Entry]
+        self._heap = []  # type: List[Tuple[float, int, Entry]]
+        self._order = itertools.count()
+        self._subscribed = False
+
+    def __repr__(self):
+        """Printable representation of this object."""
+        return type(self).__name__ + repr(self.__dict__)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def close(self):
+        # type: () -> None
+        """Stop receiving completions and drop the pending entries."""
+        if self._subscribed:
+            trace.tracer.unsubscribe(self._on_event)
+            self._subscribed = False
+        self._pending = None
+
+    def append(self, entry):
+        # type: (Entry) -> None
+        """Hold an entry until its request completes."""
+        self.seen_count += 1
+        if self._pending is not None:
+            if not self._subscribed:
+                # receive the completions of the log's environment only
+                trace.tracer.subscribe(self._on_event,
+                                       [trace.COMPLETED, trace.CANCELLED],
+                                       entry[1].env)
+                self._subscribed = True
+            self._pending[entry[1]] = entry
+
+    def _on_event(self, kind, time, svc_req):
+        # type: (int, float, Any) -> None
+        entry = self._pending.pop(svc_req, None)
+        if entry is None or kind != trace.COMPLETED:
+            return
+        self.completed_count += 1
+        response_time = _response_time(svc_req)
+        estimator = self._estimator
+        estimator.add(response_time)
+        if response_time <= estimator.quantile():
+            return
+        item = (response_time, next(self._order), entry)
+        if len(self._heap) < self.capacity:
+            heappush(self._heap, item)
+        elif response_time > self._heap[0][0]:
+            heapreplace(self._heap, item)
+
+    @property
+    def threshold(self):
+        # type: () -> float
+        """Current estimate of the quantile of the response times."""
+        return self._estimator.quantile()
+
+    def __iter__(self):
+        # type: () -> Iterator[Entry]
+        return (entry for (_, _, entry) in sorted(self._heap))
+
+    def __len__(self):
+        # type: () -> int
+        return len(self._heap)
@@ -2,7 +2,7 @@
 Classes representing computer servers.
 """
 
-from typing import TYPE_CHECKING, Optional, List, Tuple
+from typing import TYPE_CHECKING, Any, Callable, Optional, List, Tuple
 
 import simpy
 import simpy.resources.resource as simpyrr
@@ -24,8 +24,8 @@ class Server(object):
     """
     
     def __init__(self, env, max_concurrency, num_threads, speed, name,
-                 hw_svc_req_log=None, sw_svc_req_log=None):
-        # type: (simpy.Environment, int, int, float, str, Optional[List[Tuple[str, str, SvcRequest]]], Optional[List[Tuple[str, str, SvcRequest]]]) -> None
+                 hw_svc_req_log=None, sw_svc_req_log=None, sink=None):
+        # type: (simpy.Environment, int, int, float, str, Optional[List[Tuple[str, str, SvcRequest]]], Optional[List[Tuple[str, str, SvcRequest]]], Optional[Callable[[Any], None]]) -> None
         """Initializer.
 
         Args:
@@ -44,6 +44,11 @@ class Server(object):
                 triple ("sw", name, svc_req), where name is this server's
                 name and svc_req is the current service request asking for a
                 software thread.
+            sink: Optional callable invoked with the RequestRecord of each
+                service request executed on this server's hardware
+                threads, i.e., produced by a CoreSvcRequester, when the
+                request completes (see the records module).  Unlike the
+                logs, it does not retain the requests.
         """
         self.env = env
         self.max_concurrency = max_concurrency
@@ -52,6 +57,7 @@ class Server(object):
         self.name = name
         self.hw_svc_req_log = hw_svc_req_log
         self.sw_svc_req_log = sw_svc_req_log
+        self.sink = sink
         self._hardware = MeasuredResource(env, max_concurrency)
         self._threads = MeasuredResource(env, num_threads)
 
@@ -85,6 +91,18 @@ class Server(object):
         """Release the software thread request req."""
         return self._threads.release(req)
 
+    def add_hw_listener(self, listener):
+        # type: (Callable[[], None]) -> None
+        """Register a nullary function to be called whenever the hardware
+        queue length or in-process count changes."""
+        self._hardware.add_listener(listener)
+
+    def add_thread_listener(self, listener):
+        # type: (Callable[[], None]) -> None
+        """Register a nullary function to be called whenever the software
+        thread queue length or in-use count changes."""
+        self._threads.add_listener(listener)
+
     @property
     def svc_req_log(self):
         # type: () -> Optional[List[SvcRequest]]
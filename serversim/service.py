@@ -4,15 +4,72 @@ Classes representing computing services that are executed on servers.
 
 from typing import Callable, Any, Iterator, Optional, List, Mapping, \
     Sequence, Tuple
-import logging
+import collections
+import itertools
+import sys
 
 import simpy
 import simpy.events as simpye
 
+from .records import request_record
 from .server import Server
+from .simpyinternals import processed_event
+from .trace import tracer
+from .util import nullary
 
 
-debug = logging.debug
+def _request_ids(env):
+    # type: (simpy.Environment) -> Iterator[int]
+    """The counter of the IDs of the service requests of env.
+
+    Each environment has its own counter, starting at 1, so that the
+    IDs of a simulation do not depend on what ran before it.
+    """
+    try:
+        return env.svc_request_ids
+    except AttributeError:
+        ids = env.svc_request_ids = itertools.count(1)  # ad-hoc attribute
+        return ids
+
+
+class CountdownLatch(simpye.Event):
+    """An event that is triggered once count_down() has been called a given
+    number of times.
+
+    Costs O(1) per call, unlike a simpy.events.Condition, which
+    re-evaluates its condition over all its events whenever one of them
+    is triggered.  count_down() may be used directly as an event callback.
+    Calls beyond the given number are ignored.
+    """
+
+    def __init__(self, env, count):
+        # type: (simpy.Environment, int) -> None
+        """Initializer.
+
+        Args:
+            env: The SimPy Environment.
+            count: The number of calls to count_down() that trigger
+                this event.
+        """
+        simpye.Event.__init__(self, env)
+        self._count = count
+
+    def count_down(self, _evt=None):
+        # type: (Optional[simpy.Event]) -> None
+        """Count one call, triggering this event on the last one."""
+        self._count -= 1
+        if self._count == 0:
+            self.succeed()
+
+
+def _when_done(evt, callback):
+    # type: (simpy.Event, Callable[[simpy.Event], None]) -> None
+    """Call callback with evt once evt is processed, immediately if it
+    already has been."""
+    if evt.callbacks is None:
+        callback(evt)
+    else:
+        evt.callbacks.append(callback)
 
 
 class SvcRequest(object):
@@ -40,11 +97,32 @@ class SvcRequest(object):
 
         out_val (Any): Output value produced from in_val by the service
             execution.  None by default.
-        id (int): The unique numerical ID of this request.
+        id (int): The numerical ID of this request, unique within its
+            environment.  IDs are assigned in order of creation (or of
+            reuse, see recycle()), starting at 1 in each environment.
         time_log (List[Tuple[str, float]]): List of tag-time pairs
             representing significant occurrences for this request.
         time_dict (Mapping[str, float]): Dictionary with contents of *time_log*,
             for easier access to information.
+        select_server (Optional[Callable[[], Server]]): If not None,
+            a function used by resolve_server() to select the target server
+            when the request starts executing, if *server* is still None.
+        direct_submit (Optional[Callable[[SvcRequest], simpy.Event]]): If
+            not None, submit() calls this function instead of wrapping *gen*
+            in a simpy.Process.  It must execute the request and return an
+            event that is triggered when the request finishes.
+        waiting_on (Any): What the request's execution is currently
+            waiting on, used by cancel() to withdraw pending work: a
+            resource request not yet granted, a sub-request, a list of
+            sub-requests, or None.
+        sink (Optional[Callable[[RequestRecord], None]]): The sink of the
+            producing requester, to which complete() delivers the
+            request's record (see the records module).  The record of a
+            request executed on a server's hardware by a CoreSvcRequester
+            is also delivered to the server's sink.
+        children (List[SvcRequest]): The sub-requests produced for this
+            request by a composite requester, in order of production,
+            except asynchronous ones.  Walked by recycle().
     """
     def __init__(self, env, parent, svc_name, gen, server, in_val,
                  in_blocking_call=False):
@@ -62,7 +140,9 @@ class SvcRequest(object):
                 simpy.Process object to schedule the request for execution
                 by SimPy..
             server: The target server.  May be None for composite service
-                requests, i.e., those not produced by CoreSvcRequester.
+                requests, i.e., those not produced by CoreSvcRequester,
+                and for requests whose server selection is deferred
+                until they start executing (see *select_server*).
             in_val: Optional input value of the request.
             in_blocking_call: Indicates whether this request is
                 in the scope of a blocking call.  When this parameter
@@ -84,10 +164,82 @@ class SvcRequest(object):
         self.in_blocking_call = in_blocking_call
         self.in_val = in_val
         self.out_val = None
-        self.id = id(self)
+        self.id = next(_request_ids(env))
         self._is_completed = False
         self.time_log = list()
         self.time_dict = dict()
+        self.select_server = None  # type: Optional[Callable[[], Server]]
+        self.direct_submit = None  # type: Optional[Callable[[SvcRequest], simpy.Event]]
+        self._is_cancelled = False
+        self.waiting_on = None  # type: Any
+        self.sink = None  # type: Optional[Callable[[Any], None]]
+        self.children = []  # type: List[SvcRequest]
+        self._free = None  # type: Optional[List[SvcRequest]]
+        self._retained = False  # in the log of its requester
+
+    def _reuse(self, parent, in_val, in_blocking_call):
+        # type: (Optional[SvcRequest], Any, bool) -> None
+        """Reinitialize a recycled request, keeping its name, generator
+        and timestamp storage."""
+        self.parent = parent
+        self.in_blocking_call = in_blocking_call
+        self.in_val = in_val
+        self.id = next(_request_ids(self._env))
+        self._is_completed = False
+        self._is_cancelled = False
+
+    def recycle(self):
+        # type: () -> None
+        """Return this request and its sub-requests to the free lists of
+        the requesters that produced them, for reuse by later
+        make_svc_request() calls.
+
+        Nothing is recycled unless the whole tree of the request, i.e.,
+        the request and, recursively, its *children*, has completed and
+        no request of the tree is kept by the log of its requester or by
+        the logs of its server.  Requests whose requester does not have
+        pooling enabled (see SvcRequester) are left to the garbage
+        collector instead of being recycled.  Called by request groups on
+        the top-level requests whose responses they have tallied, unless
+        they log them, and never by composite requests on their
+        sub-requests; the caller must not use the request afterwards.
+        """
+        if self._recyclable():
+            self._release()
+
+    def _recyclable(self):
+        # type: () -> bool
+        """Whether the tree of this request may be recycled."""
+        if not self._is_completed or self._retained:
+            return False
+        server = self.server
+        if server is not None and (server.hw_svc_req_log is not None or
+                                   server.sw_svc_req_log is not None):
+            return False
+        for child in self.children:
+            if not child._recyclable():
+                return False
+        return True
+
+    def _release(self):
+        # type: () -> None
+        """Recycle the tree of this request, children first."""
+        for child in self.children:
+            child._release()
+        free = self._free
+        if free is None:
+            return
+        self.parent = None
+        self.server = None
+        self.in_val = None
+        self.out_val = None
+        self.select_server = None
+        self.direct_submit = None
+        self.waiting_on = None
+        del self.time_log[:]
+        self.time_dict.clear()
+        del self.children[:]
+        free.append(self)
 
     @property
     def env(self):
@@ -99,15 +251,69 @@ class SvcRequest(object):
         # type: () -> bool
         return self._is_completed
 
+    @property
+    def is_cancelled(self):
+        # type: () -> bool
+        return self._is_cancelled
+
     def submit(self):
-        # type: () -> simpy.Process
+        # type: () -> simpy.Event
         """Submit the request, return the simpy process corresponding to
-        the request.
+        the request, or the event returned by *direct_submit* if set.
         """
-        debug("@@@@ " + self.svc_name)
         self.log_time("submitted")
+        if self.direct_submit is not None:
+            return self.direct_submit(self)
         return self._env.process(self.gen(self))
 
+    def submit_inline(self):
+        # type: () -> Iterator[simpy.Event]
+        """Submit the request for execution within the calling process.
+
+        Returns the request's generator, without wrapping it in a
+        simpy.Process.  The caller must be a generator running in a SimPy
+        process, which must delegate to the returned generator, i.e.,
+        yield every event it produces and send back the values received,
+        or throw in the exceptions raised, e.g., by failed events or
+        interrupts, until it is exhausted.
+        """
+        self.log_time("submitted")
+        return self.gen(self)
+
+    def resolve_server(self):
+        # type: () -> Optional[Server]
+        """Return the target server, selecting it first with
+        *select_server* if it has not been selected yet."""
+        if self.server is None and self.select_server is not None:
+            self.server = self.select_server()
+        return self.server
+
+    def cancel(self):
+        # type: () -> None
+        """Cancel the request, unless it has already completed.
+
+        A cancelled request never completes.  Resource requests it has
+        queued are withdrawn, and the cancellation is propagated to the
+        sub-requests it is waiting on.  Processing already under way on a
+        hardware thread runs to the end, after which the request releases
+        its resources and stops.
+        """
+        if self._is_completed or self._is_cancelled:
+            return
+        self._is_cancelled = True
+        self.log_time("cancelled")
+        waiting_on = self.waiting_on
+        self.waiting_on = None
+        if waiting_on is None:
+            return
+        elif isinstance(waiting_on, SvcRequest):
+            waiting_on.cancel()
+        elif isinstance(waiting_on, list):
+            for svc_req in waiting_on:
+                svc_req.cancel()
+        else:
+            waiting_on.resource.cancel(waiting_on)
+
     def complete(self, val):
         # type: (Any) -> None
         """Complete the request with value val."""
@@ -116,13 +322,18 @@ class SvcRequest(object):
         self._is_completed = True
         self.out_val = val
         self.log_time("completed")
+        if self.sink is not None:
+            self.sink(request_record(self.svc_name, self))
 
     def log_time(self, label):
         # type: (str) -> None
-        """Log the current time with the given label."""
+        """Log the current time with the given label, and emit the
+        corresponding trace event (see the trace module)."""
         now = self._env.now
         self.time_log.append((label, now))
         self.time_dict[label] = now
+        if tracer.enabled:
+            tracer.emit(label, now, self)
 
     @property
     def process_time(self):
@@ -180,12 +391,30 @@ class SvcRequester(object):
     A service requester can be a composite of sub-requesters, thus
     representing a composite service.
 
+    With pooling enabled, completed service requests that are consumed
+    by the framework itself are kept in a free list and reused by
+    make_svc_request().  Request groups (see the usergroup module) that
+    do not log their requests recycle each request they have tallied
+    together with its sub-requests, once all of them have completed.
+    Pooling is disabled while *log* is set, and a request tree in which
+    a request is logged by its requester or its server is not recycled
+    at all, so that the logged requests keep valid links to their parent
+    and sub-requests.  Requests produced by direct calls to
+    make_svc_request() are only recycled if recycle() is called on them.
+    References kept by other code are not detected: code that keeps
+    requests of a request group after they complete, e.g., from a
+    completion callback or a trace subscriber, must give the group an
+    *svc_req_log* or leave pooling disabled, or the requests may be
+    reset and reused under it.
+    A *sink* receives compact records of completed requests instead,
+    without retaining them, so it does not prevent pooling.
+
     Attributes:
         << See __init__ args below. >>
     """
 
-    def __init__(self, env, svc_name, log=None):
-        # type: (simpy.Environment, str, Optional[List[Tuple[str, SvcRequest]]]) -> None
+    def __init__(self, env, svc_name, log=None, pool=False, sink=None):
+        # type: (simpy.Environment, str, Optional[List[Tuple[str, SvcRequest]]], bool, Optional[Callable[[Any], None]]) -> None
         """Initializer.
 
         Args:
@@ -193,10 +422,21 @@ class SvcRequester(object):
             svc_name: Name of the service.
             log: Optional list to collect all service request objects
                 produced by this service requester.
+            pool: If true, produced service requests are recycled (see
+                SvcRequest.recycle).  Can also be set after construction
+                through the attribute of the same name.
+            sink: Optional callable invoked with the RequestRecord of each
+                service request produced by this service requester when
+                the request completes (see the records module).  Can also
+                be set after construction through the attribute of the
+                same name, e.g., for composite service requesters.
         """
         self.env = env
         self.svc_name = svc_name
         self.log = log
+        self.pool = pool
+        self.sink = sink
+        self._free = []  # type: List[SvcRequest]
 
     def __repr__(self):
         """Printable representation of this object."""
@@ -219,6 +459,7 @@ class SvcRequester(object):
         """Add a service request to the service request log."""
         if self.log is not None:
             self.log.append((self.svc_name, svc_req))
+            svc_req._retained = True
 
     def make_svc_request(self, parent, in_val=None, in_blocking_call=False):
         # type: (Optional[SvcRequest], Any, bool) -> SvcRequest
@@ -237,8 +478,17 @@ class SvcRequester(object):
         Returns:
             A service request.
         """
+        free = self._free
+        if free and self.pool and self.log is None:
+            res = free.pop()
+            res._reuse(parent, in_val, in_blocking_call)
+            res.sink = self.sink
+            return res
         res = SvcRequest(self.env, parent, self.svc_name, self._gen, None,
                          in_val, in_blocking_call)
+        res.sink = self.sink
+        if self.pool and self.log is None:
+            res._free = free
         self._add_to_log(res)
         return res
 
@@ -251,13 +501,26 @@ class CoreSvcRequester(SvcRequester):
     composites of such instances created using the various
     service requester combinators in this module
 
+    Unless *_gen* is overridden by a subclass, service requests produced
+    by this class are executed by a fast path that chains callbacks on the
+    server resources instead of running *_gen* in a SimPy process.  The
+    fast path performs the same steps in the same order as *_gen*, so
+    simulation results are identical.
+
     Attributes:
         << See __init__. >>
+        << Additional attributes: >>
+
+        fast_path (bool): Class-level switch for the fast path.  Set to
+            False to run all requests through *_gen*.
     """
+
+    fast_path = True
+
     
     def __init__(self, env, svc_name, fcompunits, fserver, log=None,
-                 f=None):
-        # type: (simpy.Environment, str, Callable[[], float], Callable[[str], Server], Optional[List[SvcRequest]], Callable[[Any], Any]) -> None
+                 f=None, late_binding=False, pool=False, sink=None):
+        # type: (simpy.Environment, str, Callable[[], float], Callable[[str], Server], Optional[List[SvcRequest]], Callable[[Any], Any], bool, bool, Optional[Callable[[Any], None]]) -> None
         """Initializer.
 
         Args:
@@ -273,13 +536,24 @@ class CoreSvcRequester(SvcRequester):
             f: An optional function that is applied to a service request's
                 in_val to produce its out_val.  If f is None, the constant
                 function that always returns None is used.
+            late_binding: If true, fserver is called when a service request
+                starts executing instead of when it is produced, so that
+                load-aware load-balancers see the servers' current state.
+                The server is still assigned eagerly when a containing
+                request dictates it (e.g., continuations).
+            pool: See base class.
+            sink: See base class.
         """
-        SvcRequester.__init__(self, env, svc_name, log)
+        SvcRequester.__init__(self, env, svc_name, log, pool, sink)
         self.fcompunits = fcompunits
         self.fserver = fserver
         if f is None:
             def f(_x): return None
         self.f = f
+        self.late_binding = late_binding
+        self._select_server = nullary(fserver, svc_name)
+        self._gen_overridden = \
+            self._gen.__func__ is not CoreSvcRequester.__dict__["_gen"]
 
     def _gen(self, svc_req):
         # type: (SvcRequest) -> Iterator[simpy.Event]
@@ -287,9 +561,8 @@ class CoreSvcRequester(SvcRequester):
 
         See base class.
         """
-        server = svc_req.server
+        server = svc_req.resolve_server()
         in_blocking_call = svc_req.in_blocking_call
-        req_id = svc_req.id
         in_val = svc_req.in_val
 
         comp_units = self.fcompunits()
@@ -300,61 +573,283 @@ class CoreSvcRequester(SvcRequester):
         if not in_blocking_call:
             svc_req.log_time("sw_thread_requested")
             thread_req = server.thread_request(svc_req)
+            svc_req.waiting_on = thread_req
             yield thread_req
+            svc_req.waiting_on = None
+            if svc_req.is_cancelled:  # granted before it could be withdrawn
+                server.thread_release(thread_req)
+                return
             svc_req.log_time("sw_thread_acquired")
 
         hw_req = server.hw_request(svc_req)
-        debug('Request for %s-%s to server %s at %s for %s compute units'
-              % (self.svc_name, req_id, server.name, self.env.now, comp_units))
         hw_req.process_duration = \
             server.process_duration(comp_units)  # ad-hoc attribute
         svc_req.log_time("hw_thread_requested")
+        svc_req.waiting_on = hw_req
         yield hw_req
+        svc_req.waiting_on = None
+        if svc_req.is_cancelled:  # granted before it could be withdrawn
+            server.hw_release(hw_req)
+            if not in_blocking_call:
+                server.thread_release(thread_req)
+            return
         svc_req.log_time("hw_thread_acquired")
 
-        debug('Starting to execute request %s-%s at server %s at %s for %s '
-              'compute units'
-              % (self.svc_name, req_id, server.name, self.env.now, comp_units))
         yield self.env.timeout(hw_req.process_duration)
         server.hw_release(hw_req)
         svc_req.log_time("hw_thread_released")
-        debug('Completed executing request %s-%s at server %s at %s'
-              % (self.svc_name, req_id, server.name, self.env.now))
 
-        svc_req.complete(self.f(in_val))
+        if not svc_req.is_cancelled:
+            svc_req.complete(self.f(in_val))
+            if server.sink is not None:
+                server.sink(request_record(server.name, svc_req))
 
         # release thread is appliccable
         if not in_blocking_call:
             server.thread_release(thread_req)
             svc_req.log_time("sw_thread_released")
 
+    def _submit_direct(self, svc_req):
+        # type: (SvcRequest) -> simpy.Event
+        """Executes svc_req without a SimPy process.
+
+        Used as the *direct_submit* function of produced service requests
+        when the fast path applies.  See _CoreRun.
+
+        Returns:
+            An event that is triggered when the request finishes.
+        """
+        return _CoreRun(self, svc_req).done
+
     def make_svc_request(self, parent, in_val=None, in_blocking_call=False):
         # type: (Optional[SvcRequest], Any, bool) -> SvcRequest
         """Overrides default implementation in base class.
 
         See base class docstring
         """
-        server = self.fserver(self.svc_name)
         res = super(CoreSvcRequester, self).make_svc_request(parent, in_val,
                                                              in_blocking_call)
-        res.server = server
+        if self.late_binding:
+            res.select_server = self._select_server
+        else:
+            res.server = self.fserver(self.svc_name)
+        if self.fast_path and not self._gen_overridden:
+            res.direct_submit = self._submit_direct
         return res
 
 
+class _CoreRun(object):
+    """Execution of a CoreSvcRequester service request as a chain of
+    callbacks on server resources.
+
+    Performs the same steps as CoreSvcRequester._gen.  Each step is
+    appended as a callback to the resource request or timeout on which
+    _gen would yield, so events are scheduled and processed in the same
+    order as with the generator, without a generator or SimPy process.
+    """
+
+    __slots__ = ("requester", "svc_req", "server", "in_blocking_call",
+                 "comp_units", "thread_req", "hw_req", "done")
+
+    def __init__(self, requester, svc_req):
+        # type: (CoreSvcRequester, SvcRequest) -> None
+        self.requester = requester
+        self.svc_req = svc_req
+        self.done = requester.env.event()
+        self.server = svc_req.resolve_server()
+        self.in_blocking_call = svc_req.in_blocking_call
+
+        self.comp_units = requester.fcompunits()
+        svc_req.compUnits = self.comp_units  # ad-hoc attribute
+
+        # acquire a thread if not in a blocking call
+        self.thread_req = None
+        self.hw_req = None
+        if not self.in_blocking_call:
+            svc_req.log_time("sw_thread_requested")
+            self.thread_req = self.server.thread_request(svc_req)
+            self.thread_req.callbacks.append(self._thread_acquired)
+            svc_req.waiting_on = self.thread_req
+        else:
+            self._request_hw()
+
+    def _thread_acquired(self, _evt):
+        # type: (simpy.Event) -> None
+        svc_req = self.svc_req
+        svc_req.waiting_on = None
+        if svc_req.is_cancelled:  # granted before it could be withdrawn
+            self.server.thread_release(self.thread_req)
+            self.done.succeed()
+            return
+        svc_req.log_time("sw_thread_acquired")
+        self._request_hw()
+
+    def _request_hw(self):
+        # type: () -> None
+        server = self.server
+        hw_req = server.hw_request(self.svc_req)
+        hw_req.process_duration = \
+            server.process_duration(self.comp_units)  # ad-hoc attribute
+        self.svc_req.log_time("hw_thread_requested")
+        hw_req.callbacks.append(self._hw_acquired)
+        self.hw_req = hw_req
+        self.svc_req.waiting_on = hw_req
+
+    def _hw_acquired(self, _evt):
+        # type: (simpy.Event) -> None
+        svc_req = self.svc_req
+        svc_req.waiting_on = None
+        if svc_req.is_cancelled:  # granted before it could be withdrawn
+            self.server.hw_release(self.hw_req)
+            if not self.in_blocking_call:
+                self.server.thread_release(self.thread_req)
+            self.done.succeed()
+            return
+        svc_req.log_time("hw_thread_acquired")
+        timeout = self.requester.env.timeout(self.hw_req.process_duration)
+        timeout.callbacks.append(self._processed)
+
+    def _processed(self, _evt):
+        # type: (simpy.Event) -> None
+        svc_req = self.svc_req
+        server = self.server
+        server.hw_release(self.hw_req)
+        svc_req.log_time("hw_thread_released")
+
+        if not svc_req.is_cancelled:
+            svc_req.complete(self.requester.f(svc_req.in_val))
+            if server.sink is not None:
+                server.sink(request_record(server.name, svc_req))
+
+        # release thread is appliccable
+        if not self.in_blocking_call:
+            server.thread_release(self.thread_req)
+            svc_req.log_time("sw_thread_released")
+        self.done.succeed()
+
+
+class AsyncQueue(object):
+    """Bounded backlog of fire-and-forget work for a target service.
+
+    Models a message queue drained by a fixed number of consumers.  Up
+    to *concurrency* requests put in the queue execute at the same time;
+    further requests wait in the backlog, in FIFO order, and are dropped
+    if the backlog already holds *capacity* requests.
+
+    Attributes:
+        << See __init__. >>
+        << Additional attributes: >>
+
+        active_count (int): Number of requests currently executing.
+        put_count (int): Number of requests put in the queue, including
+            dropped ones.
+        dropped_count (int): Number of requests dropped because the
+            backlog was full.
+        max_backlog_length (int): Maximum backlog length so far.
+    """
+
+    def __init__(self, env, concurrency, capacity=None, name=None):
+        # type: (simpy.Environment, int, Optional[int], Optional[str]) -> None
+        """Initializer.
+
+        Args:
+            env: The SimPy Environment.
+            concurrency: Maximum number of requests from this queue
+                executing at the same time.
+            capacity: Maximum backlog length, unbounded if None.
+            name: Optional name of the queue.
+        """
+        assert concurrency > 0, "concurrency must be positive"
+        self.env = env
+        self.concurrency = concurrency
+        self.capacity = capacity
+        self.name = name
+        self.active_count = 0
+        self.put_count = 0
+        self.dropped_count = 0
+        self.max_backlog_length = 0
+        self._backlog = collections.deque()
+        self._backlog_area = 0.0  # time integral of the backlog length
+        self._created = env.now
+        self._last_change = env.now
+
+    @property
+    def backlog_length(self):
+        # type: () -> int
+        """Number of requests waiting in the backlog."""
+        return len(self._backlog)
+
+    @property
+    def avg_backlog_length(self):
+        # type: () -> float
+        """Time-weighted average backlog length since the queue was
+        created."""
+        area = self._backlog_area + \
+            len(self._backlog) * (self.env.now - self._last_change)
+        elapsed = self.env.now - self._created
+        return area / elapsed if elapsed > 0 else 0.0
+
+    def _update_area(self):
+        # type: () -> None
+        now = self.env.now
+        self._backlog_area += len(self._backlog) * (now - self._last_change)
+        self._last_change = now
+
+    def put(self, svc_req):
+        # type: (SvcRequest) -> bool
+        """Submit svc_req now if a consumer is free, otherwise add it to
+        the backlog.
+
+        Returns:
+            False if the request was dropped, True otherwise.
+        """
+        self.put_count += 1
+        if self.active_count < self.concurrency:
+            self._start(svc_req)
+            return True
+        if self.capacity is not None and len(self._backlog) >= self.capacity:
+            self.dropped_count += 1
+            svc_req.log_time("dropped")
+            return False
+        self._update_area()
+        self._backlog.append(svc_req)
+        svc_req.log_time("queued")
+        if len(self._backlog) > self.max_backlog_length:
+            self.max_backlog_length = len(self._backlog)
+        return True
+
+    def _start(self, svc_req):
+        # type: (SvcRequest) -> None
+        self.active_count += 1
+        _when_done(svc_req.submit(), self._finished)
+
+    def _finished(self, _evt):
+        # type: (simpy.Event) -> None
+        self.active_count -= 1
+        if self._backlog:
+            self._update_area()
+            self._start(self._backlog.popleft())
+
+
 class Async(SvcRequester):
     """Wraps a service requester to produce asynchronous fire-and-forget
     service requests.
 
     An asynchronous service request completes and returns immediately
     to the parent request, while the underlying (child) service request is
-    scheduled for execution on its target server.
+    scheduled for execution on its target server, or put in *queue*.
+
+    Submitting an asynchronous request does not create a SimPy process:
+    the request completes within submit(), which returns an already
+    processed event, so no event is scheduled either, with the supported
+    SimPy versions (see simpyinternals.processed_event).
 
     Attributes:
         << See __init__. >>
     """
     
-    def __init__(self, env, svc_requester, log=None):
-        # type: (simpy.Environment, SvcRequester, Optional[List[SvcRequest]]) -> None
+    def __init__(self, env, svc_requester, log=None, queue=None):
+        # type: (simpy.Environment, SvcRequester, Optional[List[SvcRequest]], Optional[AsyncQueue]) -> None
         """Initializer.
 
         Args:
@@ -362,22 +857,53 @@ class Async(SvcRequester):
             svc_requester: The underlying service requester that is wrapped
                 by this one.
             log: See base class.
+            queue: Optional AsyncQueue through which the underlying
+                service requests are submitted, to model a bounded
+                backlog of fire-and-forget work.
         """
         svc_name = "Async(" + svc_requester.svc_name + ")"
         SvcRequester.__init__(self, env, svc_name, log)
         self.svc_requester = svc_requester
+        self.queue = queue
+
+    def _fire(self, svc_req):
+        # type: (SvcRequest) -> None
+        """Submit the underlying service request and complete svc_req."""
+        enclosed_svc_req = self.svc_requester.make_svc_request(
+            None, svc_req.in_val, False)
+        if self.queue is None:
+            enclosed_svc_req.submit()
+        else:
+            self.queue.put(enclosed_svc_req)
+        svc_req.complete(None)
 
     def _gen(self, svc_req):
         # type: (SvcRequest) -> Iterator[simpy.Event]
         """Generator that will be part of each produced service request.
 
-        See base class.
+        Only used when the request is executed inline.  See base class.
         """
-        enclosed_svc_req = self.svc_requester.make_svc_request(
-            None, svc_req.in_val, False)
-        enclosed_svc_req.submit()
-        svc_req.complete(None)
-        yield self.env.timeout(0)
+        self._fire(svc_req)
+        return
+        yield  # makes this function a generator
+
+    def _submit_direct(self, svc_req):
+        # type: (SvcRequest) -> simpy.Event
+        """Executes svc_req synchronously, used as the *direct_submit*
+        function of produced service requests."""
+        self._fire(svc_req)
+        return processed_event(self.env)
+
+    def make_svc_request(self, parent, in_val=None, in_blocking_call=False):
+        # type: (Optional[SvcRequest], Any, bool) -> SvcRequest
+        """Overrides default implementation in base class.
+
+        See base class docstring
+        """
+        res = super(Async, self).make_svc_request(parent, in_val,
+                                                  in_blocking_call)
+        res.direct_submit = self._submit_direct
+        return res
 
 
 class Blkg(SvcRequester):
@@ -391,8 +917,8 @@ class Blkg(SvcRequester):
         << See __init__. >>
     """
 
-    def __init__(self, env, svc_requester, log=None):
-        # type: (simpy.Environment, SvcRequester, Optional[List[Tuple[str, SvcRequest]]]) -> None
+    def __init__(self, env, svc_requester, log=None, inline=False):
+        # type: (simpy.Environment, SvcRequester, Optional[List[Tuple[str, SvcRequest]]], bool) -> None
         """Initializer.
 
         Args:
@@ -400,10 +926,15 @@ class Blkg(SvcRequester):
             svc_requester: The underlying service requester that is wrapped
                 by this one.
             log: See base class.
+            inline: If true, the enclosed service request is executed
+                within the process of the blocking request (see
+                SvcRequest.submit_inline) instead of in a process of
+                its own.
         """
         svc_name = "Blkg(" + svc_requester.svc_name + ")"
         SvcRequester.__init__(self, env, svc_name, log)
         self.svc_requester = svc_requester
+        self.inline = inline
 
     def _gen(self, svc_req):
         # type: (SvcRequest) -> Iterator[simpy.Event]
@@ -412,6 +943,8 @@ class Blkg(SvcRequester):
         See base class.
         """
         enclosed_svc_req = svc_req.__dict__["enclosed_svc_req"]
+        if not svc_req.in_blocking_call:
+            svc_req.resolve_server()
         enclosed_svc_req.server = svc_req.server
         req_thread = None
         if not svc_req.in_blocking_call:
@@ -420,13 +953,44 @@ class Blkg(SvcRequester):
                 "with a non-null server."
             req_thread = enclosed_svc_req.server.thread_request(svc_req)
             svc_req.log_time("sw_thread_requested")
+            svc_req.waiting_on = req_thread
             yield req_thread
+            svc_req.waiting_on = None
+            if svc_req.is_cancelled:  # granted before it could be withdrawn
+                enclosed_svc_req.server.thread_release(req_thread)
+                return
             svc_req.log_time("sw_thread_acquired")
-        yield enclosed_svc_req.submit()
+        svc_req.waiting_on = enclosed_svc_req
+        if self.inline:
+            sub_gen = enclosed_svc_req.submit_inline()
+            sent = None
+            exc_info = None
+            while True:
+                try:
+                    if exc_info is None:
+                        evt = sub_gen.send(sent)
+                    else:  # forward the failure of the event it yielded
+                        evt = sub_gen.throw(*exc_info)
+                except StopIteration:
+                    break
+                try:
+                    sent = yield evt
+                    exc_info = None
+                except GeneratorExit:
+                    sub_gen.close()
+                    raise
+                except BaseException:
+                    exc_info = sys.exc_info()
+        else:
+            yield enclosed_svc_req.submit()
+        svc_req.waiting_on = None
         if not svc_req.in_blocking_call:
             enclosed_svc_req.server.thread_release(req_thread)
             svc_req.log_time("sw_thread_released")
-        svc_req.complete(enclosed_svc_req.out_val)
+        if not svc_req.is_cancelled:
+            svc_req.resolve_server()  # picks up a late-bound server
+            svc_req.select_server = None
+            svc_req.complete(enclosed_svc_req.out_val)
 
     def make_svc_request(self, parent, in_val=None, in_blocking_call=False):
         # type: (Optional[SvcRequest], Any, bool) -> SvcRequest
@@ -439,7 +1003,9 @@ class Blkg(SvcRequester):
         enclosed_svc_req = self.svc_requester.make_svc_request(
             svc_req, in_val, in_blocking_call)
         svc_req.server = enclosed_svc_req.server
+        svc_req.select_server = enclosed_svc_req.resolve_server
         svc_req.enclosed_svc_req = enclosed_svc_req  # ad-hoc attribute
+        svc_req.children.append(enclosed_svc_req)
         return svc_req
 
 
@@ -458,8 +1024,9 @@ class Seq(SvcRequester):
         << See __init__. >>
     """
 
-    def __init__(self, env, svc_name, svc_requesters, cont=False, log=None):
-        # type: (simpy.Environment, str, Sequence[SvcRequester], bool, Optional[List[SvcRequest]]) -> None
+    def __init__(self, env, svc_name, svc_requesters, cont=False, log=None,
+                 inline=False):
+        # type: (simpy.Environment, str, Sequence[SvcRequester], bool, Optional[List[SvcRequest]], bool) -> None
         """Initializer.
 
         Args:
@@ -472,6 +1039,12 @@ class Seq(SvcRequester):
                 of the first request, all on the same server.  Otherwise,
                 each request can execute on a different server.
             log: See base class.
+            inline: If true, the service requests in the sequence are
+                executed within the process of the composite request (see
+                SvcRequest.submit_inline) instead of in processes of their
+                own.  Processes are still created where there is
+                concurrency, e.g., by Par and Async requests in the
+                sequence.
         """
         assert len(svc_requesters) > 0, "List of service requesters " \
             "must be non-empty"
@@ -482,6 +1055,7 @@ class Seq(SvcRequester):
         self._head_requester = head_requester
         self._tail_requesters = tail_requesters
         self.cont = cont
+        self.inline = inline
 
     def _gen(self, svc_req):
         # type: (SvcRequest) -> Iterator[simpy.Event]
@@ -491,9 +1065,6 @@ class Seq(SvcRequester):
         """
         head_svc_req = svc_req.__dict__["head_svc_req"]
         head_svc_req.server = svc_req.server
-        yield head_svc_req.submit()
-
-        val = head_svc_req.out_val
 
         # Below, the in_blocking_call argument is False when the requests
         # produced by _tail_requesters are separate service requests,
@@ -501,13 +1072,48 @@ class Seq(SvcRequester):
         others_in_blocking_call = \
             svc_req.in_blocking_call if self.cont else False
 
-        for requester in self._tail_requesters:
+        request = head_svc_req
+        tail_requesters = iter(self._tail_requesters)
+        while True:
+            svc_req.waiting_on = request
+            if self.inline:
+                sub_gen = request.submit_inline()
+                sent = None
+                exc_info = None
+                while True:
+                    try:
+                        if exc_info is None:
+                            evt = sub_gen.send(sent)
+                        else:  # forward the failure of the event it yielded
+                            evt = sub_gen.throw(*exc_info)
+                    except StopIteration:
+                        break
+                    try:
+                        sent = yield evt
+                        exc_info = None
+                    except GeneratorExit:
+                        sub_gen.close()
+                        raise
+                    except BaseException:
+                        exc_info = sys.exc_info()
+            else:
+                yield request.submit()
+            svc_req.waiting_on = None
+            if svc_req.is_cancelled:
+                return
+            if request is head_svc_req:
+                svc_req.resolve_server()  # picks up a late-bound server
+                svc_req.select_server = None
+            val = request.out_val
+
+            requester = next(tail_requesters, None)
+            if requester is None:
+                break
             request = requester.make_svc_request(svc_req, val,
                                                  others_in_blocking_call)
+            svc_req.children.append(request)
             if self.cont:
                 request.server = svc_req.server
-            yield request.submit()
-            val = request.out_val
 
         svc_req.complete(val)
 
@@ -522,7 +1128,9 @@ class Seq(SvcRequester):
         head_svc_req = self._head_requester.make_svc_request(
             svc_req, in_val, in_blocking_call)
         svc_req.server = head_svc_req.server
+        svc_req.select_server = head_svc_req.resolve_server
         svc_req.head_svc_req = head_svc_req  # ad-hoc attribute
+        svc_req.children.append(head_svc_req)
         return svc_req
 
 
@@ -540,13 +1148,18 @@ class Par(SvcRequester):
     execution of requests on the same server.  Otherwise, each
     service request can execute on a different server.
 
+    By default, the composite request completes when all of the
+    service requests complete.  With the *k* argument, it completes as
+    soon as k of them complete, which models quorum reads (k-of-n) and
+    hedged requests (first-of-n, k=1).
+
     Attributes:
         << See __init__. >>
     """
 
     def __init__(self, env, svc_name, svc_requesters, f=None, cont=False,
-                 log=None):
-        # type: (simpy.Environment, str, Sequence[SvcRequester], Callable[[Any], Any], bool, Optional[List[SvcRequest]]) -> None
+                 log=None, k=None, cancel_stragglers=False):
+        # type: (simpy.Environment, str, Sequence[SvcRequester], Callable[[Any], Any], bool, Optional[List[SvcRequest]], Optional[int], bool) -> None
         """Initializer.
 
         Args:
@@ -556,7 +1169,10 @@ class Par(SvcRequester):
             f: Optional function that takes the outputs of all the component
                 service requests and produces the overall output
                 for the composite.  If None then the constant function
-                that always produces None is used.
+                that always produces None is used.  The outputs are in
+                the order of svc_requesters, with None for the service
+                requests that had not completed when the composite
+                completed.
             cont: If true, all the requests execute on the same server.
                 Otherwise, each request can execute on a different server.
                 When cont is True, the server is the container service
@@ -564,15 +1180,27 @@ class Par(SvcRequester):
                 picked from the first service request in the list of
                 generated service requests.
             log: See base class.
+            k: Number of service requests that must complete for the
+                composite to complete.  If None, all of them.
+            cancel_stragglers: If true, the service requests that have
+                not completed when the composite completes are cancelled
+                (see SvcRequest.cancel).  Otherwise, they run to
+                completion.
         """
         assert len(svc_requesters) > 0, "List of service requesters " \
                                         "must be non-empty"
+        if k is None:
+            k = len(svc_requesters)
+        assert 0 < k <= len(svc_requesters), "k must be between 1 and " \
+                                             "the number of service requesters"
         SvcRequester.__init__(self, env, svc_name, log)
         self.svc_requesters = svc_requesters
         if f is None:
             def f(_x): return None
         self.f = f
         self.cont = cont
+        self.k = k
+        self.cancel_stragglers = cancel_stragglers
 
     def _gen(self, svc_req):
         # type: (SvcRequest) -> Iterator[simpy.Event]
@@ -584,13 +1212,24 @@ class Par(SvcRequester):
         # With parallel calls, in_blocking_call is always False.
         svc_reqs = [requester.make_svc_request(svc_req, svc_req.in_val, False)
                     for requester in self.svc_requesters]
+        svc_req.children.extend(svc_reqs)
         if self.cont:
-            server = svc_req.server if not None else svc_reqs[0].server
+            server = svc_req.server if svc_req.server is not None \
+                else svc_reqs[0].resolve_server()
             for req in svc_reqs:  # may need to reassign even for svc_reqs[0]
                 req.server = server
-        procs = [req.submit() for req in svc_reqs]
-
-        yield simpye.Condition(self.env, simpye.Condition.all_events, procs)
-
+        join = CountdownLatch(self.env, self.k)
+        for req in svc_reqs:
+            _when_done(req.submit(), join.count_down)
+
+        svc_req.waiting_on = svc_reqs
+        yield join
+        svc_req.waiting_on = None
+        if svc_req.is_cancelled:
+            return
+
+        if self.cancel_stragglers:
+            for req in svc_reqs:
+                req.cancel()
         out_vals = [req.out_val for req in svc_reqs]
         svc_req.complete(self.f(out_vals))
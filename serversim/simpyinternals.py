@@ -0,0 +1,106 @@
+"""
+The uses of SimPy internals, in one place.
+
+Some optimizations, and the attribution of steps by the profiler, rely
+on private state of SimPy, which may change between SimPy releases
+without notice.  They are only applied if the installed SimPy is a
+release whose internals they were written against, SimPy 3 or 4 (tested
+with 4.1), and the internals are found where expected.  Otherwise, the
+functions of this module fall back to the public API, at some cost, so
+simulation results stay correct, or report that they cannot tell.
+"""
+
+from typing import Any, Dict, Optional, Tuple
+
+import simpy
+import simpy.events as simpye
+
+
+def _version(version_string):
+    # type: (str) -> tuple
+    """The leading numeric components of a version string."""
+    parts = []
+    for part in version_string.split("."):
+        digits = ""
+        for c in part:
+            if not c.isdigit():
+                break
+            digits += c
+        if not digits:
+            break
+        parts.append(int(digits))
+    return tuple(parts)
+
+
+def _internals_ok():
+    # type: () -> bool
+    """Whether the event queue, processes and processed events are
+    represented as in SimPy 3 and 4."""
+    env = simpy.Environment()
+
+    def gen():
+        yield env.timeout(1)
+
+    generator = gen()
+    proc = env.process(generator)
+    queue = env.__dict__.get("_queue")
+    if not (isinstance(queue, list) and len(queue) == 1 and
+            isinstance(queue[0][3], simpye.Event) and
+            proc.__dict__.get("_generator") is generator):
+        return False
+    evt = env.event()
+    evt.succeed(1)
+    env.step()
+    env.step()
+    return (evt.callbacks is None and evt.__dict__.get("_ok") is True and
+            evt.__dict__.get("_value") == 1)
+
+
+SIMPY_VERSION = _version(getattr(simpy, "__version__", "0"))
+
+# whether the internals used by this module are those of the installed SimPy
+SUPPORTED = SIMPY_VERSION[:1] in ((3,), (4,)) and _internals_ok()
+
+
+def processed_event(env, value=None):
+    # type: (simpy.Environment, object) -> simpy.Event
+    """An event that has succeeded with value.
+
+    If SUPPORTED, the event is marked as already processed, so a process
+    that yields it resumes immediately, without an event being scheduled.
+    Otherwise, it is triggered with succeed(), and processed at the
+    current time by an additional step of the environment.
+    """
+    evt = simpye.Event(env)
+    if not SUPPORTED:
+        return evt.succeed(value)
+    evt._ok = True
+    evt._value = value
+    evt.callbacks = None  # this is how SimPy marks processed events
+    return evt
+
+
+def next_event(env):
+    # type: (simpy.Environment) -> Optional[simpy.Event]
+    """The event that the next step of env will process.  None if no
+    event is scheduled or, unless SUPPORTED, if it cannot be told."""
+    peek_entry = getattr(env, "_peek_entry", None)  # CalendarEnvironment
+    if peek_entry is not None:
+        entry = peek_entry()
+    elif SUPPORTED:
+        queue = env._queue
+        entry = queue[0] if queue else None
+    else:
+        return None
+    return entry[3] if entry is not None else None
+
+
+def process_locals(proc):
+    # type: (simpy.Process) -> Tuple[Any, Dict[str, Any]]
+    """The generator of a process and the local variables of its current
+    frame.  None and no variables unless SUPPORTED."""
+    if not SUPPORTED:
+        return None, {}
+    generator = proc._generator
+    frame = getattr(generator, "gi_frame", None)
+    return generator, frame.f_locals if frame is not None else {}
@@ -0,0 +1,199 @@
+"""
+Incremental execution of a simulation with progress snapshots.
+
+Simulation wraps an environment with its servers and user groups, and
+runs it in chunks of simulated time with env.run(until=...), so the
+results are the same as with a single run.  After each chunk, it
+produces a Progress snapshot with the simulated time, the speed of the
+simulation, the servers' current queue lengths and the groups' running
+response time estimates.  A run can be stopped early when a predicate on
+the snapshots fires, and resumed later by running again.
+"""
+
+from __future__ import division
+
+import time
+from typing import Callable, Dict, Iterator, Optional, Sequence
+
+import simpy
+
+from .server import Server
+from .usergroup import RequestGroup
+
+
+_clock = getattr(time, "perf_counter", time.time)
+
+
+class Progress(object):
+    """Snapshot of a simulation after a chunk.
+
+    Attributes:
+        now (float): Simulated time.
+        chunk (float): Simulated time covered by the chunk.
+        events (int): SimPy events processed since the simulation
+            started running.
+        chunk_events (int): SimPy events processed in the chunk.
+        wall_time (float): Wall-clock seconds spent running so far.
+        events_per_sec (float): Events processed per wall-clock second
+            during the chunk.
+        hw_queue_lengths (Dict[str, int]): Current hardware thread queue
+            length of each server, by name.
+        thread_queue_lengths (Dict[str, int]): Current software thread
+            queue length of each server, by name.
+        utilizations (Dict[str, float]): Utilization of each server since
+            the start.
+        responded (Dict[str, int]): Number of responded requests of each
+            user group, by name, since the start.
+        avg_response_time (Dict[str, float]): Average response time of
+            each group since the start.
+        chunk_avg_response_time (Dict[str, Optional[float]]): Average
+            response time of the requests of each group that responded
+            during the chunk, None if none did.
+        chunk_throughput (Dict[str, float]): Responses per unit of time
+            of each group during the chunk.
+    """
+
+    def __init__(self, now, chunk, events, chunk_events, wall_time,
+                 chunk_wall_time):
+        # type: (float, float, int, int, float, float) -> None
+        self.now = now
+        self.chunk = chunk
+        self.events = events
+        self.chunk_events = chunk_events
+        self.wall_time = wall_time
+        self.events_per_sec = chunk_events / chunk_wall_time \
+            if chunk_wall_time > 0 else float("inf")
+        self.hw_queue_lengths = {}  # type: Dict[str, int]
+        self.thread_queue_lengths = {}  # type: Dict[str, int]
+        self.utilizations = {}  # type: Dict[str, float]
+        self.responded = {}  # type: Dict[str, int]
+        self.avg_response_time = {}  # type: Dict[str, float]
+        self.chunk_avg_response_time = {}  # type: Dict[str, Optional[float]]
+        self.chunk_throughput = {}  # type: Dict[str, float]
+
+    def __repr__(self):
+        """Printable representation of this object."""
+        return type(self).__name__ + repr(self.__dict__)
+
+
+class Simulation(object):
+    """A simulation run in chunks (see module docstring).
+
+    Attributes:
+        << See __init__. >>
+        << Additional attributes: >>
+
+        events (int): SimPy events processed by run() and advance().
+        wall_time (float): Wall-clock seconds spent in them.
+        stopped (bool): Whether the last run() was stopped by its
+            predicate.
+    """
+
+    def __init__(self, env, servers=(), groups=()):
+        # type: (simpy.Environment, Sequence[Server], Sequence[RequestGroup]) -> None
+        """Initializer.
+
+        Args:
+            env: The SimPy Environment, with the model already built,
+                e.g., with the users of the groups activated.
+            servers: Servers whose state is reported.
+            groups: User groups whose response times are reported.
+        """
+        self.env = env
+        self.servers = list(servers)
+        self.groups = list(groups)
+        self.events = 0
+        self.wall_time = 0.0
+        self.stopped = False
+        self._responded = dict((grp.name, 0) for grp in self.groups)
+        self._response_sum = dict((grp.name, 0.0) for grp in self.groups)
+
+    def __repr__(self):
+        """Printable representation of this object."""
+        return type(self).__name__ + repr(self.__dict__)
+
+    def advance(self, duration):
+        # type: (float) -> Progress
+        """Run the environment for duration units of simulated time and
+        return the resulting snapshot."""
+        env = self.env
+        step = env.step
+        counter = [0]
+
+        def counting_step():
+            counter[0] += 1
+            step()
+
+        start_time = env.now
+        override = env.__dict__.get("step")  # e.g., a profiler's
+        env.step = counting_step
+        start = _clock()
+        try:
+            env.run(until=start_time + duration)
+        finally:
+            elapsed = _clock() - start
+            if override is None:
+                del env.step
+            else:
+                env.step = override
+        self.events += counter[0]
+        self.wall_time += elapsed
+        return self._snapshot(env.now - start_time, counter[0], elapsed)
+
+    def _snapshot(self, chunk, chunk_events, chunk_wall_time):
+        # type: (float, int, float) -> Progress
+        progress = Progress(self.env.now, chunk, self.events, chunk_events,
+                            self.wall_time, chunk_wall_time)
+        for server in self.servers:
+            progress.hw_queue_lengths[server.name] = server.hw_queue_length
+            progress.thread_queue_lengths[server.name] = \
+                server.thread_queue_length
+            progress.utilizations[server.name] = server.utilization
+        for grp in self.groups:
+            name = grp.name
+            count = grp.responded_request_count()
+            total = grp.avg_response_time() * count if count else 0.0
+            new = count - self._responded[name]
+            progress.responded[name] = count
+            progress.avg_response_time[name] = grp.avg_response_time()
+            progress.chunk_avg_response_time[name] = \
+                (total - self._response_sum[name]) / new if new else None
+            progress.chunk_throughput[name] = new / chunk if chunk else 0.0
+            self._responded[name] = count
+            self._response_sum[name] = total
+        return progress
+
+    def run(self, until, chunk, stop=None):
+        # type: (float, float, Optional[Callable[[Progress], bool]]) -> Iterator[Progress]
+        """Run the simulation until simulated time *until*, yielding a
+        snapshot after each chunk.
+
+        The run is paused while the caller handles a snapshot, and can be
+        abandoned by not iterating further.  Running again continues from
+        the current simulated time.
+
+        Args:
+            until: Simulated time at which the run ends.
+            chunk: Simulated time between snapshots.  The last chunk is
+                shortened to end at *until*.
+            stop: Optional predicate on snapshots; the run stops after
+                the first snapshot for which it returns true, and
+                *stopped* is set.
+        """
+        assert chunk > 0, "chunk must be positive"
+        self.stopped = False
+        while self.env.now < until:
+            progress = self.advance(min(chunk, until - self.env.now))
+            yield progress
+            if stop is not None and stop(progress):
+                self.stopped = True
+                return
+
+    def run_to_end(self, until, chunk, stop=None):
+        # type: (float, float, Optional[Callable[[Progress], bool]]) -> Optional[Progress]
+        """Exhaust run() and return its last snapshot, or None if there
+        was none."""
+        progress = None
+        for progress in self.run(until, chunk, stop):
+            pass
+        return progress
@@ -0,0 +1,73 @@
+"""
+Tests for the analytic MVA solver
+"""
+
+from __future__ import print_function
+
+import os
+import random
+import sys
+
+from hamcrest import assert_that, equal_to, close_to
+
+from serversim.analytic import ServerSpec, SvcSpec, UserClass, solve, \
+    deployment_scenario
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+from simulate_deployment_scenario import simulate_deployment_scenario
+
+
+def test_single_user_single_server():
+    """
+    Scenario: Known closed-form values
+        With one user, there is no queueing: the response time is the
+        processing duration and the throughput is one request per cycle.
+    """
+    servers = [ServerSpec("s", 1, 2.0)]
+    svcs = [SvcSpec("svc", 3.0, [0])]
+    users = [UserClass("u", 1, 4.5, [("svc", 1)])]
+    res = solve(servers, svcs, users)
+    assert_that(res.method, equal_to("exact"))
+    assert_that(res.avg_response_time["u"], close_to(1.5, 1e-12))
+    assert_that(res.avg_response_time_ms["u"], close_to(1500.0, 1e-9))
+    assert_that(res.throughput["u"], close_to(1 / 6.0, 1e-12))
+    assert_that(res.server_utilization[0], close_to(0.25, 1e-12))
+
+
+def test_two_classes_exact_and_approximate_agree():
+    servers = [ServerSpec("s0", 2, 4.0), ServerSpec("s1", 1, 1.0)]
+    svcs = [SvcSpec("a", 1.0, [0]), SvcSpec("b", 0.5, [0, 1])]
+    users = [UserClass("u", 10, 5.0, [("a", 1), ("b", 1)]),
+             UserClass("v", 8, 2.0, [("b", 1)])]
+    exact = solve(servers, svcs, users, method="exact")
+    approx = solve(servers, svcs, users, method="approximate")
+    assert_that(approx.method, equal_to("approximate"))
+    for name in ("u", "v"):
+        assert_that(approx.throughput[name],
+                    close_to(exact.throughput[name],
+                             0.1 * exact.throughput[name]))
+    # little's law over the whole network
+    for res in (exact, approx):
+        in_system = sum(res.server_queue_length)
+        expected = sum(res.throughput[c.name] * res.avg_response_time[c.name]
+                       for c in users)
+        assert_that(in_system, close_to(expected, 1e-6))
+
+
+def test_deployment_scenario_estimates_simulation():
+    """
+    Scenario: MVA estimates the deployment simulation
+        For the deployment simulated by simulate_deployment_scenario,
+        the estimated throughput and utilizations are close to the
+        simulated ones, and the response time within 20%.
+    """
+    random.seed(1)
+    sim = simulate_deployment_scenario(300, 1, 1, range(0, 3), range(3, 5))
+    est = deployment_scenario(300, 1, 1, range(0, 3), range(3, 5))
+    assert_that(est.total_throughput,
+                close_to(sim.grp.throughput(), 0.03 * sim.grp.throughput()))
+    for server, utilization in zip(sim.servers, est.server_utilization):
+        assert_that(utilization, close_to(server.utilization, 0.05))
+    sim_response = sim.grp.avg_response_time()
+    assert_that(est.avg_response_time["UserTypeX"],
+                close_to(sim_response, 0.2 * sim_response))
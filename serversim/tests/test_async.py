@@ -0,0 +1,79 @@
+"""
+Tests for Async requests and AsyncQueue
+"""
+
+from __future__ import print_function
+
+import simpy
+from hamcrest import assert_that, equal_to, close_to
+
+from serversim import Server, CoreSvcRequester, Seq, Async, AsyncQueue
+
+
+def core(env, server, name, comp_units):
+    return CoreSvcRequester(env, name, lambda: comp_units,
+                            lambda _svc_name: server)
+
+
+def test_async_completes_within_submit():
+    """
+    Scenario: Async requests complete synchronously
+        Submitting an Async request completes it immediately, without a
+        process or a scheduled event, and the enclosing Seq continues at
+        the same simulated time.
+    """
+    env = simpy.Environment()
+    server = Server(env, 1, 10, 1, "Server_1")
+    async_req = Async(env, core(env, server, "notify", 5.0)) \
+        .make_svc_request(None)
+    evt = async_req.submit()
+    assert_that(async_req.is_completed, equal_to(True))
+    assert_that(evt.processed, equal_to(True))
+
+    seq_req = Seq(env, "seq", [Async(env, core(env, server, "n", 5.0)),
+                               core(env, server, "b", 1.0)]) \
+        .make_svc_request(None)
+    seq_req.submit()
+    env.run()
+    # "b" is submitted at time 0 and queues behind both notifications
+    assert_that(seq_req.service_time, close_to(11.0, 1e-9))
+    assert_that(env.now, close_to(11.0, 1e-9))
+
+
+def test_async_queue_backlog_and_drops():
+    """
+    Scenario: Bounded backlog of fire-and-forget work
+        With concurrency 1 and capacity 2, the first of four
+        notifications executes, the next two wait in the backlog and the
+        last one is dropped.
+    """
+    env = simpy.Environment()
+    server = Server(env, 4, 10, 4, "Server_1")
+    queue = AsyncQueue(env, 1, 2, "notifications")
+    notify = Async(env, core(env, server, "notify", 1.0), queue=queue)
+
+    for _ in range(4):
+        notify.make_svc_request(None).submit()
+
+    assert_that((queue.active_count, queue.backlog_length,
+                 queue.dropped_count, queue.put_count),
+                equal_to((1, 2, 1, 4)))
+    env.run()
+    assert_that(env.now, close_to(3.0, 1e-9))
+    assert_that(server.throughput * env.now, close_to(3, 1e-9))
+    assert_that(queue.max_backlog_length, equal_to(2))
+    assert_that(queue.backlog_length, equal_to(0))
+    # backlog of 2 during [0, 1), 1 during [1, 2)
+    assert_that(queue.avg_backlog_length, close_to(1.0, 1e-9))
+
+
+def test_avg_backlog_length_of_queue_created_later():
+    env = simpy.Environment(initial_time=10.0)
+    server = Server(env, 4, 10, 4, "Server_1")
+    queue = AsyncQueue(env, 1, 2, "notifications")
+    notify = Async(env, core(env, server, "notify", 1.0), queue=queue)
+    for _ in range(3):
+        notify.make_svc_request(None).submit()
+    env.run()
+    # backlog of 2 during [10, 11), 1 during [11, 12), 0 during [12, 13)
+    assert_that(queue.avg_backlog_length, close_to(1.0, 1e-9))
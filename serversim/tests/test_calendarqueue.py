@@ -0,0 +1,84 @@
+"""
+Tests for the calendar queue environment
+"""
+
+from __future__ import print_function
+
+import random
+
+import pytest
+import simpy
+from hamcrest import assert_that, equal_to, greater_than
+from simpy.core import EmptySchedule, Infinity
+
+from serversim import Server, CoreSvcRequester, Seq, Par, UserGroup
+from serversim.calendarqueue import CalendarEnvironment
+from serversim.profiler import Profiler
+
+
+def run_model(env, until=200):
+    servers = [Server(env, 2, 10, 10.0, "Server_%d" % i) for i in range(3)]
+    rng = random.Random(7)
+
+    def ld_bal(_svc_name):
+        return rng.choice(servers)
+
+    svc_1 = CoreSvcRequester(env, "svc_1", lambda: rng.uniform(0.5, 1.5),
+                             ld_bal)
+    svc_2 = CoreSvcRequester(env, "svc_2", lambda: rng.uniform(0.1, 0.5),
+                             ld_bal)
+    txn = Seq(env, "txn", [svc_1, Par(env, "fan_out", [svc_2, svc_2])])
+    log = []
+    grp = UserGroup(env, [(0, 40), (50, 10), (100, 40)], "Users",
+                    [(txn, 1), (svc_2, 2)], 0.5, 3.0, svc_req_log=log,
+                    rng=random.Random(8))
+    grp.activate_users()
+    env.run(until=until)
+    return [(svc_req.svc_name, svc_req.time_log) for (_, svc_req) in log]
+
+
+@pytest.mark.parametrize("bucket_width", [None, 0.01, 1.0, 1000.0])
+def test_same_results_as_simpy(bucket_width):
+    """
+    Scenario: Identical event order
+        Every request has exactly the same timestamps as with
+        simpy.Environment, whatever the bucket width.
+    """
+    expected = run_model(simpy.Environment())
+    env = CalendarEnvironment(bucket_width=bucket_width)
+    assert_that(run_model(env), equal_to(expected))
+    assert_that(env.now, equal_to(200))
+
+
+def test_adapts_width_to_pending_events():
+    env = CalendarEnvironment()
+    for i in range(10000):
+        env.timeout(i * 0.001)
+    assert_that(env.pending_count, equal_to(10000))
+    env.run()
+    assert_that(env.resizes, greater_than(0))
+    assert_that(env.bucket_width < 1.0, equal_to(True))
+    assert_that(env.now, equal_to(9.999))
+
+
+def test_ties_keep_scheduling_order():
+    env = CalendarEnvironment(bucket_width=0.5)
+    order = []
+    for i in range(5):
+        env.timeout(3.0, value=i).callbacks.append(
+            lambda evt: order.append(evt.value))
+    assert_that(env.peek(), equal_to(3.0))
+    env.run()
+    assert_that(order, equal_to([0, 1, 2, 3, 4]))
+    assert_that(env.peek(), equal_to(Infinity))
+    with pytest.raises(EmptySchedule):
+        env.step()
+
+
+def test_profiler_on_calendar_environment():
+    env = CalendarEnvironment()
+    profiler = Profiler(env, sample_every=1)
+    with profiler:
+        run_model(env, 50)
+    names = [name for (name, _, _) in profiler.totals("component")]
+    assert_that("UserGroup Users" in names, equal_to(True))
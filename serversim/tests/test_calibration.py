@@ -0,0 +1,129 @@
+"""
+Tests for compute unit calibration
+"""
+
+from __future__ import print_function, division
+
+import random
+
+import numpy as np
+import pytest
+import simpy
+from hamcrest import assert_that, equal_to, close_to, less_than
+
+from serversim import Server, CoreSvcRequester
+from serversim.calibration import SampleStats, Calibrator, fit_all, \
+    fit_empirical, fit_hyperexponential, goodness_of_fit, fcompunits, \
+    service_demand, read_service_times
+
+
+def stats_of(values, chunks=4):
+    stats = SampleStats()
+    for chunk in np.array_split(values, chunks):
+        stats.add(chunk)
+    return stats
+
+
+@pytest.mark.parametrize("family,draw,params", [
+    ("exponential", lambda g, n: g.exponential(2.0, n), {"rate": 0.5}),
+    ("lognormal", lambda g, n: g.lognormal(0.3, 0.8, n),
+     {"mu": 0.3, "sigma": 0.8}),
+    ("gamma", lambda g, n: g.gamma(3.0, 0.5, n),
+     {"shape": 3.0, "scale": 0.5}),
+    ("hyperexponential",
+     lambda g, n: np.where(g.random(n) < 0.9, g.exponential(0.5, n),
+                           g.exponential(10.0, n)),
+     {"p": 0.9, "rate1": 2.0, "rate2": 0.1}),
+])
+def test_recovers_generating_distribution(family, draw, params):
+    """
+    Scenario: Best parametric fit
+        Among the parametric fits, the generating family has the lowest
+        AIC and parameters close to the true ones.
+    """
+    stats = stats_of(draw(np.random.RandomState(1), 200000))
+    fits = [f for f in fit_all(stats) if f.name != "empirical"]
+    best = fits[0]
+    assert_that(best.name, equal_to(family))
+    assert_that(best.ks, less_than(0.01))
+    for (name, value) in params.items():
+        assert_that(best.params[name], close_to(value, 0.03 * value))
+
+
+def test_chunked_stats_match_whole():
+    values = np.random.RandomState(2).lognormal(0, 1, 10000)
+    whole = stats_of(values, 1)
+    chunked = stats_of(values, 7)
+    assert_that(list(chunked.counts), equal_to(list(whole.counts)))
+    assert_that(chunked.mean, close_to(values.mean(), 1e-9))
+    stats = SampleStats(low=0.1, high=10)
+    stats.add([0.0, -1.0, 0.05, 1.0, 50.0])
+    assert_that((stats.count, stats.dropped), equal_to((3, 2)))
+    assert_that((stats.counts[0], stats.counts[-1]), equal_to((1, 1)))
+
+
+def test_empirical_and_no_hyperexponential_below_cv_1():
+    stats = stats_of(np.random.RandomState(3).uniform(1, 2, 50000))
+    assert_that(fit_hyperexponential(stats), equal_to(None))
+    fit = goodness_of_fit(fit_empirical(stats), stats)
+    assert_that(fit.ks, close_to(0, 1e-9))
+    draw = fit.sampler(random.Random(4))
+    samples = [draw() for _ in range(20000)]
+    assert_that(min(samples) >= 0.99 and max(samples) <= 2.01,
+                equal_to(True))
+    assert_that(np.mean(samples), close_to(1.5, 0.02))
+
+
+def test_read_service_times(tmp_path):
+    pytest.importorskip("pandas")
+    path = tmp_path / "times.csv"
+    with open(str(path), "w") as f:
+        f.write("ts,svc,latency\n")
+        for i in range(5):
+            f.write("%s,svc_%s,%s\n" % (i, i % 2, 0.5 * i))
+    chunks = list(read_service_times(str(path), "svc", "latency",
+                                     chunk_size=3))
+    assert_that([len(names) for (names, _) in chunks], equal_to([3, 2]))
+    assert_that(chunks[1][0].tolist(), equal_to(["svc_1", "svc_0"]))
+    assert_that(chunks[1][1].tolist(), equal_to([1.5, 2.0]))
+
+
+def test_calibrated_requester():
+    """
+    Scenario: From measured times to a requester
+        Service times of two services accumulated in chunks are fitted,
+        and the best fit drives a CoreSvcRequester whose mean processing
+        time matches the measurements.
+    """
+    g = np.random.RandomState(5)
+    names = np.array(["fast", "slow"] * 3000)
+    times = np.empty(6000)
+    times[0::2] = g.exponential(0.2, 3000)
+    times[1::2] = g.gamma(4, 0.25, 3000)
+    calibrator = Calibrator()
+    calibrator.add_all((names[i:i + 1000], times[i:i + 1000])
+                       for i in range(0, 6000, 1000))
+    assert_that(list(calibrator.stats), equal_to(["fast", "slow"]))
+    assert_that(calibrator.stats["slow"].count, equal_to(3000))
+    fits = calibrator.fits()
+    assert_that("gamma" in calibrator.report(), equal_to(True))
+
+    env = simpy.Environment()
+    server = Server(env, 2, 100, 20.0, "Server_1")
+    log = []
+    svc = CoreSvcRequester(env, "slow",
+                           fcompunits(fits["slow"][0], 20.0 / 2,
+                                      random.Random(6)),
+                           lambda _svc_name: server, log=log)
+    for _ in range(2000):
+        svc.make_svc_request(None).submit()
+    env.run()
+    mean = np.mean([svc_req.process_time for (_, svc_req) in log])
+    assert_that(mean, close_to(1.0, 0.05))
+
+
+def test_service_demand():
+    # 2 hardware threads 60% busy while completing 12 requests per
+    # unit of time: 0.1 per request
+    demand = service_demand([0.5, 0.7], [10, 14], max_concurrency=2)
+    assert_that(demand, close_to(0.1, 1e-12))
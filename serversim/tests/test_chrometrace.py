@@ -0,0 +1,89 @@
+"""
+Tests for the Chrome trace-event exporter
+"""
+
+from __future__ import print_function
+
+import io
+import json
+
+import simpy
+from hamcrest import assert_that, equal_to, has_length
+
+from serversim import Server, CoreSvcRequester, Seq, Par
+from serversim.trace import tracer
+from serversim.chrometrace import ChromeTraceExporter
+
+
+def export(sample_rate, num_requests):
+    env = simpy.Environment()
+    servers = [Server(env, 1, 2, 1, "Server_%s" % i) for i in range(2)]
+
+    def core(name, comp_units, server):
+        return CoreSvcRequester(env, name, lambda: comp_units,
+                                lambda _svc_name: server)
+
+    tree = Seq(env, "root", [core("a", 1.0, servers[0]),
+                             Par(env, "par", [core("b", 2.0, servers[0]),
+                                              core("c", 1.0, servers[1])])])
+    out = io.StringIO()
+    exporter = ChromeTraceExporter(out, sample_rate)
+    tracer.subscribe(exporter, ChromeTraceExporter.KINDS)
+    try:
+        for _ in range(num_requests):
+            tree.make_svc_request(None).submit()
+        env.run()
+    finally:
+        tracer.unsubscribe(exporter)
+    exporter.close()
+    return exporter, json.loads(out.getvalue())
+
+
+def test_spans_of_request_tree():
+    """
+    Scenario: A request tree is exported as nested spans
+        Every request of the tree is a span on the requests track, and
+        every core request has its queueing and processing phases on
+        the track of its server.
+    """
+    exporter, events = export(1.0, 1)
+    assert_that(exporter.exported_count, equal_to(5))
+
+    requests = [e for e in events if e.get("cat") == "request"]
+    names = sorted(e["name"] for e in requests if e["ph"] == "b")
+    assert_that(names, equal_to(["a", "b", "c", "par", "root"]))
+    assert_that(len(set(e["id"] for e in requests)), equal_to(1))
+
+    processing = dict(((e["pid"], e["name"], e["ph"]), e["ts"])
+                      for e in events if e.get("cat") == "processing")
+    servers = dict((e["args"]["name"], e["pid"]) for e in events
+                   if e["ph"] == "M")
+    s0 = servers["Server_0"]
+    assert_that((processing[(s0, "b", "b")], processing[(s0, "b", "e")]),
+                equal_to((1e6, 3e6)))
+
+
+def test_sampling_by_top_level_request():
+    exporter, events = export(0.5, 200)
+    total = exporter.exported_count + exporter.sampled_out_count
+    assert_that(total, equal_to(5 * 200))
+    # whole trees are kept or dropped
+    assert_that(exporter.exported_count % 5, equal_to(0))
+    assert_that(0.3 < exporter.exported_count / float(total) < 0.7,
+                equal_to(True))
+
+    exporter, events = export(0.0, 10)
+    assert_that(exporter.exported_count, equal_to(0))
+    assert_that(events, has_length(0))
+
+
+def test_sampling_is_reproducible():
+    """
+    Scenario: Same run, same trace
+        Request IDs start over in each environment, so a run exports the
+        same sampled trees whatever ran before it in the process.
+    """
+    _, first = export(0.5, 50)
+    export(1.0, 7)
+    _, second = export(0.5, 50)
+    assert_that(second, equal_to(first))
@@ -0,0 +1,80 @@
+"""
+Tests for paired scenario comparison with common random numbers
+"""
+
+from __future__ import print_function
+
+import numpy as np
+import simpy
+from hamcrest import assert_that, equal_to, less_than
+
+from serversim import Server, CoreSvcRequester, UserGroup
+from serversim.randutil import RandomStreams
+from serversim.compare import compare_scenarios, bootstrap_ci
+
+
+def scenario(speed):
+    def run(streams):
+        env = simpy.Environment()
+        server = Server(env, 2, 100, speed, "Server_1")
+        units = streams.stream("comp_units")
+        svc_1 = CoreSvcRequester(env, "svc_1",
+                                 lambda: units.uniform(0.5, 1.5),
+                                 lambda _svc_name: server)
+        svc_2 = CoreSvcRequester(env, "svc_2",
+                                 lambda: units.uniform(0.1, 0.3),
+                                 lambda _svc_name: server)
+        log = []
+        grp = UserGroup(env, 20, "Users", [(svc_1, 1), (svc_2, 2)], 1.0, 5.0,
+                        svc_req_log=log, rng=streams.stream("users"))
+        grp.activate_users()
+        env.run(until=100)
+        return log
+    return run
+
+
+def test_streams_are_reproducible_and_independent():
+    a = RandomStreams(1)
+    b = RandomStreams(1)
+    a.stream("x").random()  # using one stream does not shift another
+    assert_that(a.stream("y").random(), equal_to(b.stream("y").random()))
+    assert_that(RandomStreams(1).stream("x").random() ==
+                RandomStreams(2).stream("x").random(), equal_to(False))
+
+
+def test_identical_scenarios_have_zero_difference():
+    comparison = compare_scenarios(scenario(4.0), scenario(4.0), 3, 100, 25)
+    assert_that(np.all(comparison.mean_diff == 0), equal_to(True))
+    assert_that(comparison.overall_tail_ci.tolist(), equal_to([0.0, 0.0]))
+    assert_that(comparison.winner(), equal_to(None))
+
+
+def test_paired_comparison_calls_winner():
+    """
+    Scenario: Common random numbers reduce the variance of differences
+        A faster server is identified as the winner from a few
+        replications, and the paired differences vary less than the
+        differences between independently seeded runs.
+    """
+    slow, fast = scenario(4.0), scenario(5.0)
+    paired = compare_scenarios(slow, fast, 5, 100, 25)
+    assert_that(paired.winner("mean"), equal_to("b"))
+    assert_that(paired.overall_mean_diff, less_than(0))
+
+    def fast_other_seeds(streams):
+        return fast(RandomStreams(streams.seed + 1000))
+
+    independent = compare_scenarios(slow, fast_other_seeds, 5, 100, 25)
+    paired_sd = np.nanstd(paired.mean_b - paired.mean_a)
+    independent_sd = np.nanstd(independent.mean_b - independent.mean_a)
+    assert_that(paired_sd, less_than(independent_sd))
+
+
+def test_bootstrap_ci_brackets_mean():
+    rng = np.random.RandomState(0)
+    diffs = rng.normal(1.0, 0.1, size=(50, 4))
+    ci = bootstrap_ci(diffs)
+    assert_that(ci.shape, equal_to((4, 2)))
+    means = diffs.mean(axis=0)
+    assert_that(bool(np.all((ci[:, 0] < means) & (means < ci[:, 1]))),
+                equal_to(True))
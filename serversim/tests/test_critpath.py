@@ -0,0 +1,72 @@
+"""
+Tests for critical-path latency attribution
+"""
+
+from __future__ import print_function
+
+import simpy
+from hamcrest import assert_that, equal_to, close_to
+
+from serversim import Server, CoreSvcRequester, Seq, Par, Blkg
+from serversim.trace import tracer
+from serversim.critpath import ColumnarTrace, critical_path_attribution
+
+
+def run_traced(build, num_requests):
+    env = simpy.Environment()
+    servers = [Server(env, 1, 10, 1, "Server_%s" % i) for i in range(2)]
+
+    def core(name, comp_units, i):
+        return CoreSvcRequester(env, name, lambda: comp_units,
+                                lambda _svc_name: servers[i])
+
+    requester = build(env, core)
+    trace = tracer.subscribe(ColumnarTrace(), ColumnarTrace.KINDS)
+    try:
+        for _ in range(num_requests):
+            requester.make_svc_request(None).submit()
+        env.run()
+    finally:
+        tracer.unsubscribe(trace)
+    return trace
+
+
+def test_attribution_follows_critical_path():
+    """
+    Scenario: Attribution along the critical path of a composite
+        For Seq(a, Par(b, c), Blkg(d)), where b takes longer than c, the
+        service time is attributed to the processing of a, b and d; c
+        is not on the critical path.
+    """
+    def build(env, core):
+        return Seq(env, "root", [core("a", 1.0, 0),
+                                 Par(env, "par", [core("b", 2.0, 0),
+                                                  core("c", 1.0, 1)]),
+                                 Blkg(env, core("d", 1.0, 1))])
+
+    trace = run_traced(build, 1)
+    assert_that(len(trace), equal_to(7))
+    attribution = critical_path_attribution(trace)
+    assert_that(attribution.root_count, equal_to(1))
+    assert_that(attribution.root_time, close_to(4.0, 1e-9))
+    assert_that(attribution.as_dict(), equal_to({
+        ("a", "Server_0"): {"sw_queue": 0.0, "hw_queue": 0.0,
+                            "processing": 1.0, "other": 0.0},
+        ("b", "Server_0"): {"sw_queue": 0.0, "hw_queue": 0.0,
+                            "processing": 2.0, "other": 0.0},
+        ("d", "Server_1"): {"sw_queue": 0.0, "hw_queue": 0.0,
+                            "processing": 1.0, "other": 0.0},
+    }))
+
+
+def test_attribution_of_queueing():
+    def build(_env, core):
+        return core("a", 1.0, 0)
+
+    attribution = critical_path_attribution(run_traced(build, 3))
+    assert_that(attribution.root_time, close_to(1.0 + 2.0 + 3.0, 1e-9))
+    assert_that(attribution.as_dict(), equal_to({
+        ("a", "Server_0"): {"sw_queue": 0.0, "hw_queue": 3.0,
+                            "processing": 3.0, "other": 0.0},
+    }))
+    assert_that(attribution.fractions().sum(), close_to(1.0, 1e-9))
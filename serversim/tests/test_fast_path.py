@@ -0,0 +1,64 @@
+"""
+Tests for the CoreSvcRequester fast path
+"""
+
+from __future__ import print_function
+
+import random
+
+import simpy
+import pytest
+from hamcrest import assert_that, equal_to
+
+from serversim import Server, CoreSvcRequester, UserGroup, Seq, Par, Blkg, \
+    Async
+from randhelper import cug
+
+
+def run_scenario(fast_path, composite, late_binding):
+    saved = CoreSvcRequester.fast_path
+    CoreSvcRequester.fast_path = fast_path
+    try:
+        random.seed(12345)
+        env = simpy.Environment()
+        servers = [Server(env, 4, 8, 20, "Server_%s" % i) for i in range(5)]
+
+        def ld_bal(_svc_name):
+            return random.choice(servers)
+
+        log = []
+        a = CoreSvcRequester(env, "a", cug(2, 1), ld_bal, log,
+                             late_binding=late_binding)
+        b = CoreSvcRequester(env, "b", cug(1, .5), ld_bal, log,
+                             late_binding=late_binding)
+        if composite:
+            svcs = [(a, 1), (Seq(env, "ab", [a, b], cont=True), 1),
+                    (Par(env, "pab", [a, b]), 1),
+                    (Seq(env, "s", [Blkg(env, a), Async(env, b)]), 1)]
+        else:
+            svcs = [(a, 2), (b, 1)]
+        grp = UserGroup(env, 100, "Group", svcs, 1, 5)
+        grp.activate_users()
+        env.run(until=50)
+        return ([svc_req.time_log for (_, svc_req) in log],
+                grp.avg_response_time(), grp.responded_request_count())
+    finally:
+        CoreSvcRequester.fast_path = saved
+
+
+@pytest.mark.parametrize("composite, late_binding", [
+    (False, False),
+    (False, True),
+    (True, False),
+    (True, True),
+])
+def test_fast_path_matches_generic_path(composite, late_binding):
+    """
+    Scenario: The fast path is a pure optimization
+        Given the same random seed, every service request goes through
+        the same steps at the same times with and without the fast path.
+    """
+    generic = run_scenario(False, composite, late_binding)
+    fast = run_scenario(True, composite, late_binding)
+    assert_that(len(generic[0]) > 0, equal_to(True))
+    assert_that(fast, equal_to(generic))
@@ -0,0 +1,87 @@
+"""
+Tests for inline execution of Seq and Blkg children
+"""
+
+from __future__ import print_function
+
+import simpy
+import pytest
+from hamcrest import assert_that, equal_to
+
+from serversim import Server, CoreSvcRequester, Seq, Par, Blkg, Async
+
+
+def build_chain(env, server, inline, depth):
+    def fserver(_svc_name):
+        return server
+
+    def core(name, comp_units):
+        return CoreSvcRequester(env, name, lambda: comp_units, fserver,
+                                f=lambda x: (x or 0) + comp_units)
+
+    requester = core("leaf", 1.0)
+    for i in range(depth):
+        par = Par(env, "par_%s" % i, [core("p", 0.5), core("q", 1.5)],
+                  f=sum)
+        requester = Seq(env, "seq_%s" % i,
+                        [Blkg(env, requester, inline=inline), par,
+                         Async(env, core("async", 2.0)), core("c", 0.25)],
+                        inline=inline)
+    return requester
+
+
+@pytest.mark.parametrize("depth", [1, 5])
+def test_inline_matches_submitted(depth):
+    """
+    Scenario: Inline execution does not change results
+        A deep chain of Seq and Blkg requests has the same service time,
+        output value and time log when the children are executed inline
+        as when each child is submitted as a process of its own.
+    """
+    results = []
+    for inline in (False, True):
+        env = simpy.Environment()
+        server = Server(env, 100, 1000, 100, "Server_1")
+        svc_req = build_chain(env, server, inline, depth).make_svc_request(
+            None)
+        svc_req.submit()
+        env.run()
+        results.append((svc_req.service_time, svc_req.out_val,
+                        svc_req.time_log, server.throughput))
+    assert_that(results[1], equal_to(results[0]))
+
+
+class Failing(CoreSvcRequester):
+    """Core requester whose requests wait on a failing event first, and
+    record the failure."""
+
+    def _gen(self, svc_req):
+        evt = self.env.event()
+        evt.fail(ValueError("failed"))
+        try:
+            yield evt
+        except ValueError as e:
+            svc_req.failure = str(e)  # ad-hoc attribute
+        for evt in CoreSvcRequester._gen(self, svc_req):
+            yield evt
+
+
+@pytest.mark.parametrize("inline", [False, True])
+def test_inline_child_receives_exceptions(inline):
+    """
+    Scenario: Exceptions reach inline children
+        A failed event yielded by an inline child is thrown into the
+        child, which can handle it and complete, as when the child runs
+        in a process of its own.
+    """
+    env = simpy.Environment()
+    server = Server(env, 1, 2, 1, "Server_1")
+    failing = Failing(env, "failing", lambda: 1.0, lambda _svc_name: server)
+    seq = Seq(env, "seq", [Blkg(env, failing, inline=inline)], inline=inline)
+    svc_req = seq.make_svc_request(None)
+    svc_req.submit()
+    env.run()
+    child = svc_req.head_svc_req.enclosed_svc_req
+    assert_that((svc_req.is_completed, child.failure),
+                equal_to((True, "failed")))
+    assert_that(env.now, equal_to(1))
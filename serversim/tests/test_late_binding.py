@@ -0,0 +1,64 @@
+"""
+Tests for late-binding server selection
+"""
+
+from __future__ import print_function
+
+import simpy
+from hamcrest import assert_that, equal_to, contains_exactly
+
+from serversim import Server, CoreSvcRequester, Seq, Blkg
+
+
+def recording_fserver(env, server, selections):
+    def fserver(svc_name):
+        selections.append((svc_name, env.now))
+        return server
+    return fserver
+
+
+def test_seq_tail_server_selected_when_tail_starts():
+    """
+    Scenario: Late-binding selection in a sequence
+        With late binding, the server for each element of a Seq is
+        selected when that element starts executing, i.e., when the
+        previous element completes, rather than when the Seq request
+        is produced.
+    """
+    env = simpy.Environment()
+    server = Server(env, 1, 1, 1, "Server_1")
+    selections = []
+    fserver = recording_fserver(env, server, selections)
+    svc_a = CoreSvcRequester(env, "a", lambda: 2.0, fserver,
+                             late_binding=True)
+    svc_b = CoreSvcRequester(env, "b", lambda: 3.0, fserver,
+                             late_binding=True)
+    seq = Seq(env, "a_b", [svc_a, svc_b])
+
+    svc_req = seq.make_svc_request(None)
+    assert_that(selections, equal_to([]))
+
+    svc_req.submit()
+    env.run()
+
+    assert_that(selections, contains_exactly(("a", 0), ("b", 2.0)))
+    assert_that(svc_req.server, equal_to(server))
+    assert_that(svc_req.service_time, equal_to(5.0))
+
+
+def test_blkg_resolves_server_before_acquiring_thread():
+    env = simpy.Environment()
+    server = Server(env, 1, 2, 1, "Server_1")
+    selections = []
+    svc = CoreSvcRequester(env, "a", lambda: 1.0,
+                           recording_fserver(env, server, selections),
+                           late_binding=True)
+    blkg = Blkg(env, svc)
+
+    svc_req = blkg.make_svc_request(None)
+    svc_req.submit()
+    env.run()
+
+    assert_that(selections, contains_exactly(("a", 0)))
+    assert_that(svc_req.server, equal_to(server))
+    assert_that(svc_req.is_completed, equal_to(True))
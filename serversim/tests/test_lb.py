@@ -0,0 +1,99 @@
+"""
+Tests for load balancers
+"""
+
+from __future__ import print_function
+
+import random
+
+import simpy
+from hamcrest import assert_that, equal_to, is_in
+
+from serversim import Server, CoreSvcRequester
+from serversim.lb import RoundRobin, WeightedRandom, PowerOfTwoChoices, \
+    JoinShortestQueue, LeastOutstandingRequests, ServiceRouter, hw_load, \
+    thread_load
+from randhelper import cug
+
+
+def make_servers(env, n):
+    return [Server(env, 2, 4, 10, "Server_%s" % i) for i in range(n)]
+
+
+def test_round_robin_cycles_through_servers():
+    env = simpy.Environment()
+    servers = make_servers(env, 3)
+    lb = RoundRobin(servers)
+    picked = [lb("svc") for _ in range(7)]
+    assert_that(picked, equal_to(servers * 2 + servers[:1]))
+
+
+def test_weighted_random_never_picks_zero_weight_server():
+    env = simpy.Environment()
+    servers = make_servers(env, 3)
+    lb = WeightedRandom([(servers[0], 1), (servers[1], 0), (servers[2], 3)])
+    for _ in range(1000):
+        assert_that(lb("svc"), is_in([servers[0], servers[2]]))
+
+
+def test_least_loaded_index_matches_scan():
+    """
+    Scenario: The least-loaded balancers agree with a linear scan
+        At every selection, the server picked by JoinShortestQueue
+        (LeastOutstandingRequests) has the minimum hardware (thread)
+        load across all servers.
+    """
+    random.seed(12345)
+    env = simpy.Environment()
+    servers = make_servers(env, 20)
+    jsq = JoinShortestQueue(servers)
+    lor = LeastOutstandingRequests(servers)
+    p2c = PowerOfTwoChoices(servers)
+    lbs = [jsq, lor, p2c]
+
+    def checked(svc_name):
+        assert_that(hw_load(jsq(svc_name)),
+                    equal_to(min(hw_load(s) for s in servers)))
+        assert_that(thread_load(lor(svc_name)),
+                    equal_to(min(thread_load(s) for s in servers)))
+        return random.choice(lbs)(svc_name)
+
+    svc = CoreSvcRequester(env, "svc", cug(10, 5),
+                           ServiceRouter({"svc": checked}))
+
+    def driver():
+        for _ in range(2000):
+            yield env.timeout(random.uniform(0, 0.2))
+            svc.make_svc_request(None).submit()
+
+    env.process(driver())
+    env.run()
+
+    for server in servers:
+        assert_that(hw_load(server), equal_to(0))
+        assert_that(thread_load(server), equal_to(0))
+
+
+def test_random_balancers_draw_from_given_rng():
+    """
+    Scenario: Common random numbers
+        Random balancers given generators seeded alike pick the same
+        servers, whatever is drawn from the random module meanwhile.
+    """
+    env = simpy.Environment()
+    servers = make_servers(env, 5)
+
+    def picks(seed):
+        wr = WeightedRandom([(s, i + 1) for i, s in enumerate(servers)],
+                            rng=random.Random(seed))
+        p2c = PowerOfTwoChoices(servers, rng=random.Random(seed))
+        res = []
+        for _ in range(100):
+            random.random()
+            res.append((wr("svc"), p2c("svc")))
+        return res
+
+    random.seed(1)
+    first = picks(7)
+    random.seed(2)
+    assert_that(picks(7), equal_to(first))
@@ -0,0 +1,83 @@
+"""
+Tests for the vectorized Lindley-recursion engine
+"""
+
+from __future__ import print_function
+
+import math
+
+import numpy as np
+import simpy
+from hamcrest import assert_that, equal_to, close_to
+
+from serversim import Server, CoreSvcRequester
+from serversim.lindley import lindley_waits, SingleTierBatch, \
+    exponential_comp_units
+
+
+def simulated_waits(interarrivals, comp_units, max_concurrency, speed):
+    env = simpy.Environment()
+    server = Server(env, max_concurrency, 10 ** 6, speed, "Server_1")
+    units = iter(comp_units)
+    svc = CoreSvcRequester(env, "svc", lambda: next(units),
+                           lambda _svc_name: server)
+    svc_reqs = []
+
+    def arrivals():
+        for a in interarrivals:
+            yield env.timeout(a)
+            svc_req = svc.make_svc_request(None)
+            svc_reqs.append(svc_req)
+            svc_req.submit()
+
+    env.process(arrivals())
+    env.run()
+    return [svc_req.hw_queue_time for svc_req in svc_reqs]
+
+
+def test_waits_match_server():
+    """
+    Scenario: The recursion reproduces the hardware queue of a Server
+        Given the same arrival times and compute units, the waiting
+        times computed by the recursion equal the hardware queue times
+        of a simulated Server with the same number of hardware threads.
+    """
+    rng = np.random.RandomState(7)
+    interarrivals = rng.exponential(1.0, 500)
+    comp_units = rng.exponential(3.0, 500)
+    for max_concurrency in (1, 3):
+        speed = 2.0
+        durations = comp_units / (speed / max_concurrency)
+        waits = lindley_waits(interarrivals[None, :], durations[None, :],
+                              max_concurrency)[0]
+        expected = simulated_waits(interarrivals, comp_units,
+                                   max_concurrency, speed)
+        assert_that(np.allclose(waits, expected, atol=1e-9), equal_to(True))
+
+
+def erlang_c_response_time(arrival_rate, c, mean_duration):
+    a = arrival_rate * mean_duration  # offered load
+    rho = a / c
+    top = a ** c / math.factorial(c) / (1 - rho)
+    p_wait = top / (sum(a ** k / math.factorial(k) for k in range(c)) + top)
+    return p_wait * mean_duration / (c - a) + mean_duration
+
+
+def test_batch_matches_erlang_c():
+    # three scenarios in lockstep: M/M/1, M/M/2 and two M/M/1 servers
+    batch = SingleTierBatch(arrival_rate=[0.8, 1.6, 1.6],
+                            num_servers=[1, 1, 2], max_concurrency=[1, 2, 1],
+                            speed=[1.0, 2.0, 1.0],
+                            fcompunits=exponential_comp_units(1.0),
+                            num_requests=60000, warmup_requests=1000, seed=3)
+    result = batch.run()
+    expected = [erlang_c_response_time(0.8, 1, 1.0),
+                erlang_c_response_time(1.6, 2, 1.0),
+                erlang_c_response_time(0.8, 1, 1.0)]
+    for actual, exp in zip(result.avg_response_time, expected):
+        assert_that(actual, close_to(exp, 0.1 * exp))
+    for actual, exp in zip(result.throughput, [0.8, 1.6, 1.6]):
+        assert_that(actual, close_to(exp, 0.03 * exp))
+    for actual in result.utilization:
+        assert_that(actual, close_to(0.8, 0.03))
+    assert_that(result.response_time_quantiles().shape, equal_to((3, 3)))
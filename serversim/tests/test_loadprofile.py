@@ -0,0 +1,122 @@
+"""
+Tests for load profiles and user activation
+"""
+
+from __future__ import print_function, division
+
+import io
+import itertools
+import random
+
+import pytest
+import simpy
+from hamcrest import assert_that, equal_to, close_to
+
+from serversim import Server, CoreSvcRequester, UserGroup
+from serversim.loadprofile import StepProfile, RampProfile, DiurnalProfile, \
+    trace_profile, read_samples
+from serversim.util import binary_search, step_function
+
+
+def check_changes(profile, until, resolution=0.01):
+    """The changes of profile agree with count() at every resolution
+    step before until."""
+    changes = list(itertools.takewhile(lambda c: c[0] < until,
+                                       profile.changes()))
+    times = [t for (t, _) in changes]
+    assert_that(times, equal_to(sorted(times)))
+    for i in range(int(until / resolution)):
+        t = i * resolution
+        idx = binary_search(times, t)
+        # skip the points too close to a change for floating point
+        near = min(abs(t - c) for c in times)
+        if near > 1e-9:
+            assert_that(changes[idx][1], equal_to(profile.count(t)))
+    return changes
+
+
+def test_binary_search():
+    lst = [0, 2, 2, 5]
+    assert_that([binary_search(lst, x) for x in (-1, 0, 1, 2, 4, 5, 9)],
+                equal_to([None, 0, 0, 2, 2, 3, 3]))
+    assert_that(binary_search([], 1), equal_to(None))
+    f = step_function([(0, 10), (5, 20)])
+    assert_that([f(-1), f(0), f(7)], equal_to([None, 10, 20]))
+
+
+def test_step_profile():
+    profile = StepProfile([(0, 5), (10, 5), (20, 2)])
+    assert_that(list(profile.changes()), equal_to([(0, 5), (20, 2)]))
+    assert_that(profile.max_users, equal_to(5))
+    with pytest.raises(ValueError):
+        StepProfile([(1, 5)])
+
+
+def test_ramp_profile():
+    profile = RampProfile([(0, 0), (10, 10), (20, 10), (30, 4.2)])
+    changes = check_changes(profile, 40)
+    assert_that(changes[:3], equal_to([(0, 0), (0.5, 1), (1.5, 2)]))
+    assert_that(len(changes), equal_to(1 + 10 + 6))
+    assert_that(changes[-1][1], equal_to(4))
+
+
+def test_diurnal_profile():
+    profile = DiurnalProfile(10, 6, 100, phase=30)
+    changes = check_changes(profile, 250)
+    assert_that(profile.max_users, equal_to(16))
+    assert_that(max(c for (_, c) in changes), equal_to(16))
+    assert_that(min(c for (_, c) in changes), equal_to(4))
+    # 12 unit steps up and down per period
+    assert_that(len([t for (t, _) in changes if 50 <= t < 150]),
+                equal_to(24))
+
+
+def test_trace_profile():
+    text = u"time,users\n100,10\n110,30\n120,20\n"
+    samples = read_samples(io.StringIO(text))
+    profile = trace_profile(samples, scale=0.5)
+    assert_that(list(profile.changes()),
+                equal_to([(0, 5), (10, 15), (20, 10)]))
+    ramp = trace_profile(samples, interpolate=True)
+    assert_that(ramp.count(5), equal_to(20))
+
+
+def run_group(num_users, until):
+    env = simpy.Environment()
+    server = Server(env, 4, 100, 100.0, "Server_1")
+    svc = CoreSvcRequester(env, "svc", lambda: 1.0, lambda _svc_name: server)
+    grp = UserGroup(env, num_users, "Users", [(svc, 1)], 1.0, 1.0,
+                    rng=random.Random(3))
+    grp.activate_users()
+    env.run(until=until)
+    return env, grp
+
+
+def test_step_list_same_as_profile():
+    steps = [(0, 5), (20, 0), (40, 8)]
+    _, grp = run_group(steps, 100)
+    _, profile_grp = run_group(StepProfile(steps), 100)
+    assert_that(profile_grp.responded_request_count(),
+                equal_to(grp.responded_request_count()))
+    assert_that(grp.num_users, equal_to(steps))
+
+
+def test_dormant_users_do_not_wake_up():
+    """
+    Scenario: No wasted wake-ups
+        Users above the profile's count are not started until needed,
+        and dormant users wait on an event instead of timeouts, so a long
+        idle period schedules no events.
+    """
+    env, grp = run_group([(0, 2), (10, 0), (1000000, 3)], 50)
+    assert_that(grp._started_users, equal_to(2))
+    # the only pending timeout is the controller's next change
+    timeouts = [(t, evt) for (t, _, _, evt) in env._queue
+                if isinstance(evt, simpy.events.Timeout)]
+    assert_that([t for (t, _) in timeouts], equal_to([1000000]))
+    responded = grp.responded_request_count()
+    env.run(until=1000050)
+    assert_that(grp._started_users, equal_to(3))
+    # 3 users, each with a 1 s think time and 0.04 s response time
+    assert_that(grp.responded_request_count() - responded,
+                close_to(3 * 50 / 1.04, 3))
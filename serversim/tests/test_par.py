@@ -0,0 +1,74 @@
+"""
+Tests for Par join semantics
+"""
+
+from __future__ import print_function
+
+import simpy
+import pytest
+from hamcrest import assert_that, equal_to, close_to
+
+from serversim import Server, CoreSvcRequester, Seq, Par, Blkg
+
+
+def make_par(env, server, k=None, cancel_stragglers=False):
+    def fserver(_svc_name):
+        return server
+
+    def core(name, comp_units):
+        return CoreSvcRequester(env, name, lambda: comp_units, fserver,
+                                f=lambda _x: name)
+
+    children = [core("a", 1.0), core("b", 3.0),
+                Seq(env, "cd", [core("c", 2.0), core("d", 2.0)]),
+                Blkg(env, core("e", 5.0))]
+    return Par(env, "par", children, f=tuple, k=k,
+               cancel_stragglers=cancel_stragglers)
+
+
+@pytest.mark.parametrize("k, service_time, out_val", [
+    (None, 5.0, ("a", "b", "d", "e")),
+    (4, 5.0, ("a", "b", "d", "e")),
+    (1, 1.0, ("a", None, None, None)),
+    (2, 3.0, ("a", "b", None, None)),
+])
+def test_par_completes_after_k_children(k, service_time, out_val):
+    """
+    Scenario: k-of-n join
+        A Par request completes when k of its children complete, and its
+        output is computed from the outputs of the completed children.
+    """
+    env = simpy.Environment()
+    server = Server(env, 10, 10, 10, "Server_1")
+    svc_req = make_par(env, server, k).make_svc_request(None)
+    svc_req.submit()
+    env.run()
+    assert_that(svc_req.service_time, close_to(service_time, 1e-9))
+    assert_that(svc_req.out_val, equal_to(out_val))
+    # stragglers are not cancelled by default
+    assert_that(server.throughput * env.now, close_to(5, 1e-9))
+
+
+def test_par_cancels_stragglers():
+    """
+    Scenario: Cancelling stragglers
+        With cancel_stragglers, the children that have not completed when
+        a first-of-n Par request completes stop: queued resource requests
+        are withdrawn and held resources are released.  Processing that
+        is already under way runs to the end.
+    """
+    env = simpy.Environment()
+    server = Server(env, 1, 10, 1, "Server_1")
+    svc_req = make_par(env, server, 1, True).make_svc_request(None)
+    svc_req.submit()
+    env.run()
+
+    assert_that(svc_req.service_time, close_to(1.0, 1e-9))
+    # "b" was granted the hardware thread released by "a" before the Par
+    # request completed, all other core requests were still queued
+    assert_that(server.throughput * env.now, close_to(2, 1e-9))
+    assert_that(env.now, close_to(4.0, 1e-9))
+    assert_that(server.hw_queue_length, equal_to(0))
+    assert_that(server.hw_in_process_count, equal_to(0))
+    assert_that(server.thread_queue_length, equal_to(0))
+    assert_that(server.thread_in_use_count, equal_to(0))
@@ -0,0 +1,86 @@
+"""
+Tests for compiled execution plans
+"""
+
+from __future__ import print_function
+
+import simpy
+import pytest
+from hamcrest import assert_that, equal_to, close_to
+
+from serversim import Server, CoreSvcRequester, Seq, Par, Blkg, Async, \
+    Compiled
+from serversim.plan import compile_plan, CORE, THREAD_ACQ, THREAD_REL, PAR, \
+    ASYNC
+
+
+def build_tree(env, server):
+    def fserver(_svc_name):
+        return server
+
+    def core(name, comp_units):
+        return CoreSvcRequester(env, name, lambda: comp_units, fserver,
+                                f=lambda x: (x or ()) + (name,))
+
+    a = core("a", 1.0)
+    b = core("b", 2.0)
+    c = core("c", 3.0)
+    d = core("d", 0.5)
+    par = Par(env, "par", [b, Seq(env, "cd", [c, d], cont=True)],
+              f=tuple)
+    return Seq(env, "root", [Blkg(env, a), Async(env, d), par, b])
+
+
+def run_once(compiled, submit_times):
+    env = simpy.Environment()
+    server = Server(env, 2, 16, 2, "Server_1")
+    tree = build_tree(env, server)
+    requester = Compiled(env, tree) if compiled else tree
+    svc_reqs = []
+
+    def driver():
+        last = 0
+        for t in submit_times:
+            yield env.timeout(t - last)
+            last = t
+            svc_req = requester.make_svc_request(None)
+            svc_reqs.append(svc_req)
+            svc_req.submit()
+
+    env.process(driver())
+    env.run()
+    return ([(svc_req.service_time, svc_req.out_val) for svc_req in svc_reqs],
+            server.throughput, server.avg_hw_queue_time,
+            server.avg_thread_queue_time)
+
+
+def test_plan_is_flat():
+    env = simpy.Environment()
+    server = Server(env, 2, 16, 2, "Server_1")
+    plan = compile_plan(build_tree(env, server))
+    ops = [step[0] for step in plan.steps]
+    assert_that(ops, equal_to([THREAD_ACQ, CORE, THREAD_REL, ASYNC, PAR,
+                               CORE]))
+    branch_ops = [[step[0] for step in branch.steps]
+                  for branch in plan.steps[4][3]]
+    assert_that(branch_ops, equal_to([[CORE], [CORE, CORE]]))
+
+
+@pytest.mark.parametrize("submit_times", [
+    [0],
+    [0, 10, 25],
+])
+def test_compiled_matches_uncompiled(submit_times):
+    """
+    Scenario: A compiled tree behaves like the tree
+        With deterministic compute units, a single server and
+        non-overlapping top-level requests, requests executed from the
+        compiled plan have the same service times and output values, and
+        the server has the same statistics, as the requests produced by
+        the uncompiled tree.
+    """
+    uncompiled = run_once(False, submit_times)
+    compiled = run_once(True, submit_times)
+    assert_that(compiled[0], equal_to(uncompiled[0]))
+    for x, y in zip(compiled[1:], uncompiled[1:]):
+        assert_that(x, close_to(y, 1e-9))
@@ -0,0 +1,133 @@
+"""
+Tests for service request pooling
+"""
+
+from __future__ import print_function
+
+import random
+
+import simpy
+from hamcrest import assert_that, equal_to, greater_than, less_than
+
+from serversim import Server, CoreSvcRequester, UserGroup, Seq, Par, Blkg, \
+    Async
+from randhelper import cug
+
+
+def run_scenario(pool, log=None):
+    random.seed(54321)
+    env = simpy.Environment()
+    servers = [Server(env, 4, 8, 20, "Server_%s" % i) for i in range(3)]
+
+    def ld_bal(_svc_name):
+        return random.choice(servers)
+
+    a = CoreSvcRequester(env, "a", cug(2, 1), ld_bal, log, pool=pool)
+    b = CoreSvcRequester(env, "b", cug(1, .5), ld_bal, pool=pool)
+    composites = [Seq(env, "ab", [a, b], cont=True), Par(env, "pab", [a, b]),
+                  Seq(env, "s", [Blkg(env, a), Async(env, b)])]
+    for requester in composites:
+        requester.pool = pool
+    svcs = [(a, 1)] + [(requester, 1) for requester in composites]
+    grp = UserGroup(env, 50, "Group", svcs, 1, 5)
+    grp.activate_users()
+    env.run(until=100)
+    stats = (grp.avg_response_time(), grp.responded_request_count(),
+             [server.throughput for server in servers],
+             [server.avg_hw_queue_time for server in servers])
+    return stats, a
+
+
+def test_pooling_reuses_requests_without_changing_results():
+    """
+    Scenario: Pooling is a pure optimization
+        With the same random seed, a simulation with pooling enabled
+        produces the same statistics as without pooling, while the
+        requests produced by a pooled requester are reused.
+    """
+    unpooled, _ = run_scenario(False)
+    pooled, a = run_scenario(True)
+    assert_that(pooled, equal_to(unpooled))
+
+    # completed requests of "a" are back in its free list and reused
+    assert_that(len(a._free), greater_than(0))
+    svc_req = a.make_svc_request(None)
+    assert_that(svc_req._free is a._free, equal_to(True))
+
+
+def test_pooling_disabled_by_log():
+    log = []
+    stats, a = run_scenario(True, log)
+    assert_that(stats[1], greater_than(0))
+    assert_that(len(a._free), equal_to(0))
+    ids = [svc_req.id for (_, svc_req) in log]
+    assert_that(len(set(ids)), equal_to(len(ids)))
+    assert_that(len(set(id(svc_req) for (_, svc_req) in log)),
+                equal_to(len(log)))
+
+
+def test_recycled_request_is_reset():
+    env = simpy.Environment()
+    server = Server(env, 1, 1, 1, "Server_1")
+    a = CoreSvcRequester(env, "a", lambda: 1.0, lambda _svc_name: server,
+                         f=lambda x: x * 2, pool=True)
+    first = a.make_svc_request(None, 1)
+    first.submit()
+    env.run()
+    first_id = first.id
+    first.recycle()
+
+    second = a.make_svc_request(None, 5)
+    assert_that(second is first, equal_to(True))
+    assert_that(second.id, greater_than(first_id))
+    assert_that((second.is_completed, second.time_log, second.out_val),
+                equal_to((False, [], None)))
+    second.submit()
+    env.run()
+    assert_that((second.out_val, second.service_time), equal_to((10, 1.0)))
+    assert_that(len(a._free), less_than(1))
+
+
+def test_logged_composites_keep_their_sub_requests():
+    """
+    Scenario: Only unlogged trees are recycled
+        When a group logs its requests, the sub-requests of the logged
+        composite requests are not recycled, so they still belong to
+        their parents; without the log, whole trees are recycled.
+    """
+    def run(svc_req_log):
+        random.seed(7)
+        env = simpy.Environment()
+        server = Server(env, 2, 10, 10, "Server_1")
+        a = CoreSvcRequester(env, "a", cug(2, 1), lambda _svc_name: server,
+                             pool=True)
+        b = CoreSvcRequester(env, "b", cug(2, 1), lambda _svc_name: server,
+                             pool=True)
+        composites = [Seq(env, "seq", [a, b]), Par(env, "par", [a, b]),
+                      Blkg(env, Seq(env, "inner", [a, b]))]
+        for requester in composites:
+            requester.pool = True
+        grp = UserGroup(env, 5, "Group", [(r, 1) for r in composites], 1, 2,
+                        svc_req_log=svc_req_log)
+        grp.activate_users()
+        env.run(until=50)
+        return a, b
+
+    def check(svc_req):
+        for child in svc_req.children:
+            assert_that(child.parent is svc_req, equal_to(True))
+            assert_that(child.is_completed, equal_to(True))
+            check(child)
+
+    log = []
+    a, b = run(log)
+    completed = [svc_req for (_, svc_req) in log if svc_req.is_completed]
+    assert_that(len(completed), greater_than(0))
+    for svc_req in completed:
+        assert_that(len(svc_req.children), greater_than(0))
+        check(svc_req)
+    assert_that((len(a._free), len(b._free)), equal_to((0, 0)))
+
+    a, b = run(None)
+    assert_that(len(a._free), greater_than(0))
+    assert_that(len(b._free), greater_than(0))
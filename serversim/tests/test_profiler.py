@@ -0,0 +1,161 @@
+"""
+Tests for the simulation profiler
+"""
+
+from __future__ import print_function
+
+import random
+
+import simpy
+from hamcrest import assert_that, equal_to, greater_than, has_item, \
+    is_not, close_to
+
+from serversim import Server, CoreSvcRequester, Seq, Par, SvcRequest, \
+    UserGroup
+from serversim.profiler import Profiler
+from serversim.usergroup import RequestGroup
+
+
+def build(env):
+    servers = [Server(env, 2, 10, 10.0, "Server_%d" % i) for i in range(2)]
+    rng = random.Random(3)
+
+    def ld_bal(_svc_name):
+        return rng.choice(servers)
+
+    svc_1 = CoreSvcRequester(env, "svc_1", lambda: 1.0, ld_bal)
+    svc_2 = CoreSvcRequester(env, "svc_2", lambda: 0.5, ld_bal)
+    txn = Seq(env, "txn", [svc_1, Par(env, "fan_out", [svc_2, svc_2])])
+    grp = UserGroup(env, 10, "Users", [(txn, 1), (svc_2, 1)], 1.0, 2.0,
+                    rng=random.Random(4))
+    grp.activate_users()
+    return grp, [svc_1, svc_2]
+
+
+def test_profiling_does_not_change_results():
+    env = simpy.Environment()
+    grp, _ = build(env)
+    env.run(until=50)
+
+    profiled_env = simpy.Environment()
+    profiled_grp, requesters = build(profiled_env)
+    with Profiler(profiled_env, requesters, log_time=True, sample_every=4):
+        profiled_env.run(until=50)
+    assert_that(profiled_grp.responded_request_count(),
+                equal_to(grp.responded_request_count()))
+    assert_that(profiled_grp.avg_response_time(),
+                equal_to(grp.avg_response_time()))
+
+
+def test_attribution():
+    """
+    Scenario: Steps attributed to requesters, servers and groups
+        The steps of the core services, the composites and the users are
+        attributed to them, load balancing and logging are timed
+        separately, and all request steps belong to the user group.
+    """
+    env = simpy.Environment()
+    grp, requesters = build(env)
+    profiler = Profiler(env, requesters, log_time=True, sample_every=1,
+                        groups=[grp])
+    with profiler:
+        env.run(until=50)
+
+    components = dict((name, count) for (name, _, count)
+                      in profiler.totals("component"))
+    for name in ("UserGroup Users", "CoreSvcRequester svc_1",
+                 "CoreSvcRequester svc_2", "Seq txn", "Par fan_out",
+                 "load balancing svc_1", "log_time"):
+        assert_that(components.get(name, 0), greater_than(0))
+
+    servers = [name for (name, _, _) in profiler.totals("server")]
+    assert_that(servers, has_item("Server_0"))
+    assert_that(servers, has_item("Server_1"))
+
+    for ((component, server, group), _) in profiler.stats.items():
+        if server != "-":
+            assert_that(group, equal_to("Users"))
+
+    report = profiler.format_report()
+    assert_that(report.splitlines()[0].startswith("By component"),
+                equal_to(True))
+
+
+def test_uninstall_restores():
+    env = simpy.Environment()
+    grp, requesters = build(env)
+    fserver = requesters[0].fserver
+    log_time = SvcRequest.__dict__["log_time"]
+    submitted = RequestGroup.__dict__["_submitted"]
+    profiler = Profiler(env, requesters, log_time=True, groups=[grp])
+    profiler.install()
+    assert_that(SvcRequest.__dict__["log_time"], is_not(log_time))
+    assert_that("_submitted" in grp.__dict__, equal_to(True))
+    profiler.uninstall()
+    assert_that(SvcRequest.__dict__["log_time"], equal_to(log_time))
+    assert_that("_submitted" in grp.__dict__, equal_to(False))
+    assert_that("_submitted" in UserGroup.__dict__, equal_to(False))
+    assert_that(RequestGroup.__dict__["_submitted"], equal_to(submitted))
+    assert_that(requesters[0].fserver, equal_to(fserver))
+    assert_that("step" in env.__dict__, equal_to(False))
+
+
+def test_overlapping_profilers():
+    """
+    Scenario: Profilers of two environments
+        Profilers of two environments installed and uninstalled in any
+        order each attribute the steps and logging of their own
+        environment only, and leave the classes as they were.
+    """
+    log_time = SvcRequest.__dict__["log_time"]
+    envs = [simpy.Environment() for _ in range(2)]
+    groups = [build(env)[0] for env in envs]
+    groups[1].name = "Others"
+    profilers = [Profiler(env, log_time=True, sample_every=1, groups=[grp])
+                 for (env, grp) in zip(envs, groups)]
+    profilers[0].install()
+    envs[0].run(until=10)
+    profilers[1].install()
+    envs[0].run(until=20)
+    envs[1].run(until=20)
+    profilers[0].uninstall()
+    envs[1].run(until=30)
+    profilers[1].uninstall()
+    assert_that(SvcRequest.__dict__["log_time"], equal_to(log_time))
+
+    for (profiler, name) in zip(profilers, ("Users", "Others")):
+        groups = [group for (group, _, _) in profiler.totals("group")]
+        assert_that(sorted(groups), equal_to(sorted([name, "-"])))
+        components = dict((component, count) for (component, _, count)
+                          in profiler.totals("component"))
+        assert_that(components["log_time"], greater_than(0))
+        assert_that(profiler.step_count,
+                    equal_to(sum(components.values()) -
+                             components["log_time"]))
+
+
+def test_sampled_steps_estimate_exact_profile():
+    """
+    Scenario: Sampling
+        Timing a fraction of the steps gives event counts close to those
+        of timing every step, for all components, at a lower cost.
+    """
+    def profile(sample_every):
+        env = simpy.Environment()
+        build(env)
+        profiler = Profiler(env, sample_every=sample_every)
+        with profiler:
+            env.run(until=500)
+        return profiler, dict((name, count) for (name, _, count)
+                              in profiler.totals("component"))
+
+    exact, exact_counts = profile(1)
+    sampled, sampled_counts = profile(8)
+    assert_that(sampled.step_count, equal_to(exact.step_count))
+    assert_that(sum(exact_counts.values()), equal_to(exact.step_count))
+    assert_that(sum(sampled_counts.values()),
+                close_to(exact.step_count, 0.05 * exact.step_count))
+    for (name, count) in exact_counts.items():
+        if count > 1000:
+            assert_that(sampled_counts.get(name, 0),
+                        close_to(count, 0.15 * count))
@@ -0,0 +1,124 @@
+"""
+Tests for completion records and sinks
+"""
+
+from __future__ import print_function
+
+import gc
+import io
+import random
+import weakref
+
+import simpy
+from hamcrest import assert_that, equal_to, close_to
+
+from serversim import Server, CoreSvcRequester, Seq, Blkg, UserGroup
+from serversim.records import RecordWriter, read_records, response_time
+
+
+def build(env, group_sink=None, svc_sink=None, server_sink=None,
+          svc_req_log=None):
+    server = Server(env, 2, 10, 10.0, "Server_1", sink=server_sink)
+    svc = CoreSvcRequester(env, "svc", lambda: 1.0, lambda _svc_name: server,
+                           sink=svc_sink, pool=True)
+    txn = Seq(env, "txn", [svc, svc])
+    txn.sink = svc_sink
+    grp = UserGroup(env, 5, "Users", [(svc, 1), (txn, 1)], 1.0, 2.0,
+                    svc_req_log=svc_req_log, rng=random.Random(9),
+                    sink=group_sink)
+    grp.activate_users()
+    return grp
+
+
+def test_records_match_log():
+    """
+    Scenario: Same data as the log
+        The group's sink receives one record per response, with the
+        same timings as the requests of an identical run with a log.
+    """
+    log = []
+    env = simpy.Environment()
+    build(env, svc_req_log=log)
+    env.run(until=100)
+    expected = [(svc_req.id, svc_req.svc_name, svc_req.time_dict["submitted"],
+                 svc_req.time_dict["completed"])
+                for (_, svc_req) in log if svc_req.is_completed]
+
+    records = []
+    env = simpy.Environment()
+    grp = build(env, group_sink=records.append)
+    env.run(until=100)
+    assert_that(len(records), equal_to(grp.responded_request_count()))
+    assert_that(set(r.name for r in records), equal_to({"Users"}))
+    assert_that(sorted((r.submitted, r.completed, r.svc_name)
+                       for r in records),
+                equal_to(sorted((s, c, n) for (_, n, s, c) in expected)))
+    avg = sum(response_time(r) for r in records) / len(records)
+    assert_that(avg, close_to(grp.avg_response_time(), 1e-9))
+
+
+def test_requester_and_server_sinks():
+    svc_records = []
+    server_records = []
+    env = simpy.Environment()
+    build(env, svc_sink=svc_records.append,
+          server_sink=server_records.append)
+    env.run(until=100)
+    txn_records = [r for r in svc_records if r.svc_name == "txn"]
+    txn_ids = set(r.req_id for r in txn_records)
+    children = [r for r in svc_records if r.parent_id in txn_ids]
+    assert_that(len(children), equal_to(2 * len(txn_records)))
+    assert_that(set(r.name for r in server_records), equal_to({"Server_1"}))
+    # only the core requests, which ran on the server's hardware
+    assert_that(sorted(server_records), equal_to(sorted(
+        r._replace(name="Server_1") for r in svc_records
+        if r.svc_name == "svc")))
+    for r in server_records:
+        assert_that(r.process_time, close_to(0.2, 1e-9))
+
+
+def test_server_sink_skips_composites():
+    records = []
+    env = simpy.Environment()
+    server = Server(env, 1, 2, 1.0, "Server_1", sink=records.append)
+    core = CoreSvcRequester(env, "core", lambda: 1.0,
+                            lambda _svc_name: server)
+    Blkg(env, core).make_svc_request(None).submit()
+    Seq(env, "seq", [core, core]).make_svc_request(None).submit()
+    env.run()
+    assert_that([r.svc_name for r in records], equal_to(["core"] * 3))
+    assert_that(all(r.hw_queue_time is not None for r in records),
+                equal_to(True))
+
+
+def test_sink_does_not_retain_requests():
+    """
+    Scenario: Requests become garbage
+        With a sink instead of a log, completed requests are not kept
+        alive by the records.
+    """
+    env = simpy.Environment()
+    server = Server(env, 1, 1, 1.0, "Server_1")
+    records = []
+    svc = CoreSvcRequester(env, "svc", lambda: 1.0, lambda _svc_name: server,
+                           sink=records.append)
+    svc_req = svc.make_svc_request(None)
+    env.run(until=svc_req.submit())
+    ref = weakref.ref(svc_req)
+    del svc_req
+    gc.collect()
+    assert_that(ref(), equal_to(None))
+    assert_that(records[0].completed, equal_to(1.0))
+
+
+def test_csv_round_trip():
+    records = []
+    env = simpy.Environment()
+    build(env, group_sink=records.append)
+    env.run(until=30)
+    buf = io.StringIO()
+    writer = RecordWriter(buf)
+    for record in records:
+        writer(record)
+    buf.seek(0)
+    assert_that(list(read_records(buf)), equal_to(records))
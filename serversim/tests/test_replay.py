@@ -0,0 +1,114 @@
+"""
+Tests for trace-driven replay
+"""
+
+from __future__ import print_function, division
+
+import numpy as np
+import pytest
+import simpy
+from hamcrest import assert_that, equal_to, close_to
+
+from serversim import Server, CoreSvcRequester, Seq
+from serversim.profiler import Profiler
+from serversim.replay import TraceReplayGroup, read_arrivals
+
+
+TRACE = [
+    (1000.0, "/login", 2.0),
+    (1001.0, "/search", 1.0),
+    (1001.0, "/search", 3.0),
+    (1002.5, "/health", 0.5),
+    (1004.0, "/checkout", 1.0),
+]
+
+
+def write_csv(path):
+    with open(str(path), "w") as f:
+        f.write("timestamp,endpoint,cu\n")
+        for (t, endpoint, cu) in TRACE:
+            f.write("%s,%s,%s\n" % (t, endpoint, cu))
+
+
+def write_npy(path):
+    data = np.array(TRACE, dtype=[("timestamp", "f8"), ("endpoint", "S16"),
+                                  ("cu", "f8")])
+    np.save(str(path), data)
+
+
+def build(env, arrivals, rate=1.0):
+    server = Server(env, 1, 10, 1.0, "Server_1")
+    login = CoreSvcRequester(env, "login", lambda: 10.0,
+                             lambda _svc_name: server)
+    search = CoreSvcRequester(env, "search", lambda: 10.0,
+                              lambda _svc_name: server)
+    checkout = Seq(env, "checkout", [login, search])
+    grp = TraceReplayGroup(env, arrivals, "Replay",
+                           {"/login": login, "/search": search,
+                            "/checkout": checkout}, rate=rate)
+    grp.activate_users()
+    return grp, login, search, checkout
+
+
+@pytest.mark.parametrize("ext", ["csv", "npy"])
+def test_replay_with_comp_units(tmp_path, ext):
+    """
+    Scenario: Replaying a trace file
+        Requests are submitted at the trace's times, in chunks, with the
+        trace's compute units for core requesters; unmapped endpoints
+        are skipped.
+    """
+    path = tmp_path / ("trace." + ext)
+    (write_csv if ext == "csv" else write_npy)(path)
+    env = simpy.Environment()
+    arrivals = read_arrivals(str(path), comp_units_col="cu", chunk_size=2)
+    grp, login, search, checkout = build(env, arrivals)
+    env.run()
+    assert_that(grp.finished, equal_to(True))
+    assert_that(grp.skipped_count, equal_to(1))
+    assert_that(grp.responded_request_count(), equal_to(4))
+    assert_that(grp.unresponded_request_count(), equal_to(0))
+    # one hardware thread: login 0-2; searches 2-3 and 3-6
+    assert_that(grp.max_response_time(login), close_to(2.0, 1e-9))
+    assert_that(grp.avg_response_time(search), close_to((2 + 5) / 2, 1e-9))
+    # composite: default compute units (10 each), starting at 4 after the
+    # server frees up at 6
+    assert_that(grp.max_response_time(checkout), close_to(22.0, 1e-9))
+    assert_that(env.now, equal_to(26.0))
+
+
+def test_scaled_rate_without_comp_units():
+    arrivals = [(np.array([0.0, 10.0, 20.0]), ["/login"] * 3, None)]
+    env = simpy.Environment()
+    grp, login, _, _ = build(env, arrivals, rate=2.0)
+    submitted = []
+    login.log = submitted
+    env.run()
+    assert_that([svc_req.time_dict["submitted"]
+                 for (_, svc_req) in submitted], equal_to([0.0, 5.0, 10.0]))
+    # 10 s each on one hardware thread: done at 10, 20 and 30
+    assert_that(grp.avg_response_time(), close_to((10 + 15 + 20) / 3, 1e-9))
+    assert_that(grp.throughput(), close_to(3 / 30.0, 1e-9))
+
+
+def test_profiler_attributes_replay_group():
+    arrivals = [(np.array([0.0, 1.0]), ["/login", "/search"], None)]
+    env = simpy.Environment()
+    build(env, arrivals)
+    profiler = Profiler(env, sample_every=1)
+    with profiler:
+        env.run()
+    names = [name for (name, _, _) in profiler.totals("component")]
+    assert_that("TraceReplayGroup Replay" in names, equal_to(True))
+
+
+def test_parquet(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    table = pa.table({"timestamp": [t for (t, _, _) in TRACE],
+                      "endpoint": [e for (_, e, _) in TRACE]})
+    path = str(tmp_path / "trace.parquet")
+    pq.write_table(table, path)
+    chunks = list(read_arrivals(path, chunk_size=3))
+    assert_that([len(c[1]) for c in chunks], equal_to([3, 2]))
+    assert_that(chunks[1][1], equal_to(["/health", "/checkout"]))
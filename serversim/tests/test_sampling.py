@@ -0,0 +1,124 @@
+"""
+Tests for memory-bounded service request logs
+"""
+
+from __future__ import print_function, division
+
+import random
+
+import simpy
+from hamcrest import assert_that, equal_to, close_to, greater_than
+
+from serversim import Server, CoreSvcRequester, UserGroup
+from serversim import trace
+from serversim.sampling import ReservoirLog, StratifiedLog, TailLog
+
+
+class FakeReq(object):
+    def __init__(self, svc_name, i):
+        self.svc_name = svc_name
+        self.i = i
+
+
+def build(env, log, rng_seed=3):
+    server = Server(env, 2, 10, 10.0, "Server_1")
+    rng = random.Random(rng_seed)
+    common = CoreSvcRequester(env, "common", lambda: rng.uniform(0.1, 2.0),
+                              lambda _svc_name: server)
+    rare = CoreSvcRequester(env, "rare", lambda: 1.0,
+                            lambda _svc_name: server)
+    grp = UserGroup(env, 20, "Users", [(common, 20), (rare, 1)], 1.0, 2.0,
+                    svc_req_log=log, rng=random.Random(rng_seed + 1))
+    grp.activate_users()
+    return grp
+
+
+def test_reservoir_is_uniform():
+    """
+    Scenario: Uniform sample
+        Every appended entry has the same chance to be kept, so the mean
+        of the kept positions over many samples is that of all of them.
+    """
+    rng = random.Random(1)
+    total = 0.0
+    for _ in range(200):
+        log = ReservoirLog(50, rng)
+        for i in range(1000):
+            log.append(("svc", FakeReq("svc", i)))
+        assert_that(len(log), equal_to(50))
+        assert_that(log.seen_count, equal_to(1000))
+        total += sum(req.i for (_, req) in log) / 50
+    assert_that(total / 200, close_to(499.5, 10))
+    assert_that(log.weight, equal_to(20))
+
+
+def test_reservoir_keeps_all_below_capacity():
+    log = ReservoirLog(10, random.Random(2))
+    entries = [("svc", FakeReq("svc", i)) for i in range(7)]
+    for entry in entries:
+        log.append(entry)
+    assert_that(list(log), equal_to(entries))
+
+
+def test_stratified_log_with_user_group():
+    """
+    Scenario: Rare service represented
+        A user group logging to a stratified log keeps up to the cap for
+        each service, including the rarely requested one, and the weights
+        restore the full counts.
+    """
+    env = simpy.Environment()
+    log = StratifiedLog(30, random.Random(5))
+    grp = build(env, log)
+    env.run(until=200)
+    assert_that(sorted(log.strata), equal_to(["common", "rare"]))
+    assert_that(len(log.strata["common"]), equal_to(30))
+    assert_that(len(log.strata["rare"]), greater_than(0))
+    assert_that(log.seen_count,
+                greater_than(grp.responded_request_count() - 1))
+    estimate = sum(log.weight(svc_req.svc_name) for (_, svc_req) in log)
+    assert_that(estimate, close_to(log.seen_count, 1e-6))
+
+
+def test_tail_log_keeps_slowest():
+    """
+    Scenario: Tail sampling
+        The tail log keeps requests slower than the running p90 estimate,
+        at most capacity of them, and stops receiving completions once
+        closed.
+    """
+    env = simpy.Environment()
+    full_log = []
+    env_full = simpy.Environment()
+    build(env_full, full_log)
+    env_full.run(until=200)
+    response_times = sorted(
+        svc_req.time_dict["completed"] - svc_req.time_dict["submitted"]
+        for (_, svc_req) in full_log if svc_req.is_completed)
+
+    with TailLog(10, 0.9) as log:
+        build(env, log)
+        env.run(until=200)
+    assert_that(trace.tracer.enabled, equal_to(False))
+    assert_that(len(log), equal_to(10))
+    kept = [svc_req.time_dict["completed"] - svc_req.time_dict["submitted"]
+            for (_, svc_req) in log]
+    assert_that(kept, equal_to(sorted(kept)))
+    # same model and seeds: the kept ones are the 10 slowest
+    assert_that(kept, equal_to(response_times[-10:]))
+    assert_that(log.completed_count, equal_to(len(response_times)))
+    assert_that(log.threshold < kept[0], equal_to(True))
+
+
+def test_tail_log_receives_its_environment_only():
+    env = simpy.Environment()
+    other_env = simpy.Environment()
+    with TailLog(10, 0.9) as log:
+        assert_that(trace.tracer.enabled, equal_to(False))
+        grp = build(env, log)
+        build(other_env, None)
+        env.run(until=100)
+        other_env.run(until=100)
+        assert_that(trace.tracer._envs, equal_to([env]))
+    assert_that(log.completed_count,
+                equal_to(grp.responded_request_count()))
@@ -0,0 +1,70 @@
+"""
+Tests for the uses of SimPy internals
+"""
+
+from __future__ import print_function
+
+import simpy
+from hamcrest import assert_that, equal_to
+
+from serversim import simpyinternals
+from serversim.simpyinternals import processed_event, next_event, \
+    process_locals
+
+
+def resume_steps(monkeypatch, supported):
+    """Value received by a process yielding a processed event, and the
+    number of steps the environment takes to run it."""
+    monkeypatch.setattr(simpyinternals, "SUPPORTED", supported)
+    env = simpy.Environment()
+    received = []
+
+    def proc():
+        evt = processed_event(env, 42)
+        assert_that((evt.triggered, evt.ok, evt.value),
+                    equal_to((True, True, 42)))
+        received.append((yield evt))
+
+    env.process(proc())
+    steps = 0
+    while env.peek() < float("inf"):
+        env.step()
+        steps += 1
+    return received, steps
+
+
+def test_installed_simpy_is_supported():
+    """
+    Scenario: Internals of the installed SimPy
+        The installed SimPy is a supported release, and its processed
+        events are recognized as such.
+    """
+    assert_that(simpyinternals.SUPPORTED, equal_to(True))
+    evt = processed_event(simpy.Environment(), 1)
+    assert_that(evt.processed, equal_to(True))
+
+
+def test_processed_event_fallback(monkeypatch):
+    # the initialization and the termination of the process
+    assert_that(resume_steps(monkeypatch, True), equal_to(([42], 2)))
+    # the public API takes an additional step for the event
+    assert_that(resume_steps(monkeypatch, False), equal_to(([42], 3)))
+
+
+def test_next_event_and_process_locals(monkeypatch):
+    env = simpy.Environment()
+
+    def proc(delay):
+        yield env.timeout(delay)
+
+    process = env.process(proc(3))
+    env.step()  # initialization: waits for the timeout
+    evt = next_event(env)
+    assert_that(evt.callbacks, equal_to([process._resume]))
+    generator, f_locals = process_locals(process)
+    assert_that((generator.__name__, f_locals["delay"]),
+                equal_to(("proc", 3)))
+
+    monkeypatch.setattr(simpyinternals, "SUPPORTED", False)
+    assert_that(next_event(env), equal_to(None))
+    assert_that(process_locals(process), equal_to((None, {})))
@@ -0,0 +1,75 @@
+"""
+Tests for incremental simulation runs
+"""
+
+from __future__ import print_function
+
+import random
+
+import simpy
+from hamcrest import assert_that, equal_to, close_to, greater_than
+
+from serversim import Server, CoreSvcRequester, UserGroup
+from serversim.simulation import Simulation
+
+
+def build(env, speed=10.0):
+    server = Server(env, 2, 10, speed, "Server_1")
+    svc = CoreSvcRequester(env, "svc", lambda: 1.0, lambda _svc_name: server)
+    grp = UserGroup(env, 10, "Users", [(svc, 1)], 1.0, 2.0,
+                    rng=random.Random(5))
+    grp.activate_users()
+    return server, grp
+
+
+def test_chunked_run_matches_single_run():
+    env = simpy.Environment()
+    _, grp = build(env)
+    env.run(until=100)
+
+    chunked_env = simpy.Environment()
+    server, chunked_grp = build(chunked_env)
+    sim = Simulation(chunked_env, [server], [chunked_grp])
+    snapshots = list(sim.run(until=100, chunk=30))
+
+    assert_that([p.now for p in snapshots], equal_to([30, 60, 90, 100]))
+    assert_that(chunked_grp.responded_request_count(),
+                equal_to(grp.responded_request_count()))
+    assert_that(chunked_grp.avg_response_time(),
+                equal_to(grp.avg_response_time()))
+    assert_that(sum(p.chunk_events for p in snapshots),
+                equal_to(snapshots[-1].events))
+    assert_that(snapshots[-1].events_per_sec, greater_than(0))
+    assert_that("step" in chunked_env.__dict__, equal_to(False))
+
+    # chunk estimates add up to the running estimates
+    last = snapshots[-1]
+    responded = sum(p.chunk_throughput["Users"] * p.chunk for p in snapshots)
+    assert_that(responded, close_to(last.responded["Users"], 1e-9))
+    total = sum(p.chunk_avg_response_time["Users"] *
+                p.chunk_throughput["Users"] * p.chunk for p in snapshots)
+    assert_that(total / last.responded["Users"],
+                close_to(last.avg_response_time["Users"], 1e-9))
+
+
+def test_stop_and_resume():
+    """
+    Scenario: Stopping when response times degrade
+        An overloaded server makes the running average response time
+        exceed the threshold; the run stops at the first snapshot past
+        it and can be resumed.
+    """
+    env = simpy.Environment()
+    server, grp = build(env, speed=2.0)
+    sim = Simulation(env, [server], [grp])
+    last = sim.run_to_end(1000, 10,
+                          stop=lambda p: p.avg_response_time["Users"] > 3)
+    assert_that(sim.stopped, equal_to(True))
+    assert_that(last.avg_response_time["Users"], greater_than(3))
+    assert_that(last.now < 1000, equal_to(True))
+    assert_that(last.hw_queue_lengths["Server_1"] +
+                last.thread_queue_lengths["Server_1"], greater_than(0))
+
+    resumed = sim.run_to_end(last.now + 20, 10)
+    assert_that(sim.stopped, equal_to(False))
+    assert_that(resumed.now, equal_to(last.now + 20))
@@ -0,0 +1,123 @@
+"""
+Tests for structured tracing
+"""
+
+from __future__ import print_function
+
+import io
+
+import simpy
+import pytest
+from hamcrest import assert_that, equal_to
+
+from serversim import Server, CoreSvcRequester, Seq
+from serversim.trace import tracer, RingBufferSink, BinaryFileSink, \
+    read_trace, KIND_BY_LABEL, LABEL_BY_KIND, SUBMITTED, COMPLETED
+
+
+@pytest.fixture
+def subscribe():
+    subscribed = []
+
+    def subscribe_(sink, kinds=None, env=None):
+        subscribed.append(tracer.subscribe(sink, kinds, env))
+        return sink
+
+    yield subscribe_
+    for sink in subscribed:
+        tracer.unsubscribe(sink)
+    assert_that(tracer.enabled, equal_to(False))
+
+
+def run_seq(log):
+    env = simpy.Environment()
+    server = Server(env, 1, 2, 1, "Server_1")
+
+    def core(name, comp_units):
+        return CoreSvcRequester(env, name, lambda: comp_units,
+                                lambda _svc_name: server, log)
+
+    seq = Seq(env, "seq", [core("a", 1.0), core("b", 2.0)], log=log)
+    svc_req = seq.make_svc_request(None)
+    svc_req.submit()
+    env.run()
+    return svc_req
+
+
+def expected_events(log):
+    events = []
+    for (_, svc_req) in log:
+        parent_id = svc_req.parent.id if svc_req.parent is not None else 0
+        server_name = svc_req.server.name if svc_req.server else None
+        for (label, time) in svc_req.time_log:
+            events.append((time, KIND_BY_LABEL[label], svc_req.id, parent_id,
+                           svc_req.svc_name, server_name))
+    return sorted(events)
+
+
+def as_tuples(events):
+    return sorted((e.time, e.kind, e.req_id, e.parent_id, e.svc_name,
+                   e.server_name) for e in events)
+
+
+def test_sinks_record_every_logged_event(subscribe):
+    """
+    Scenario: Trace events mirror the request time logs
+        Every label logged by a service request is delivered as a typed
+        event, and the ring buffer and binary file sinks reproduce the
+        events exactly.
+    """
+    ring = subscribe(RingBufferSink(1000))
+    out = io.BytesIO()
+    file_sink = subscribe(BinaryFileSink(out))
+    log = []
+    run_seq(log)
+    file_sink.close()
+
+    expected = expected_events(log)
+    assert_that(as_tuples(ring.events()), equal_to(expected))
+    out.seek(0)
+    assert_that(as_tuples(read_trace(out)), equal_to(expected))
+
+
+def test_ring_buffer_keeps_latest_events(subscribe):
+    ring = subscribe(RingBufferSink(4))
+    log = []
+    run_seq(log)
+    assert_that(ring.overwritten_count, equal_to(ring.count - 4))
+    assert_that([LABEL_BY_KIND[e.kind] for e in ring.events()],
+                equal_to(["hw_thread_released", "completed",
+                          "sw_thread_released", "completed"]))
+
+
+def test_subscription_by_kind(subscribe):
+    received = []
+    subscribe(lambda kind, time, svc_req:
+              received.append((kind, svc_req.svc_name)),
+              kinds=[SUBMITTED, COMPLETED])
+    run_seq(None)
+    assert_that(received, equal_to([(SUBMITTED, "seq"), (SUBMITTED, "a"),
+                                    (COMPLETED, "a"), (SUBMITTED, "b"),
+                                    (COMPLETED, "b"), (COMPLETED, "seq")]))
+
+
+def test_subscriber_scoped_to_environment(subscribe):
+    """
+    Scenario: Concurrent simulations
+        A subscriber given an environment receives the events of the
+        requests of that environment only.
+    """
+    envs = [simpy.Environment() for _ in range(2)]
+    received = [[], []]
+    for (env, events) in zip(envs, received):
+        subscribe(lambda kind, time, svc_req, events=events:
+                  events.append(svc_req.env), [COMPLETED], env)
+    for env in envs:
+        server = Server(env, 1, 2, 1, "Server_1")
+        svc = CoreSvcRequester(env, "a", lambda: 1.0,
+                               lambda _svc_name: server)
+        for _ in range(3):
+            svc.make_svc_request(None).submit()
+    for env in envs:
+        env.run()
+    assert_that(received, equal_to([[envs[0]] * 3, [envs[1]] * 3]))
@@ -0,0 +1,293 @@
+"""
+Structured tracing of service request events.
+
+Every significant occurrence in the life of a service request, i.e.,
+every label recorded with SvcRequest.log_time, is also a typed trace
+event.  Events are delivered to the subscribers of the module-level
+*tracer*, which serves all environments: a subscriber given an
+environment only receives the events of that environment's requests.
+While there are no subscribers, emitting an event costs a single
+attribute test and nothing is formatted or allocated.
+
+Subscribers are callables taking (kind, time, svc_req).  Two subscribers
+that record events in a compact binary form are provided: RingBufferSink,
+which keeps the most recent events in memory, and BinaryFileSink, which
+appends all events to a file that can be read back with read_trace.
+"""
+
+import collections
+import struct
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, \
+    List, Optional, Union
+
+
+# Event kinds
+SUBMITTED = 0
+SW_THREAD_REQUESTED = 1
+SW_THREAD_ACQUIRED = 2
+HW_THREAD_REQUESTED = 3
+HW_THREAD_ACQUIRED = 4
+HW_THREAD_RELEASED = 5
+SW_THREAD_RELEASED = 6
+COMPLETED = 7
+CANCELLED = 8
+QUEUED = 9
+DROPPED = 10
+OTHER = 254  # a label without a kind of its own
+
+KIND_BY_LABEL = {
+    "submitted": SUBMITTED,
+    "sw_thread_requested": SW_THREAD_REQUESTED,
+    "sw_thread_acquired": SW_THREAD_ACQUIRED,
+    "hw_thread_requested": HW_THREAD_REQUESTED,
+    "hw_thread_acquired": HW_THREAD_ACQUIRED,
+    "hw_thread_released": HW_THREAD_RELEASED,
+    "sw_thread_released": SW_THREAD_RELEASED,
+    "completed": COMPLETED,
+    "cancelled": CANCELLED,
+    "queued": QUEUED,
+    "dropped": DROPPED,
+}  # type: Dict[str, int]
+
+LABEL_BY_KIND = dict((kind, label) for (label, kind) in KIND_BY_LABEL.items())
+
+
+TraceEvent = collections.namedtuple(
+    "TraceEvent", "kind time req_id parent_id svc_name server_name")
+
+
+class Tracer(object):
+    """Dispatches trace events to subscribers.
+
+    Attributes:
+        enabled (bool): True while there is at least one subscriber.
+            Emitters test this before calling emit().
+    """
+
+    def __init__(self):
+        # type: () -> None
+        self.enabled = False
+        self._subscribers = []  # type: List[Callable[[int, float, Any], None]]
+        self._kinds = []  # type: List[Optional[frozenset]]
+        self._envs = []  # type: List[Any]
+        self._by_label = {}  # type: Dict[str, tuple]
+
+    def subscribe(self, subscriber, kinds=None, env=None):
+        # type: (Callable[[int, float, Any], None], Optional[Iterable[int]], Any) -> Callable[[int, float, Any], None]
+        """Attach subscriber, which is called with (kind, time, svc_req)
+        for every event whose kind is in kinds, or for every event if
+        kinds is None, of the requests of env, or of all environments if
+        env is None.  Returns subscriber."""
+        self._subscribers.append(subscriber)
+        self._kinds.append(frozenset(kinds) if kinds is not None else None)
+        self._envs.append(env)
+        self._refresh()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        # type: (Callable[[int, float, Any], None]) -> None
+        """Detach subscriber."""
+        i = self._subscribers.index(subscriber)
+        del self._subscribers[i]
+        del self._kinds[i]
+        del self._envs[i]
+        self._refresh()
+
+    def _refresh(self):
+        # type: () -> None
+        self._by_label = {}
+        self.enabled = bool(self._subscribers)
+
+    def _targets(self, label):
+        # type: (str) -> tuple
+        kind = KIND_BY_LABEL.get(label, OTHER)
+        targets = tuple((fn, env) for (fn, kinds, env)
+                        in zip(self._subscribers, self._kinds, self._envs)
+                        if kinds is None or kind in kinds)
+        self._by_label[label] = (kind, targets)
+        return kind, targets
+
+    def emit(self, label, time, svc_req):
+        # type: (str, float, Any) -> None
+        """Deliver the event for label, which occurred at time for
+        svc_req, to the interested subscribers."""
+        entry = self._by_label.get(label)
+        kind, targets = entry if entry is not None else self._targets(label)
+        for (fn, env) in targets:
+            if env is None or env is svc_req.env:
+                fn(kind, time, svc_req)
+
+
+tracer = Tracer()
+
+
+# Binary event format: kind, time, request id, parent request id (0 if
+# none), service name index, server name index (-1 if none).  In files,
+# a name is defined before its first use by a NAME record whose request
+# id field holds the name's index and whose parent id field holds the
+# length of the UTF-8 encoded name that follows the record.
+_RECORD = struct.Struct("<Bdqqii")
+NAME = 255
+
+
+class _NameTable(object):
+    """Assigns consecutive indices to names."""
+
+    def __init__(self):
+        # type: () -> None
+        self.names = []  # type: List[str]
+        self._index = {}  # type: Dict[str, int]
+
+    def index(self, name):
+        # type: (str) -> int
+        """The index of name, or -(index + 2) if name is new."""
+        i = self._index.get(name)
+        if i is not None:
+            return i
+        i = len(self.names)
+        self._index[name] = i
+        self.names.append(name)
+        return -(i + 2)
+
+
+def _fields(names, svc_req):
+    # type: (_NameTable, Any) -> tuple
+    """The request fields of a record, as (req_id, parent_id, svc_idx,
+    server_name, server_idx); indices of new names are encoded as by
+    _NameTable.index."""
+    parent = svc_req.parent
+    server = svc_req.server
+    server_name = server.name if server is not None else None
+    return (svc_req.id, parent.id if parent is not None else 0,
+            names.index(svc_req.svc_name), server_name,
+            names.index(server_name) if server_name is not None else -1)
+
+
+class RingBufferSink(object):
+    """Subscriber that keeps the last *capacity* events in a preallocated
+    binary buffer.
+
+    Attributes:
+        capacity (int): Maximum number of events kept.
+        count (int): Number of events received.
+    """
+
+    def __init__(self, capacity):
+        # type: (int) -> None
+        """Initializer.
+
+        Args:
+            capacity: Maximum number of events kept.  Older events are
+                overwritten by newer ones.
+        """
+        assert capacity > 0, "capacity must be positive"
+        self.capacity = capacity
+        self.count = 0
+        self._buffer = bytearray(capacity * _RECORD.size)
+        self._names = _NameTable()
+
+    def __call__(self, kind, time, svc_req):
+        # type: (int, float, Any) -> None
+        req_id, parent_id, svc_idx, _, server_idx = \
+            _fields(self._names, svc_req)
+        if svc_idx < 0:
+            svc_idx = -svc_idx - 2
+        if server_idx < -1:
+            server_idx = -server_idx - 2
+        offset = (self.count % self.capacity) * _RECORD.size
+        _RECORD.pack_into(self._buffer, offset, kind, time, req_id,
+                          parent_id, svc_idx, server_idx)
+        self.count += 1
+
+    @property
+    def overwritten_count(self):
+        # type: () -> int
+        """Number of events lost because the buffer was full."""
+        return max(0, self.count - self.capacity)
+
+    def events(self):
+        # type: () -> List[TraceEvent]
+        """The events kept, oldest first."""
+        n = min(self.count, self.capacity)
+        first = self.count - n
+        names = self._names.names
+        res = []
+        for i in range(first, self.count):
+            offset = (i % self.capacity) * _RECORD.size
+            kind, time, req_id, parent_id, svc_idx, server_idx = \
+                _RECORD.unpack_from(self._buffer, offset)
+            res.append(TraceEvent(
+                kind, time, req_id, parent_id, names[svc_idx],
+                names[server_idx] if server_idx >= 0 else None))
+        return res
+
+
+class BinaryFileSink(object):
+    """Subscriber that appends events to a binary file.
+
+    The file can be read back with read_trace.
+    """
+
+    def __init__(self, file):
+        # type: (Union[str, BinaryIO]) -> None
+        """Initializer.
+
+        Args:
+            file: A path, or a file object opened for binary writing.
+                A file opened from a path is closed by close().
+        """
+        if not hasattr(file, "write"):
+            self._file = open(file, "wb")
+            self._owns_file = True
+        else:
+            self._file = file
+            self._owns_file = False
+        self._names = _NameTable()
+
+    def _define(self, index, name):
+        # type: (int, str) -> None
+        data = name.encode("utf-8")
+        self._file.write(_RECORD.pack(NAME, 0.0, index, len(data), 0, 0))
+        self._file.write(data)
+
+    def __call__(self, kind, time, svc_req):
+        # type: (int, float, Any) -> None
+        req_id, parent_id, svc_idx, server_name, server_idx = \
+            _fields(self._names, svc_req)
+        if svc_idx < 0:
+            svc_idx = -svc_idx - 2
+            self._define(svc_idx, svc_req.svc_name)
+        if server_idx < -1:
+            server_idx = -server_idx - 2
+            self._define(server_idx, server_name)
+        self._file.write(_RECORD.pack(kind, time, req_id, parent_id, svc_idx,
+                                      server_idx))
+
+    def close(self):
+        # type: () -> None
+        """Flush the file, and close it if it was opened by this sink."""
+        self._file.flush()
+        if self._owns_file:
+            self._file.close()
+
+
+def read_trace(file):
+    # type: (BinaryIO) -> Iterator[TraceEvent]
+    """Iterate over the events in a file written by BinaryFileSink.
+
+    Args:
+        file: A file object opened for binary reading.
+    """
+    names = []  # type: List[str]
+    size = _RECORD.size
+    while True:
+        data = file.read(size)
+        if len(data) < size:
+            return
+        kind, time, req_id, parent_id, svc_idx, server_idx = \
+            _RECORD.unpack(data)
+        if kind == NAME:
+            names.append(file.read(parent_id).decode("utf-8"))
+            continue
+        yield TraceEvent(kind, time, req_id, parent_id, names[svc_idx],
+                         names[server_idx] if server_idx >= 0 else None)
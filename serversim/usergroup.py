@@ -1,98 +1,68 @@
 """
 Represents a group of users or clients that submit service requests.
+
+RequestGroup is the part shared by all sources of service requests that
+report response time statistics: the tallies, the log, the sink and the
+reporting methods.  UserGroup is a closed workload; see the replay
+module for an open, trace-driven one.
 """
 
 import random
 import math
-from typing import Union, Sequence, Tuple, Optional, MutableSequence
+from typing import Any, Callable, List, Union, Sequence, Tuple, Optional, \
+    MutableSequence
 
 from livestats import livestats
 import simpy
 
-from .randutil import prob_chooser
+from .loadprofile import LoadProfile, StepProfile
+from .randutil import rng_prob_chooser
+from .records import request_record
 from . import SvcRequester, SvcRequest
 
 
-class UserGroup(object):
-    """Represents a set of identical users or clients that submit
-    service requests.
+class RequestGroup(object):
+    """Base class of named sources of service requests that tally the
+    response times of their requests, overall and by service requester.
 
-    Each user repeatedly executes service requests randomly
-    selected from the set of service requests specified for the group.
+    Subclasses call _submitted() for each service request they produce and
+    _responded() when it completes.
 
     Attributes:
         << See __init__ args >>
-        << Additional attributes or modifications to __init__ args >>
-
-        svcs (List[SvcRequester]): The first components of *weighted_svcs*.
     """
 
-    INFINITY = 1e99
-
-    def __init__(self, env, num_users, name, weighted_svcs, min_think_time,
-                 max_think_time, quantiles=None, svc_req_log=None):
-        # type: (simpy.Environment, Union[int, Sequence[Tuple[float, int]]], str, Sequence[Tuple[SvcRequester, float]], float, float, Optional[Sequence[float]], Optional[MutableSequence[Tuple[str, SvcRequest]]]) -> None
+    def __init__(self, env, name, svcs, quantiles=None, svc_req_log=None,
+                 sink=None):
+        # type: (simpy.Environment, str, Sequence[SvcRequester], Optional[Sequence[float]], Optional[MutableSequence[Tuple[str, SvcRequest]]], Optional[Callable[[Any], None]]) -> None
         """Initializer.
 
         Args:
             env: The Simpy Environment.
-            num_users: Number of users in group.  This can be either a
-                positive integer or a sequence of (float, int), where
-                the floats are monotonically increasing.  In this case,
-                the sequence represents a step function of time, where each pair
-                represents a step whose range of *x* values extend from the
-                first component of the pair (inclusive) to the first
-                component of the next pair (exclusive), and whose *y* value
-                is the second component of the pair.  The first pair in
-                the sequence must have 0 as its first component.
-                If the num_users argument is an int, it is transformed
-                into the list [(0, num_users)].
-            name: This user group's name.
-            weighted_svcs: List of pairs of
-                SvcRequester instances and positive numbers
-                representing the different service request types issued by
-                the users in the group and their weights.  The weights are
-                the relative frequencies with which the service requesters
-                will be executed (the weights do not need to add up to 1,
-                as they are normalized by this class).
-            min_think_time: The minimum think time between service
-                requests from a user.  Think time will be uniformly
-                distributed between min_think_time and max_think_time.
-            max_think_time: The maximum think time between service
-                requests from a user.  Think time will be uniformly
-                distributed between min_think_time and max_think_time.
+            name: This group's name.
+            svcs: The service requesters whose requests are tallied
+                separately.
             quantiles: List of quantiles to be tallied.  It
                 defaults to [0.5, 0.95, 0.99] if not provided.
             svc_req_log: If not None, a sequence where service requests will
                 be logged.  Each log entry is a pair (name, svc_req), where
                 name is this group's name and svc_req is the current
                 service request generated by this group.
+            sink: Optional callable invoked with the RequestRecord of each
+                service request generated by this group when the group
+                receives its response (see the records module).  The
+                record's name is this group's name.  Unlike
+                *svc_req_log*, it does not retain the requests.
         """
         self.env = env
-        if isinstance(num_users, int):
-            num_users = [(0, num_users)]
-        if not isinstance(num_users, list):
-            raise TypeError(
-                "Argument num_users must be a number or a list of pairs.")
-        if not num_users[0][0] == 0:
-            raise ValueError("Argument num_users first element must be a pair "
-                             "with 0 as the first component.")
-        self.num_users = num_users
-        self._num_users_times = [p[0] for p in num_users][1:] + [self.INFINITY]
-        self._num_users_values = [p[1] for p in num_users]
-        self._max_users = max(self._num_users_values)
         self.name = name
-        self.weighted_svcs = weighted_svcs
-        self.svcs = [x[0] for x in weighted_svcs]
-        self.min_think_time = min_think_time
-        self.max_think_time = max_think_time
+        self.svcs = svcs
         if quantiles is None:
             quantiles = [0.5, 0.95, 0.99]
         self.quantiles = quantiles
         self.svc_req_log = svc_req_log
+        self.sink = sink
 
-        self._pick_svc = prob_chooser(*weighted_svcs)
-        
         # create Tally objects for response times: overall and by svcRequest
         self._tally_dict = {}  # map from svcRequest to tally
         for svc in self.svcs:
@@ -106,43 +76,23 @@ class UserGroup(object):
             self._request_count_dict[svc] = 0
         self._request_count_dict[None] = 0
 
-    # THROTTLE_LIMIT = 100
-
-    def _user(self, user_idx):
-        """
-        Process execution loop for user.
-        """
-        n_times = len(self._num_users_times)
-        for i in range(n_times):
-            next_break_time = self._num_users_times[i]
-            num_active_users = self._num_users_values[i]
-            while self.env.now < next_break_time:
-                # user goes dormant if the throttle applies
-                if user_idx >= num_active_users:
-                    yield self.env.timeout(next_break_time - self.env.now)
-                # user stays active otherwise
-                else:
-                    think_time = random.uniform(self.min_think_time,
-                                                self.max_think_time)
-                    yield self.env.timeout(think_time)
-                    start_time = self.env.now
-                    svc = self._pick_svc()
-                    self._request_count_dict[svc] += 1
-                    self._request_count_dict[None] += 1
-                    svc_req = svc.make_svc_request(None)
-                    if self.svc_req_log is not None:
-                        self.svc_req_log.append((self.name, svc_req))
-                    yield svc_req.submit()
-                    response_time = self.env.now - start_time
-                    self._overall_tally.add(response_time)
-                    self._tally_dict[svc].add(response_time)
-
-    def activate_users(self):
-        """
-        Create and activate the users.
-        """
-        for user_idx in range(self._max_users):
-            self.env.process(self._user(user_idx))
+    def _submitted(self, svc, svc_req):
+        # type: (SvcRequester, SvcRequest) -> None
+        """Count and log svc_req, produced by svc, before its submission."""
+        self._request_count_dict[svc] += 1
+        self._request_count_dict[None] += 1
+        if self.svc_req_log is not None:
+            self.svc_req_log.append((self.name, svc_req))
+
+    def _responded(self, svc, svc_req, response_time):
+        # type: (SvcRequester, SvcRequest, float) -> None
+        """Tally the response to svc_req, produced by svc."""
+        self._overall_tally.add(response_time)
+        self._tally_dict[svc].add(response_time)
+        if self.sink is not None:
+            self.sink(request_record(self.name, svc_req))
+        if self.svc_req_log is None:
+            svc_req.recycle()
 
     def avg_response_time(self, svc=None):
         # type: (Optional[SvcRequester]) -> float
@@ -232,3 +182,154 @@ class UserGroup(object):
         # type: (Optional[SvcRequester]) -> float
         """Aggregate responded requests per unit of time."""
         return self.responded_request_count(svc) / self.env.now
+
+
+class UserGroup(RequestGroup):
+    """Represents a set of identical users or clients that submit
+    service requests.
+
+    Each user repeatedly executes service requests randomly
+    selected from the set of service requests specified for the group.
+
+    Attributes:
+        << See __init__ args >>
+        << Additional attributes or modifications to __init__ args >>
+
+        svcs (List[SvcRequester]): The first components of *weighted_svcs*.
+        profile (LoadProfile): The number of users as a function of time,
+            from *num_users*.
+    """
+
+    INFINITY = 1e99
+
+    def __init__(self, env, num_users, name, weighted_svcs, min_think_time,
+                 max_think_time, quantiles=None, svc_req_log=None, rng=None,
+                 sink=None):
+        # type: (simpy.Environment, Union[int, Sequence[Tuple[float, int]], LoadProfile], str, Sequence[Tuple[SvcRequester, float]], float, float, Optional[Sequence[float]], Optional[MutableSequence[Tuple[str, SvcRequest]]], Optional[random.Random], Optional[Callable[[Any], None]]) -> None
+        """Initializer.
+
+        Args:
+            env: The Simpy Environment.
+            num_users: Number of users in group.  This can be either a
+                positive integer or a sequence of (float, int), where
+                the floats are monotonically increasing.  In this case,
+                the sequence represents a step function of time, where each pair
+                represents a step whose range of *x* values extend from the
+                first component of the pair (inclusive) to the first
+                component of the next pair (exclusive), and whose *y* value
+                is the second component of the pair.  The first pair in
+                the sequence must have 0 as its first component.
+                If the num_users argument is an int, it is transformed
+                into the list [(0, num_users)].  It can also be a
+                LoadProfile, e.g., a ramp or a diurnal sinusoid (see the
+                loadprofile module); the step functions are turned into
+                a StepProfile.
+            name: This user group's name.
+            weighted_svcs: List of pairs of
+                SvcRequester instances and positive numbers
+                representing the different service request types issued by
+                the users in the group and their weights.  The weights are
+                the relative frequencies with which the service requesters
+                will be executed (the weights do not need to add up to 1,
+                as they are normalized by this class).
+            min_think_time: The minimum think time between service
+                requests from a user.  Think time will be uniformly
+                distributed between min_think_time and max_think_time.
+            max_think_time: The maximum think time between service
+                requests from a user.  Think time will be uniformly
+                distributed between min_think_time and max_think_time.
+            quantiles: See base class.
+            svc_req_log: See base class.
+            rng: If not None, e.g., a stream of a randutil.RandomStreams,
+                seeds a random.Random per user from which the user's
+                think times and service choices are drawn, so that they
+                do not depend on the order in which users draw them.
+                By default, all users draw from the random module.
+            sink: See base class.
+        """
+        RequestGroup.__init__(self, env, name, [x[0] for x in weighted_svcs],
+                              quantiles, svc_req_log, sink)
+        if isinstance(num_users, LoadProfile):
+            profile = num_users
+        else:
+            if isinstance(num_users, int):
+                num_users = [(0, num_users)]
+            if not isinstance(num_users, list):
+                raise TypeError("Argument num_users must be a number, a list "
+                                "of pairs or a LoadProfile.")
+            if not num_users[0][0] == 0:
+                raise ValueError("Argument num_users first element must be a "
+                                 "pair with 0 as the first component.")
+            profile = StepProfile(num_users)
+        self.num_users = num_users
+        self.profile = profile
+        self._max_users = profile.max_users
+        self._active_users = 0  # as of the last profile change
+        self._started_users = 0  # users 0 to this - 1 have a process
+        self._wakeups = [None] * self._max_users  # type: List[Optional[simpy.Event]]
+        self.weighted_svcs = weighted_svcs
+        self.min_think_time = min_think_time
+        self.max_think_time = max_think_time
+
+        if rng is None:
+            self._user_rngs = [random] * self._max_users
+        else:
+            self._user_rngs = [random.Random(rng.getrandbits(64))
+                               for _ in range(self._max_users)]
+        self._user_pick_svcs = [rng_prob_chooser(user_rng, *weighted_svcs)
+                                for user_rng in self._user_rngs]
+
+    # THROTTLE_LIMIT = 100
+
+    def _user(self, user_idx):
+        """
+        Process execution loop for user.
+        """
+        rng = self._user_rngs[user_idx]
+        pick_svc = self._user_pick_svcs[user_idx]
+        while True:
+            # user goes dormant until woken up by _control if the
+            # throttle applies
+            if user_idx >= self._active_users:
+                wakeup = self._wakeups[user_idx] = self.env.event()
+                yield wakeup
+            think_time = rng.uniform(self.min_think_time,
+                                     self.max_think_time)
+            yield self.env.timeout(think_time)
+            start_time = self.env.now
+            svc = pick_svc()
+            svc_req = svc.make_svc_request(None)
+            self._submitted(svc, svc_req)
+            yield svc_req.submit()
+            self._responded(svc, svc_req, self.env.now - start_time)
+
+    def _set_active_users(self, count):
+        # type: (int) -> None
+        """Make users 0 to count - 1 active, starting or waking up those
+        that are not.  Users from count on become dormant by themselves
+        at the end of their current request."""
+        previous = self._active_users
+        self._active_users = count
+        for user_idx in range(previous, min(count, self._started_users)):
+            wakeup = self._wakeups[user_idx]
+            if wakeup is not None:
+                self._wakeups[user_idx] = None
+                wakeup.succeed()
+        for user_idx in range(max(previous, self._started_users), count):
+            self.env.process(self._user(user_idx))
+        self._started_users = max(self._started_users, count)
+
+    def _control(self):
+        """
+        Process that follows the changes of the number of users.
+        """
+        for (time, count) in self.profile.changes():
+            if time > self.env.now:
+                yield self.env.timeout(time - self.env.now)
+            self._set_active_users(count)
+
+    def activate_users(self):
+        """
+        Create and activate the users.
+        """
+        self.env.process(self._control())
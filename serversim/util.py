@@ -2,6 +2,8 @@
 General utilities
 """
 
+import bisect
+
 
 def nullary(func, *args, **kwargs):
     """Wrap an effectful function application in a nullary function."""
@@ -18,16 +20,12 @@ def curried_nullary(func):
 
 
 def binary_search(lst, x):
-    if not lst:
-        return None
-    elif len(lst) == 1:
-        return 0 if lst[0] <= x else None
-    else:
-        i_mid = len(lst) / 2
-        if x >= lst[i_mid]:
-            return binary_search(lst[i_mid:], x) + i_mid
-        else:
-            return binary_search(lst[:i_mid], x)
+    """
+    Assumes lst is an ordered list and returns the last index i such
+    that lst[i] <= x, or None if there is no such index.
+    """
+    idx = bisect.bisect_right(lst, x) - 1
+    return idx if idx >= 0 else None
 
 
 def binary_pair_search(lst, x):
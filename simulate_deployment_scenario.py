@@ -1,6 +1,6 @@
 from __future__ import print_function
 
-from typing import List, Tuple, Sequence
+from typing import List, Optional, Tuple, Sequence
 
 from collections import namedtuple
 import random
@@ -8,27 +8,36 @@ import random
 import simpy
 
 from serversim import *
+from serversim.randutil import RandomStreams
 
 
 def simulate_deployment_scenario(num_users, weight1, weight2, server_range1,
-                                 server_range2):
-    # type: (int, float, float, Sequence[int], Sequence[int]) -> Result
+                                 server_range2, streams=None):
+    # type: (int, float, float, Sequence[int], Sequence[int], Optional[RandomStreams]) -> Result
 
     Result = namedtuple("Result", ["num_users", "weight1", "weight2", "server_range1",
                          "server_range2", "servers", "grp"])
 
+    # with streams, each source of randomness has its own stream
+    if streams is None:
+        comp_units_rng = ld_bal_rng = users_rng = random
+    else:
+        comp_units_rng = streams.stream("comp_units")
+        ld_bal_rng = streams.stream("ld_bal")
+        users_rng = streams.stream("users")
+
     def cug(mid, delta):
         """Computation units generator"""
         def f():
-            return random.uniform(mid - delta, mid + delta)
+            return comp_units_rng.uniform(mid - delta, mid + delta)
         return f
 
     def ld_bal(svc_name):
         """Application server load-balancer."""
         if svc_name == "svc_1":
-            svr = random.choice(servers1)
+            svr = ld_bal_rng.choice(servers1)
         elif svc_name == "svc_2":
-            svr = random.choice(servers2)
+            svr = ld_bal_rng.choice(servers2)
         else:
             assert False, "Invalid service type."
         return svr
@@ -63,7 +72,7 @@ def simulate_deployment_scenario(num_users, weight1, weight2, server_range1,
     svc_req_log = []  # type: List[Tuple[str, SvcRequest]]
 
     grp = UserGroup(env, num_users, "UserTypeX", weighted_txns, min_think_time,
-                    max_think_time, quantiles, svc_req_log)
+                    max_think_time, quantiles, svc_req_log, users_rng)
     grp.activate_users()
 
     env.run(until=simtime)